@@ -1,3 +1,11 @@
 from django.contrib import admin
 
 # Register your models here.
+from .models import Avatar
+
+
+@admin.register(Avatar)
+class AvatarAdmin(admin.ModelAdmin):
+    list_display = ['user', 'updated_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
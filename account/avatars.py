@@ -0,0 +1,128 @@
+"""
+Locally generated and served avatars.
+
+Each user gets one small square WebP under ``MEDIA_ROOT/avatars/<id>/``:
+a deterministic 5x5 identicon derived from their id, or their uploaded
+image scaled down. The file name is a hash of everything the image is
+made from (the upload's name and modification time, or the identicon
+seed, plus SIZE and QUALITY), so it is known without rendering, a URL
+never changes meaning and browsers can cache it for a year. The image
+is only rendered when its file does not exist yet; superseded files of
+the user are deleted then.
+
+The URL per user id is memoized in the cache for URL_CACHE_SECONDS and
+dropped in this process when the avatar changes; other processes may
+point at a deleted file for up to that long after an upload.
+"""
+import colorsys
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageDraw
+
+from .models import Avatar
+
+AVATAR_DIR = 'avatars'
+URL_CACHE_KEY = 'account:avatar-url:{}'
+
+
+def get_avatar_settings():
+    config = getattr(settings, 'AVATARS', {})
+    return {
+        'SIZE': config.get('SIZE', 128),
+        'QUALITY': config.get('QUALITY', 80),
+        'URL_CACHE_SECONDS': config.get('URL_CACHE_SECONDS', 300),
+    }
+
+
+def identicon(seed, size):
+    """Render a symmetric 5x5 identicon for ``seed`` as a PIL image"""
+    digest = hashlib.sha256(seed.encode('utf-8')).digest()
+    hue = digest[0] / 255
+    color = tuple(int(channel * 255) for channel in colorsys.hls_to_rgb(hue, 0.5, 0.55))
+    image = Image.new('RGB', (size, size), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+
+    cells, padding = 5, size // 10
+    cell = (size - 2 * padding) / cells
+    for row in range(cells):
+        for column in range(3):
+            if digest[1 + row * 3 + column] % 2:
+                continue
+            for mirrored in {column, cells - 1 - column}:
+                x0 = padding + mirrored * cell
+                y0 = padding + row * cell
+                draw.rectangle([x0, y0, x0 + cell - 1, y0 + cell - 1], fill=color)
+    return image
+
+
+def _encode_webp(image):
+    config = get_avatar_settings()
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=config['QUALITY'], method=6)
+    return buffer.getvalue()
+
+
+def _fit(image, size):
+    """Center-crop to a square and scale to ``size``"""
+    image = image.convert('RGB')
+    side = min(image.size)
+    left, top = (image.width - side) // 2, (image.height - side) // 2
+    return image.crop((left, top, left + side, top + side)).resize((size, size), Image.LANCZOS)
+
+
+def render_avatar(user_id, uploaded=None):
+    """Return WebP bytes for the uploaded avatar, or else the user's identicon"""
+    size = get_avatar_settings()['SIZE']
+    if uploaded is not None and uploaded.image:
+        with uploaded.image.open('rb') as handle:
+            return _encode_webp(_fit(Image.open(handle), size))
+    return _encode_webp(identicon(f'user:{user_id}', size))
+
+
+def avatar_name(user_id, uploaded=None):
+    """Storage name of the avatar, derived from its inputs without rendering it"""
+    config = get_avatar_settings()
+    if uploaded is not None and uploaded.image:
+        source = f'upload:{uploaded.image.name}:{uploaded.updated_at.isoformat()}'
+    else:
+        source = f'identicon:user:{user_id}'
+    digest = hashlib.sha1(f"{source}:{config['SIZE']}:{config['QUALITY']}".encode('utf-8')).hexdigest()[:12]
+    return f'{AVATAR_DIR}/{user_id}/{digest}.webp'
+
+
+def _remove_superseded(user_id, current):
+    directory = f'{AVATAR_DIR}/{user_id}'
+    for filename in default_storage.listdir(directory)[1]:
+        if f'{directory}/{filename}' != current:
+            default_storage.delete(f'{directory}/{filename}')
+
+
+def ensure_avatar(user):
+    """Write the user's avatar file if missing; return its storage name"""
+    uploaded = Avatar.objects.filter(user_id=user.pk).first()
+    name = avatar_name(user.pk, uploaded)
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(render_avatar(user.pk, uploaded)))
+        _remove_superseded(user.pk, name)
+    return name
+
+
+def avatar_url(user):
+    """Media URL of ``user``'s avatar, memoized per user id"""
+    if user is None or not user.pk:
+        return ''
+    key = URL_CACHE_KEY.format(user.pk)
+    url = cache.get(key)
+    if url is None:
+        url = default_storage.url(ensure_avatar(user))
+        cache.set(key, url, get_avatar_settings()['URL_CACHE_SECONDS'])
+    return url
+
+
+def invalidate_avatar(user_id):
+    cache.delete(URL_CACHE_KEY.format(user_id))
@@ -0,0 +1,93 @@
+"""
+Authentication backend that keeps recently used ``User`` rows in memory.
+
+Every authenticated request resolves ``request.user`` through the
+backend's ``get_user()``; with the stock ModelBackend that is one SELECT
+per request. CachedModelBackend serves it from a small per-process LRU
+instead. Entries are dropped when the user is saved or deleted in this
+process and expire after USER_CACHE['TTL'] seconds, which bounds how long
+another process can serve a stale row: a password change or deactivation
+saved elsewhere can go unnoticed here for up to TTL seconds, and the
+user's other sessions stay valid until then.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db import router
+
+
+def get_user_cache_settings():
+    config = getattr(settings, 'USER_CACHE', {})
+    return {
+        'MAX_SIZE': config.get('MAX_SIZE', 1024),
+        'TTL': config.get('TTL', 60),
+    }
+
+
+class UserRowCache:
+    """Thread-safe LRU of raw user rows keyed by primary key"""
+
+    def __init__(self):
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pk):
+        with self._lock:
+            entry = self._rows.get(pk)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._rows.move_to_end(pk)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, pk, row):
+        config = get_user_cache_settings()
+        if config['TTL'] <= 0:
+            return
+        with self._lock:
+            self._rows[pk] = (time.monotonic() + config['TTL'], row)
+            self._rows.move_to_end(pk)
+            while len(self._rows) > config['MAX_SIZE']:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, pk):
+        with self._lock:
+            self._rows.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+user_cache = UserRowCache()
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose ``get_user()`` is served from ``user_cache``"""
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            pk = UserModel._meta.pk.to_python(user_id)
+        except Exception:
+            return None
+
+        row = user_cache.get(pk)
+        if row is None:
+            user = super().get_user(pk)
+            if user is not None:
+                attnames = [field.attname for field in UserModel._meta.concrete_fields]
+                user_cache.set(pk, (user._state.db, attnames, [getattr(user, name) for name in attnames]))
+            return user
+
+        # Build a fresh instance per request so views can never mutate a shared object
+        db, attnames, values = row
+        user = UserModel.from_db(db or router.db_for_read(UserModel), attnames, values)
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,11 @@
+from django import forms
+from .models import Avatar
+
+
+class AvatarForm(forms.ModelForm):
+    class Meta:
+        model = Avatar
+        fields = ['image']
+        widgets = {
+            'image': forms.ClearableFileInput(attrs={'class': 'form-control form-control-sm', 'accept': 'image/*'}),
+        }
@@ -0,0 +1,65 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from account.backends import user_cache
+
+BASELINE = {
+    'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+    'AUTHENTICATION_BACKENDS': ['django.contrib.auth.backends.ModelBackend'],
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare queries and latency per authenticated request: DB sessions vs the configured fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/', help='Page to request (default: /)')
+        parser.add_argument('--requests', type=int, default=50, help='Requests per configuration')
+
+    def measure(self, path, requests, user):
+        # A new client builds its own handler, so middleware picks up overridden settings
+        client = Client()
+        client.force_login(user)
+        user_cache.clear()
+        client.get(path)  # warm caches and templates
+        session_queries = user_queries = total_queries = 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(path)
+            total_queries += len(captured)
+            session_queries += sum('django_session' in query['sql'] for query in captured)
+            user_queries += sum('FROM "auth_user"' in query['sql'] for query in captured)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            self.stderr.write(f'{path} returned {response.status_code}')
+        return {
+            'queries': total_queries / requests,
+            'session': session_queries / requests,
+            'user': user_queries / requests,
+            'ms': elapsed * 1000 / requests,
+        }
+
+    def handle(self, *args, **options):
+        path, requests = options['path'], options['requests']
+        with transaction.atomic():
+            # Runs against the real database; everything is rolled back at the end
+            user = User.objects.create_user(username='__benchmark_auth__', email='bench@example.com', password='x')
+            with override_settings(**BASELINE):
+                baseline = self.measure(path, requests, user)
+            fast = self.measure(path, requests, user)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"":<12}{"queries":>10}{"session":>10}{"user":>10}{"ms/req":>10}')
+        for label, result in [('baseline', baseline), ('fast path', fast)]:
+            self.stdout.write(
+                f'{label:<12}{result["queries"]:>10.1f}{result["session"]:>10.1f}'
+                f'{result["user"]:>10.1f}{result["ms"]:>10.2f}'
+            )
+        saved = baseline['queries'] - fast['queries']
+        self.stdout.write(self.style.SUCCESS(f'Fast path saves {saved:.1f} queries per authenticated request'))
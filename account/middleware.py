@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY
+
+# Backend paths stored by sessions created before the current backends were configured
+LEGACY_BACKENDS = {
+    'django.contrib.auth.backends.ModelBackend': 'account.backends.CachedModelBackend',
+}
+
+
+class LegacyBackendSessionMiddleware:
+    """
+    Point sessions that name a retired authentication backend at its replacement.
+
+    Django only restores a session's user through a backend that is still
+    listed in AUTHENTICATION_BACKENDS, and authenticate() tries every
+    listed backend, so keeping ModelBackend around for old sessions would
+    hash every wrong password twice. Must run before AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Requests without a session cookie have nothing to rewrite; skip loading the session
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            backend = request.session.get(BACKEND_SESSION_KEY)
+            if backend in LEGACY_BACKENDS and backend not in settings.AUTHENTICATION_BACKENDS:
+                request.session[BACKEND_SESSION_KEY] = LEGACY_BACKENDS[backend]
+        return self.get_response(request)
@@ -1,3 +1,14 @@
 from django.db import models
+from django.contrib.auth.models import User
 
 # Create your models here.
+
+
+class Avatar(models.Model):
+    """An uploaded avatar; users without one get a generated identicon"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='avatar')
+    image = models.ImageField(upload_to='avatars/uploads/')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Avatar of {self.user.username}'
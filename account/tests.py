@@ -1,3 +1,59 @@
-from django.test import TestCase
+import shutil
+import tempfile
 
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth import BACKEND_SESSION_KEY, authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from .avatars import avatar_url
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'avatar-tests'}})
+class AvatarServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+        self.user = User.objects.create_user('avatar-owner')
+
+    def test_generated_avatar_is_served_with_immutable_cache_headers(self):
+        url = avatar_url(self.user)
+        self.assertRegex(url, rf'^/media/avatars/{self.user.pk}/[0-9a-f]{{12}}\.webp$')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        cache_control = {part.strip() for part in response['Cache-Control'].split(',')}
+        self.assertEqual(cache_control, {'public', 'max-age=31536000', 'immutable'})
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'RIFF'))
+
+    def test_unknown_and_malformed_names_are_not_found(self):
+        filename = avatar_url(self.user).rsplit('/', 1)[1]
+        for url in (f'/media/avatars/{self.user.pk + 1}/{filename}',
+                    f'/media/avatars/{self.user.pk}/{"0" * 12}.webp',
+                    f'/media/avatars/{self.user.pk}/..%2F..%2Fsettings.py'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'auth-tests'}})
+class AuthenticationBackendTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', password='correct horse')
+
+    def test_wrong_password_is_checked_once(self):
+        with mock.patch.object(User, 'check_password', autospec=True, return_value=False) as check_password:
+            self.assertIsNone(authenticate(username='reader', password='wrong'))
+        self.assertEqual(check_password.call_count, 1)
+
+    def test_sessions_of_the_retired_backend_stay_logged_in(self):
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get('/')
+        self.assertEqual(response.wsgi_request.user, self.user)
+        self.assertEqual(self.client.session[BACKEND_SESSION_KEY], 'account.backends.CachedModelBackend')
@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import CustomLoginView, CustomLogoutView
+from .views import CustomLoginView, CustomLogoutView, upload_avatar
 
 app_name = 'accounts'
 
 urlpatterns = [
     path('login/', CustomLoginView.as_view(), name='login'),
     path('logout/', CustomLogoutView.as_view(), name='logout'),
+    path('avatar/', upload_avatar, name='upload_avatar'),
 ]
\ No newline at end of file
@@ -8,6 +8,19 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth.views import LoginView, LogoutView
 from django.urls import reverse_lazy
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404
+from django.utils.cache import patch_cache_control
+import re
+
+from blog_app.metrics import count_upload_bytes
+from blog_app.ratelimit import ratelimit
+
+from .avatars import AVATAR_DIR
+from .forms import AvatarForm
+from .models import Avatar
+
+AVATAR_MAX_AGE = 60 * 60 * 24 * 365
 
 class CustomLoginView(LoginView):
     template_name = 'accounts/login.html'
@@ -25,4 +38,37 @@ class CustomLogoutView(LogoutView):
     
     def dispatch(self, request, *args, **kwargs):
         messages.success(request, 'You have been logged out successfully.')
-        return super().dispatch(request, *args, **kwargs)
\ No newline at end of file
+        return super().dispatch(request, *args, **kwargs)
+
+AVATAR_FILENAME_RE = re.compile(r'^[0-9a-f]{12}\.webp$')
+
+
+def serve_avatar(request, user_id, filename):
+    """Serve a generated avatar; names are content-hashed so they never change"""
+    name = f'{AVATAR_DIR}/{user_id}/{filename}'
+    if not AVATAR_FILENAME_RE.match(filename) or not default_storage.exists(name):
+        raise Http404('Avatar not found')
+    response = FileResponse(default_storage.open(name, 'rb'), content_type='image/webp')
+    patch_cache_control(response, public=True, max_age=AVATAR_MAX_AGE, immutable=True)
+    return response
+
+
+@ratelimit('upload')
+@login_required
+@count_upload_bytes('avatar')
+def upload_avatar(request):
+    """Replace the current user's avatar with an uploaded image"""
+    if request.method == 'POST':
+        avatar = Avatar.objects.filter(user=request.user).first()
+        form = AvatarForm(request.POST, request.FILES, instance=avatar)
+        if form.is_valid():
+            old_image = avatar.image.name if avatar else None
+            avatar = form.save(commit=False)
+            avatar.user = request.user
+            avatar.save()
+            if old_image and old_image != avatar.image.name:
+                default_storage.delete(old_image)
+            messages.success(request, 'Your avatar has been updated.')
+        else:
+            messages.error(request, 'Please upload a valid image.')
+    return redirect('blog:user_profile', username=request.user.username)
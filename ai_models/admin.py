@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import AIModelCategory, AIModel
+from .models import AIModelCategory, AIModel, InferenceJob
 
 
 @admin.register(AIModelCategory)
@@ -68,4 +68,13 @@ class AIModelAdmin(admin.ModelAdmin):
     success_rate_display.short_description = 'Success Rate'
 
 
+@admin.register(InferenceJob)
+class InferenceJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'model', 'user', 'kind', 'status', 'processed_items', 'failed_items', 'created_at']
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['model__name', 'user__username']
+    raw_id_fields = ['model', 'user']
+    readonly_fields = ['created_at', 'started_at', 'completed_at']
+
+
 # Inference-related admin classes removed - functionality disabled
\ No newline at end of file
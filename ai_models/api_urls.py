@@ -3,6 +3,11 @@ from . import api_views
 
 # API endpoints
 urlpatterns = [
+    path('health/', api_views.health, name='api_health'),
     path('models/', api_views.model_list, name='api_model_list'),
     path('models/<slug:slug>/', api_views.model_detail, name='api_model_detail'),
+    path('models/<slug:slug>/cache-stats/', api_views.model_cache_stats, name='api_model_cache_stats'),
+    path('jobs/', api_views.job_submit, name='api_job_submit'),
+    path('jobs/<uuid:job_id>/', api_views.job_detail, name='api_job_detail'),
+    path('jobs/<uuid:job_id>/result/', api_views.job_result, name='api_job_result'),
 ]
@@ -1,8 +1,19 @@
 from rest_framework import serializers
-from rest_framework.decorators import api_view
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from django.conf import settings
+from django.http import FileResponse
 from django.shortcuts import get_object_or_404
-from .models import AIModel, AIModelCategory
+from .models import AIModel, AIModelCategory, InferenceJob
+from .inference_cache import get_inference_cache
+from .jobs import get_worker_pool
+from .permissions import CanEditAIModel, usable_models
+from .throttles import APIRateThrottle, JobSubmitRateThrottle
+from .warmup import state as warmup_state
 
 
 class AIModelCategorySerializer(serializers.ModelSerializer):
@@ -28,7 +39,47 @@ class AIModelSerializer(serializers.ModelSerializer):
         read_only_fields = ['slug', 'created_by', 'total_inferences', 'successful_inferences']
 
 
+class InferenceJobSerializer(serializers.ModelSerializer):
+    model = serializers.SlugRelatedField(slug_field='slug', read_only=True)
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = InferenceJob
+        fields = [
+            'id', 'model', 'kind', 'status', 'total_items', 'processed_items',
+            'failed_items', 'error_message', 'result_url', 'created_at',
+            'started_at', 'completed_at'
+        ]
+        read_only_fields = fields
+
+    def get_result_url(self, obj):
+        if obj.status != 'completed':
+            return None
+        request = self.context.get('request')
+        url = reverse('api_job_result', kwargs={'job_id': obj.pk})
+        return request.build_absolute_uri(url) if request else url
+
+
+class InferenceJobSubmitSerializer(serializers.Serializer):
+    model = serializers.SlugField()
+    input = serializers.JSONField(required=False)
+    input_file = serializers.FileField(required=False)
+
+    def validate_input_file(self, value):
+        if value.size > settings.AI_MODELS_MAX_FILE_SIZE:
+            raise serializers.ValidationError('Batch input file is too large')
+        if not value.name.lower().endswith(('.jsonl', '.ndjson')):
+            raise serializers.ValidationError('Batch input must be a .jsonl file')
+        return value
+
+    def validate(self, attrs):
+        if ('input' in attrs) == ('input_file' in attrs):
+            raise serializers.ValidationError('Provide exactly one of "input" or "input_file"')
+        return attrs
+
+
 @api_view(['GET'])
+@throttle_classes([APIRateThrottle])
 def model_list(request):
     """List all available AI models"""
     models = AIModel.objects.filter(is_public=True, status='ready')
@@ -36,12 +87,94 @@ def model_list(request):
     return Response(serializer.data)
 
 
-@api_view(['GET'])
+@api_view(['GET', 'PATCH'])
+@permission_classes([IsAuthenticated, CanEditAIModel])
+@throttle_classes([APIRateThrottle])
 def model_detail(request, slug):
-    """Get details of a specific AI model"""
-    model = get_object_or_404(AIModel, slug=slug, is_public=True)
+    """Get details of a specific AI model, or update it as one of its editors"""
+    model = get_object_or_404(usable_models(request.user), slug=slug)
+    # Function-based views do not run object permissions automatically
+    if not CanEditAIModel().has_object_permission(request, None, model):
+        raise PermissionDenied('You do not have permission to edit this model.')
+    if request.method == 'PATCH':
+        serializer = AIModelSerializer(model, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
     serializer = AIModelSerializer(model)
     return Response(serializer.data)
 
 
+@api_view(['GET'])
+@throttle_classes([APIRateThrottle])
+def model_cache_stats(request, slug):
+    """Get inference result cache hit/miss metrics for a model"""
+    model = get_object_or_404(AIModel, slug=slug, is_public=True)
+    return Response({
+        'model': model.slug,
+        'version': model.version,
+        'cache': get_inference_cache().stats(model.slug),
+    })
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def health(request):
+    """Report whether this worker has finished warming up its models"""
+    http_status = status.HTTP_200_OK if warmup_state.is_ready else status.HTTP_503_SERVICE_UNAVAILABLE
+    return Response(warmup_state.as_dict(), status=http_status)
+
+
+@api_view(['POST'])
+@throttle_classes([APIRateThrottle, JobSubmitRateThrottle])
+def job_submit(request):
+    """Queue an asynchronous inference or JSONL batch-scoring job"""
+    serializer = InferenceJobSubmitSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+
+    model = get_object_or_404(usable_models(request.user), slug=data['model'])
+    job = InferenceJob(model=model, user=request.user)
+    if 'input_file' in data:
+        job.kind = 'batch'
+        job.input_file = data['input_file']
+    else:
+        job.input_data = data['input']
+    job.save()
+    get_worker_pool().submit(job)
+
+    return Response(
+        InferenceJobSerializer(job, context={'request': request}).data,
+        status=status.HTTP_202_ACCEPTED,
+    )
+
+
+@api_view(['GET'])
+@throttle_classes([APIRateThrottle])
+def job_detail(request, job_id):
+    """Poll the state and progress of a job"""
+    job = get_object_or_404(InferenceJob.objects.select_related('model'), pk=job_id, user=request.user)
+    return Response(InferenceJobSerializer(job, context={'request': request}).data)
+
+
+@api_view(['GET'])
+@throttle_classes([APIRateThrottle])
+def job_result(request, job_id):
+    """Fetch a finished job's output; batch results stream out as JSONL"""
+    job = get_object_or_404(InferenceJob, pk=job_id, user=request.user)
+    if job.status != 'completed':
+        return Response(
+            {'detail': f'Job is {job.status}', 'error_message': job.error_message},
+            status=status.HTTP_409_CONFLICT,
+        )
+    if job.kind == 'batch':
+        return FileResponse(
+            job.result_file.open('rb'),
+            content_type='application/x-ndjson',
+            as_attachment=True,
+            filename=f'{job.pk}.jsonl',
+        )
+    return Response({'id': str(job.pk), 'result': job.result})
+
+
 # Inference-related API endpoints removed - functionality disabled
@@ -1,7 +1,22 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
 class AiModelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ai_models'
-    verbose_name = 'AI Models'
\ No newline at end of file
+    verbose_name = 'AI Models'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .warmup import get_warmup_settings, start_background_warmup
+
+        if get_warmup_settings()['ON_START'] and not self._is_management_command():
+            start_background_warmup()
+
+    @staticmethod
+    def _is_management_command():
+        """Skip warm-up for migrate, shell and friends; only serving processes need it"""
+        return os.path.basename(sys.argv[0]) == 'manage.py' and sys.argv[1:2] != ['runserver']
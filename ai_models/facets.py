@@ -0,0 +1,113 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, F, Max, Q
+
+from .models import AIModel, AIModelCategory
+
+FACET_CACHE_TIMEOUT = 60 * 10
+
+METRIC_FILTERS = {
+    'min_accuracy': ('accuracy', 'gte'),
+    'max_accuracy': ('accuracy', 'lte'),
+    'min_f1': ('f1_score', 'gte'),
+    'max_f1': ('f1_score', 'lte'),
+}
+
+SORT_OPTIONS = {
+    'newest': ('Newest', ['-created_at']),
+    '-accuracy': ('Highest accuracy', [F('accuracy').desc(nulls_last=True), '-created_at']),
+    'accuracy': ('Lowest accuracy', [F('accuracy').asc(nulls_last=True), '-created_at']),
+    '-f1_score': ('Highest F1 score', [F('f1_score').desc(nulls_last=True), '-created_at']),
+    'f1_score': ('Lowest F1 score', [F('f1_score').asc(nulls_last=True), '-created_at']),
+}
+
+
+def parse_metric_filters(params):
+    """Return valid metric bounds from query parameters as floats"""
+    bounds = {}
+    for param in METRIC_FILTERS:
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        try:
+            bounds[param] = float(value)
+        except ValueError:
+            continue
+    return bounds
+
+
+def apply_base_filters(queryset, search_query=None, metric_bounds=None):
+    """Apply the filters that every facet shares (search and metric ranges)"""
+    if search_query:
+        queryset = queryset.filter(
+            Q(name__icontains=search_query) |
+            Q(description__icontains=search_query)
+        )
+    for param, value in (metric_bounds or {}).items():
+        field, lookup = METRIC_FILTERS[param]
+        queryset = queryset.filter(**{f'{field}__{lookup}': value})
+    return queryset
+
+
+def _cache_key(search_query, metric_bounds, categories):
+    """
+    Key built from the filters and a fingerprint of the catalogue.
+
+    The fingerprint (model count and latest ``updated_at``, plus the
+    category list) is read from the database, so edits made through any
+    worker reach every worker's cache without a shared invalidation key.
+    """
+    fingerprint = AIModel.objects.order_by().aggregate(count=Count('pk'), latest=Max('updated_at'))
+    latest = fingerprint['latest']
+    payload = json.dumps({
+        'search': search_query or '',
+        'metrics': metric_bounds,
+        'models': [fingerprint['count'], latest.timestamp() if latest else 0],
+        'categories': categories,
+    }, sort_keys=True)
+    return f'ai_models:facets:{hashlib.md5(payload.encode("utf-8")).hexdigest()}'
+
+
+def _grouped_counts(queryset):
+    """Count models per (category, model_type) pair in one grouped query"""
+    rows = (
+        queryset.order_by()
+        .values('category__slug', 'model_type')
+        .annotate(total=Count('id'))
+    )
+    return [(row['category__slug'], row['model_type'], row['total']) for row in rows]
+
+
+def get_facets(base_queryset, search_query=None, metric_bounds=None, category_slug=None, model_type=None):
+    """
+    Return per-category and per-model_type counts for the active filters.
+
+    Each facet ignores its own selection so users can see what switching
+    to another category or type would return.
+    """
+    category_list = list(AIModelCategory.objects.values_list('slug', 'name'))
+    key = _cache_key(search_query, metric_bounds, category_list)
+    grouped = cache.get(key)
+    if grouped is None:
+        grouped = _grouped_counts(apply_base_filters(base_queryset, search_query, metric_bounds))
+        cache.set(key, grouped, FACET_CACHE_TIMEOUT)
+
+    category_counts = {}
+    type_counts = {}
+    for category, type_code, total in grouped:
+        if not model_type or type_code == model_type:
+            category_counts[category] = category_counts.get(category, 0) + total
+        if not category_slug or category == category_slug:
+            type_counts[type_code] = type_counts.get(type_code, 0) + total
+
+    categories = [
+        {'slug': slug, 'name': name, 'count': category_counts.get(slug, 0)}
+        for slug, name in category_list
+    ]
+    model_types = [
+        {'code': code, 'name': name, 'count': type_counts.get(code, 0)}
+        for code, name in AIModel.MODEL_TYPES
+    ]
+    return {'categories': categories, 'model_types': model_types}
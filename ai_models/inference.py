@@ -0,0 +1,195 @@
+import mmap
+import os
+import threading
+import time
+
+from blog_app import metrics
+
+from .inference_cache import get_inference_cache
+
+
+INFERENCE_SECONDS = metrics.histogram('ai_model_inference_seconds', 'Model execution time (cache misses only)', ['model'])
+INFERENCE_REQUESTS = metrics.counter('ai_model_inference_total', 'Inference calls by model and outcome', ['model', 'outcome'])
+LOADED_MODELS = metrics.gauge('ai_models_loaded', 'Models held in memory by the registry')
+
+
+class InferenceUnavailable(Exception):
+    """Raised when a loaded model cannot be executed in this process"""
+
+
+class LoadedModel:
+    """A model file loaded into memory, ready to be executed"""
+
+    def __init__(self, ai_model, handle, backend):
+        self.slug = ai_model.slug
+        self.version = ai_model.version
+        self.model_file = ai_model.model_file.name
+        self.handle = handle
+        self.backend = backend
+
+    def matches(self, ai_model):
+        return (
+            self.version == ai_model.version
+            and self.model_file == (ai_model.model_file.name if ai_model.model_file else '')
+        )
+
+    @property
+    def executable(self):
+        # A weights_only torch file loads as a plain state dict, and mmap only holds the bytes
+        return self.backend == 'onnxruntime' or callable(self.handle)
+
+    def predict(self, input_data):
+        if self.backend == 'onnxruntime':
+            return _run_onnx(self.handle, input_data)
+        if self.executable:
+            return self.handle(input_data)
+        raise InferenceUnavailable(f'No executable runtime for {self.slug} ({self.backend})')
+
+    def close(self):
+        if self.backend == 'mmap':
+            self.handle.close()
+
+
+# numpy dtype names per ONNX tensor element type (NodeArg.type)
+ONNX_DTYPES = {
+    'tensor(float)': 'float32',
+    'tensor(double)': 'float64',
+    'tensor(float16)': 'float16',
+    'tensor(int8)': 'int8',
+    'tensor(int16)': 'int16',
+    'tensor(int32)': 'int32',
+    'tensor(int64)': 'int64',
+    'tensor(uint8)': 'uint8',
+    'tensor(bool)': 'bool',
+    'tensor(string)': 'object',
+}
+
+
+def _run_onnx(session, input_data):
+    import numpy as np
+
+    feeds = {}
+    for node in session.get_inputs():
+        value = input_data.get(node.name) if isinstance(input_data, dict) else input_data
+        if value is None:
+            raise InferenceUnavailable(f'Missing ONNX input "{node.name}"')
+        dtype = ONNX_DTYPES.get(node.type)
+        if dtype is None:
+            raise InferenceUnavailable(f'Unsupported ONNX input type {node.type} for "{node.name}"')
+        feeds[node.name] = np.asarray(value, dtype=dtype)
+    outputs = session.run(None, feeds)
+    return [output.tolist() for output in outputs]
+
+
+def _load_onnx(path):
+    try:
+        import onnxruntime
+    except ImportError:
+        return None
+    return onnxruntime.InferenceSession(path, providers=['CPUExecutionProvider'])
+
+
+def _load_torch(path):
+    try:
+        import torch
+    except ImportError:
+        return None
+    # mmap keeps weights in the page cache shared between pre-forked workers
+    return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+
+
+def _map_file(path):
+    with open(path, 'rb') as handle:
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_WILLNEED'):
+        mapped.madvise(mmap.MADV_WILLNEED)
+    # Touch one byte per page so the first request does not fault them in
+    for offset in range(0, len(mapped), mmap.PAGESIZE):
+        mapped[offset]
+    return mapped
+
+
+LOADERS = {
+    '.onnx': ('onnxruntime', _load_onnx),
+    '.pth': ('torch', _load_torch),
+    '.pt': ('torch', _load_torch),
+}
+
+
+def load_model(ai_model):
+    """Load ``ai_model.model_file`` with the best available runtime"""
+    if not ai_model.model_file:
+        raise InferenceUnavailable(f'{ai_model.slug} has no model file')
+    path = ai_model.model_file.path
+    extension = os.path.splitext(path)[1].lower()
+    backend, loader = LOADERS.get(extension, (None, None))
+    if loader is not None:
+        handle = loader(path)
+        if handle is not None:
+            return LoadedModel(ai_model, handle, backend)
+    if os.path.getsize(path) == 0:
+        raise InferenceUnavailable(f'{ai_model.slug} has an empty model file')
+    return LoadedModel(ai_model, _map_file(path), 'mmap')
+
+
+class ModelRegistry:
+    """Per-process registry of loaded models"""
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def get(self, ai_model):
+        """Return the loaded model, loading it on first use or after a change"""
+        loaded = self._models.get(ai_model.slug)
+        if loaded is not None and loaded.matches(ai_model):
+            return loaded
+        with self._lock:
+            loaded = self._models.get(ai_model.slug)
+            if loaded is None or not loaded.matches(ai_model):
+                if loaded is not None:
+                    loaded.close()
+                loaded = load_model(ai_model)
+                self._models[ai_model.slug] = loaded
+                LOADED_MODELS.set(len(self._models))
+        return loaded
+
+    def is_loaded(self, ai_model):
+        loaded = self._models.get(ai_model.slug)
+        return loaded is not None and loaded.matches(ai_model)
+
+    def unload(self, slug):
+        with self._lock:
+            loaded = self._models.pop(slug, None)
+            LOADED_MODELS.set(len(self._models))
+        if loaded is not None:
+            loaded.close()
+
+    def loaded_slugs(self):
+        return list(self._models)
+
+
+registry = ModelRegistry()
+
+
+def run_inference(ai_model, input_data, use_cache=True):
+    """Run ``input_data`` through ``ai_model``, serving repeats from the result cache"""
+    computed = []
+
+    def compute(model, data):
+        started = time.perf_counter()
+        result = registry.get(model).predict(data)
+        INFERENCE_SECONDS.observe(time.perf_counter() - started, model=model.slug)
+        computed.append(True)
+        return result
+
+    try:
+        if not use_cache:
+            result = compute(ai_model, input_data)
+        else:
+            result = get_inference_cache().get_or_compute(ai_model, input_data, compute)
+    except Exception:
+        INFERENCE_REQUESTS.inc(model=ai_model.slug, outcome='error')
+        raise
+    INFERENCE_REQUESTS.inc(model=ai_model.slug, outcome='computed' if computed else 'cached')
+    return result
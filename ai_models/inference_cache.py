@@ -0,0 +1,214 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+
+def canonicalize_input(input_data):
+    """Normalize input data so equivalent payloads hash the same"""
+    if isinstance(input_data, str):
+        return unicodedata.normalize('NFC', input_data).strip()
+    if isinstance(input_data, dict):
+        return {str(key): canonicalize_input(value) for key, value in input_data.items()}
+    if isinstance(input_data, (list, tuple)):
+        return [canonicalize_input(value) for value in input_data]
+    return input_data
+
+
+def hash_input(input_data):
+    """Return a stable SHA-256 digest of the canonicalized input"""
+    payload = json.dumps(
+        canonicalize_input(input_data),
+        sort_keys=True,
+        separators=(',', ':'),
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _empty_stats():
+    return {'hits': 0, 'misses': 0, 'disk_hits': 0, 'evictions': 0}
+
+
+class _DiskTier:
+    """SQLite-backed second tier for evicted or cold entries"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS inference_cache ('
+                'key TEXT PRIMARY KEY, slug TEXT NOT NULL, '
+                'value TEXT NOT NULL, expires_at REAL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS inference_cache_slug ON inference_cache (slug)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM inference_cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None, None
+        value, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            self.delete(key)
+            return None, None
+        return json.loads(value), expires_at
+
+    def set(self, key, slug, value, expires_at):
+        with self._connection() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO inference_cache (key, slug, value, expires_at) VALUES (?, ?, ?, ?)',
+                (key, slug, json.dumps(value, default=str), expires_at),
+            )
+
+    def delete(self, key):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM inference_cache WHERE key = ?', (key,))
+
+    def delete_slug(self, slug):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM inference_cache WHERE slug = ?', (slug,))
+
+    def clear(self):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM inference_cache')
+
+
+class InferenceResultCache:
+    """
+    LRU cache for inference results keyed by model slug, version,
+    model file and a hash of the canonicalized input.
+    """
+
+    def __init__(self, max_entries=1024, ttl=None, disk_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = defaultdict(_empty_stats)
+        self._disk = _DiskTier(disk_path) if disk_path else None
+
+    @staticmethod
+    def make_key(model, input_data):
+        model_file = model.model_file.name if model.model_file else ''
+        return (model.slug, model.version, model_file, hash_input(input_data))
+
+    @staticmethod
+    def _disk_key(key):
+        return '|'.join(key)
+
+    def get(self, model, input_data, default=None):
+        """Return a cached result or ``default`` when absent or expired"""
+        key = self.make_key(model, input_data)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self._stats[model.slug]['hits'] += 1
+                    return value
+                del self._entries[key]
+
+        if self._disk is not None:
+            value, expires_at = self._disk.get(self._disk_key(key))
+            if value is not None:
+                with self._lock:
+                    self._store(key, value, expires_at)
+                    self._stats[model.slug]['hits'] += 1
+                    self._stats[model.slug]['disk_hits'] += 1
+                return value
+
+        with self._lock:
+            self._stats[model.slug]['misses'] += 1
+        return default
+
+    def set(self, model, input_data, value):
+        key = self.make_key(model, input_data)
+        expires_at = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self._disk is not None:
+            self._disk.set(self._disk_key(key), model.slug, value, expires_at)
+
+    def get_or_compute(self, model, input_data, compute):
+        """Return the cached result for ``input_data`` or compute and store it"""
+        sentinel = object()
+        value = self.get(model, input_data, default=sentinel)
+        if value is sentinel:
+            value = compute(model, input_data)
+            self.set(model, input_data, value)
+        return value
+
+    def _store(self, key, value, expires_at):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._stats[evicted_key[0]]['evictions'] += 1
+
+    def invalidate_model(self, slug):
+        """Drop every entry belonging to the model with ``slug``"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == slug]:
+                del self._entries[key]
+        if self._disk is not None:
+            self._disk.delete_slug(slug)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stats.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self, slug=None):
+        """Return hit/miss counters, for one model or keyed by slug"""
+        with self._lock:
+            if slug is not None:
+                return self._format_stats(self._stats.get(slug) or _empty_stats(), slug)
+            return {key: self._format_stats(value, key) for key, value in self._stats.items()}
+
+    def _format_stats(self, counters, slug):
+        lookups = counters['hits'] + counters['misses']
+        return {
+            **counters,
+            'entries': sum(1 for key in self._entries if key[0] == slug),
+            'hit_rate': counters['hits'] / lookups if lookups else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_inference_cache():
+    """Return the process-wide cache configured by ``AI_MODELS_INFERENCE_CACHE``"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = getattr(settings, 'AI_MODELS_INFERENCE_CACHE', {})
+                _cache = InferenceResultCache(
+                    max_entries=config.get('MAX_ENTRIES', 1024),
+                    ttl=config.get('TTL'),
+                    disk_path=config.get('DISK_PATH'),
+                )
+    return _cache
@@ -0,0 +1,190 @@
+import json
+import logging
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .inference import run_inference
+from .models import InferenceJob
+
+logger = logging.getLogger(__name__)
+
+
+def get_job_settings():
+    config = getattr(settings, 'AI_MODELS_JOBS', {})
+    return {
+        'MAX_WORKERS': config.get('MAX_WORKERS', 4),
+        'PER_MODEL_CONCURRENCY': config.get('PER_MODEL_CONCURRENCY', 1),
+        'MODEL_CONCURRENCY': config.get('MODEL_CONCURRENCY', {}),
+        'PROGRESS_EVERY': config.get('PROGRESS_EVERY', 100),
+        # Jobs still 'running' this long after they started belonged to a worker that died
+        'STALE_AFTER_SECONDS': config.get('STALE_AFTER_SECONDS', 3600),
+    }
+
+
+class JobWorkerPool:
+    """
+    Thread pool that runs inference jobs with a concurrency limit per model.
+
+    A job whose model is at its limit waits in a per-model queue instead
+    of occupying a pool thread, so one busy model never starves the
+    others; the thread that finishes a job of that model starts the next.
+    """
+
+    def __init__(self, max_workers, per_model_concurrency=1, model_concurrency=None):
+        self.max_workers = max_workers
+        self.per_model_concurrency = per_model_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self._executor = None
+        self._running = {}
+        self._waiting = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ai-models-job')
+        return self._executor
+
+    def submit(self, job):
+        """Queue ``job`` once the surrounding transaction has committed"""
+        slug = job.model.slug
+        job_id = job.pk
+        transaction.on_commit(lambda: self._dispatch(job_id, slug))
+
+    def _dispatch(self, job_id, slug):
+        limit = self.model_concurrency.get(slug, self.per_model_concurrency)
+        with self._lock:
+            if self._running.get(slug, 0) >= limit:
+                self._waiting.setdefault(slug, deque()).append(job_id)
+                return
+            self._running[slug] = self._running.get(slug, 0) + 1
+        self._get_executor().submit(self._run, job_id, slug)
+
+    def _run(self, job_id, slug):
+        close_old_connections()
+        try:
+            process_job(job_id)
+        except Exception:
+            logger.exception('Inference job %s crashed', job_id)
+        finally:
+            close_old_connections()
+            with self._lock:
+                waiting = self._waiting.get(slug)
+                next_job_id = waiting.popleft() if waiting else None
+                if next_job_id is None:
+                    self._running[slug] -= 1
+            if next_job_id is not None:
+                # Keep the model's slot and hand it to its next job
+                self._get_executor().submit(self._run, next_job_id, slug)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            # Jobs still waiting for their model stay 'pending' for run_pending_jobs
+            self._waiting.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+def _claim(job_id):
+    """Atomically move a pending job to running; return it or ``None``"""
+    claimed = InferenceJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', started_at=timezone.now()
+    )
+    if not claimed:
+        return None
+    return InferenceJob.objects.select_related('model').get(pk=job_id)
+
+
+def process_job(job_id):
+    """Run a single or batch job to completion, persisting its state"""
+    job = _claim(job_id)
+    if job is None:
+        return None
+    try:
+        if job.kind == 'batch':
+            _process_batch(job)
+        else:
+            job.result = run_inference(job.model, job.input_data)
+            job.total_items = job.processed_items = 1
+        job.status = 'completed'
+    except Exception as exc:
+        logger.exception('Inference job %s failed', job.pk)
+        job.status = 'failed'
+        job.error_message = str(exc)
+    job.completed_at = timezone.now()
+    job.save()
+    return job
+
+
+def _process_batch(job):
+    """Score a JSONL input file line by line into a JSONL result file"""
+    progress_every = get_job_settings()['PROGRESS_EVERY']
+    with tempfile.TemporaryFile(mode='w+b') as output:
+        with job.input_file.open('rb') as source:
+            for line_number, raw_line in enumerate(source, start=1):
+                if not raw_line.strip():
+                    continue
+                job.total_items += 1
+                try:
+                    record = {'line': line_number, 'output': run_inference(job.model, json.loads(raw_line))}
+                    job.processed_items += 1
+                except Exception as exc:
+                    record = {'line': line_number, 'error': str(exc)}
+                    job.failed_items += 1
+                output.write(json.dumps(record, default=str).encode('utf-8') + b'\n')
+
+                if job.total_items % progress_every == 0:
+                    InferenceJob.objects.filter(pk=job.pk).update(
+                        total_items=job.total_items,
+                        processed_items=job.processed_items,
+                        failed_items=job.failed_items,
+                    )
+        output.seek(0)
+        job.result_file.save(f'{job.pk}.jsonl', File(output), save=False)
+    job.result = {'processed': job.processed_items, 'failed': job.failed_items}
+
+
+def reclaim_stale_jobs():
+    """Return jobs left 'running' by a crashed worker (see STALE_AFTER_SECONDS) to 'pending'; return how many"""
+    cutoff = timezone.now() - timedelta(seconds=get_job_settings()['STALE_AFTER_SECONDS'])
+    return InferenceJob.objects.filter(status='running', started_at__lt=cutoff).update(
+        status='pending', started_at=None, total_items=0, processed_items=0, failed_items=0,
+    )
+
+
+def run_pending_jobs(limit=None):
+    """Process queued jobs in this process, e.g. after a worker restart, including reclaimed stale ones"""
+    reclaim_stale_jobs()
+    job_ids = InferenceJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True)
+    if limit is not None:
+        job_ids = job_ids[:limit]
+    return [job for job in (process_job(job_id) for job_id in list(job_ids)) if job is not None]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Return the process-wide pool configured by ``AI_MODELS_JOBS``"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = get_job_settings()
+                _pool = JobWorkerPool(
+                    max_workers=config['MAX_WORKERS'],
+                    per_model_concurrency=config['PER_MODEL_CONCURRENCY'],
+                    model_concurrency=config['MODEL_CONCURRENCY'],
+                )
+    return _pool
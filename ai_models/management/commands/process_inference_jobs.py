@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from ai_models.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = ('Process queued inference jobs, e.g. ones left pending by a restarted worker, and retry jobs '
+            'left running by a crashed one')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None, help='Maximum number of jobs to process')
+
+    def handle(self, *args, **options):
+        jobs = run_pending_jobs(limit=options['limit'])
+
+        for job in jobs:
+            style = self.style.SUCCESS if job.status == 'completed' else self.style.ERROR
+            self.stdout.write(style(f'{job.id}: {job.status}'))
+
+        self.stdout.write(f'Processed {len(jobs)} job(s)')
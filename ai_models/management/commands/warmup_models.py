@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from ai_models.warmup import get_warmup_settings, warm_up_models
+
+
+class Command(BaseCommand):
+    help = 'Preload the most-used deployed/ready AI models and run a synthetic input through each'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=get_warmup_settings()['LIMIT'],
+            help='Number of models to warm up',
+        )
+
+    def handle(self, *args, **options):
+        result = warm_up_models(limit=options['limit'])
+
+        for slug, info in result['models'].items():
+            if info['status'] == 'ready':
+                self.stdout.write(f"Warmed {slug} ({info['backend']}) in {info['seconds']}s")
+            else:
+                self.stdout.write(self.style.WARNING(f"Failed {slug}: {info['detail']}"))
+
+        if not result['models']:
+            self.stdout.write('No deployed or ready models with a model file to warm up')
+
+        self.stdout.write(self.style.SUCCESS(f"Warm-up finished: {result['status']}"))
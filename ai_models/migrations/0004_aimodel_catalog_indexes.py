@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_models', '0003_inferencejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aimodel',
+            index=models.Index(fields=['is_public', 'status', '-created_at'], name='ai_model_catalog_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aimodel',
+            index=models.Index(fields=['is_public', 'status', '-accuracy'], name='ai_model_catalog_acc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aimodel',
+            index=models.Index(fields=['is_public', 'status', '-f1_score'], name='ai_model_catalog_f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='aimodel',
+            index=models.Index(fields=['is_public', 'status', 'category', 'model_type'], name='ai_model_catalog_facet_idx'),
+        ),
+    ]
@@ -1,8 +1,9 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.utils.text import slugify
+from blog_app.slugs import save_with_unique_slug
 import json
+import uuid
 
 
 class AIModelCategory(models.Model):
@@ -22,7 +23,7 @@ class AIModelCategory(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            return save_with_unique_slug(self, self.name, super().save, *args, **kwargs)
         super().save(*args, **kwargs)
 
 
@@ -95,6 +96,11 @@ class AIModel(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['model_type']),
             models.Index(fields=['is_public']),
+            # Catalogue listing: public/ready filter plus metric sorts and facets
+            models.Index(fields=['is_public', 'status', '-created_at'], name='ai_model_catalog_idx'),
+            models.Index(fields=['is_public', 'status', '-accuracy'], name='ai_model_catalog_acc_idx'),
+            models.Index(fields=['is_public', 'status', '-f1_score'], name='ai_model_catalog_f1_idx'),
+            models.Index(fields=['is_public', 'status', 'category', 'model_type'], name='ai_model_catalog_facet_idx'),
         ]
     
     def __str__(self):
@@ -105,7 +111,7 @@ class AIModel(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(f"{self.name}-{self.version}")
+            return save_with_unique_slug(self, f"{self.name}-{self.version}", super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     @property
@@ -116,4 +122,54 @@ class AIModel(models.Model):
         return (self.successful_inferences / self.total_inferences) * 100
 
 
+class InferenceJob(models.Model):
+    """Asynchronous inference or batch-scoring job processed by the worker pool"""
+    KIND_CHOICES = [
+        ('single', 'Single Inference'),
+        ('batch', 'Batch Scoring'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    model = models.ForeignKey(AIModel, on_delete=models.CASCADE, related_name='jobs')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inference_jobs')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default='single')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    # Single jobs keep their payload inline, batch jobs read and write JSONL files
+    input_data = models.JSONField(null=True, blank=True)
+    input_file = models.FileField(upload_to='ai_models/jobs/input/%Y/%m/', blank=True, null=True)
+    result = models.JSONField(null=True, blank=True)
+    result_file = models.FileField(upload_to='ai_models/jobs/output/%Y/%m/', blank=True, null=True)
+    error_message = models.TextField(blank=True)
+
+    total_items = models.PositiveIntegerField(default=0)
+    processed_items = models.PositiveIntegerField(default=0)
+    failed_items = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['user', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} job {self.id} for {self.model}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('completed', 'failed')
+
+
 # Inference-related models removed - functionality disabled
\ No newline at end of file
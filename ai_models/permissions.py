@@ -0,0 +1,62 @@
+from django.db.models import Q
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+from .models import AIModel
+
+EDITABLE_IDS_ATTR = '_editable_ai_model_ids'
+
+
+def is_team_member(user, model):
+    """Check membership with an indexed EXISTS instead of loading the team"""
+    if not user.is_authenticated:
+        return False
+    return AIModel.team_members.through.objects.filter(aimodel_id=model.pk, user_id=user.pk).exists()
+
+
+def editable_models(user):
+    """Models the user created or is a team member of"""
+    return AIModel.objects.filter(Q(created_by=user) | Q(team_members=user)).distinct()
+
+
+def usable_models(user):
+    """Models the user may view or run: public ones plus the ones they edit"""
+    return AIModel.objects.filter(
+        Q(is_public=True) | Q(created_by=user) | Q(team_members=user)
+    ).distinct()
+
+
+def get_editable_model_ids(request):
+    """Return the IDs of models the request's user can edit, cached on the request"""
+    # DRF wraps the Django request; cache on the underlying one so both paths share it
+    request = getattr(request, '_request', request)
+    ids = getattr(request, EDITABLE_IDS_ATTR, None)
+    if ids is None:
+        if request.user.is_authenticated:
+            ids = frozenset(
+                AIModel.objects.filter(Q(created_by=request.user) | Q(team_members=request.user))
+                .values_list('pk', flat=True)
+            )
+        else:
+            ids = frozenset()
+        setattr(request, EDITABLE_IDS_ATTR, ids)
+    return ids
+
+
+def can_edit_model(user, model, request=None):
+    """Return whether ``user`` may edit ``model``"""
+    if not user.is_authenticated:
+        return False
+    if user.is_staff or model.created_by_id == user.pk:
+        return True
+    if request is not None:
+        return model.pk in get_editable_model_ids(request)
+    return is_team_member(user, model)
+
+
+class CanEditAIModel(BasePermission):
+    """Allow reads to everyone the view admits and writes to the model's editors"""
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        return can_edit_model(request.user, obj, request)
@@ -0,0 +1,26 @@
+from django.db.models.signals import pre_save, post_delete
+from django.dispatch import receiver
+from .models import AIModel
+from .inference import registry
+from .inference_cache import get_inference_cache
+
+
+@receiver(pre_save, sender=AIModel)
+def invalidate_cache_on_model_change(sender, instance, **kwargs):
+    """Drop cached results and loaded weights when the model file or version changes"""
+    if not instance.pk:
+        return
+    previous = AIModel.objects.filter(pk=instance.pk).values('slug', 'version', 'model_file').first()
+    if previous is None:
+        return
+    model_file = instance.model_file.name if instance.model_file else ''
+    if previous['version'] != instance.version or (previous['model_file'] or '') != model_file:
+        get_inference_cache().invalidate_model(previous['slug'])
+        registry.unload(previous['slug'])
+
+
+@receiver(post_delete, sender=AIModel)
+def invalidate_cache_on_model_delete(sender, instance, **kwargs):
+    """Drop cached results and loaded weights of deleted models"""
+    get_inference_cache().invalidate_model(instance.slug)
+    registry.unload(instance.slug)
@@ -1,3 +1,117 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .facets import get_facets
+from .inference import InferenceUnavailable, _run_onnx, registry
+from .models import AIModel, AIModelCategory
+from .warmup import state, warm_up_models
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class WarmUpTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('owner')
+
+    def make_model(self, slug, filename):
+        Path(self.media_root, filename).write_bytes(b'weights')
+        self.addCleanup(registry.unload, slug)
+        return AIModel.objects.create(name=slug, slug=slug, description='Model', model_type='classification',
+                                      model_file=filename, status='deployed', input_format={'text': 'string'},
+                                      created_by=self.user)
+
+    def test_callable_models_are_ready(self):
+        self.make_model('callable', 'callable.pt')
+        with mock.patch.dict('ai_models.inference.LOADERS', {'.pt': ('torch', lambda path: lambda data: [0.5])}):
+            result = warm_up_models(limit=5)
+        self.assertEqual(result['status'], 'ready')
+        self.assertEqual(result['models']['callable']['status'], 'ready')
+        self.assertTrue(result['models']['callable']['executed'])
+
+    def test_state_dicts_and_raw_files_are_not_ready(self):
+        self.make_model('state-dict', 'state_dict.pt')
+        self.make_model('raw', 'raw.bin')
+        # What torch.load(weights_only=True) returns for a saved state_dict()
+        with mock.patch.dict('ai_models.inference.LOADERS', {'.pt': ('torch', lambda path: {'weight': [1.0]})}), \
+                self.assertLogs('ai_models.warmup', 'WARNING'):
+            result = warm_up_models(limit=5)
+        self.assertEqual(result['status'], 'degraded')
+        self.assertTrue(state.is_ready)
+        for slug in ('state-dict', 'raw'):
+            with self.subTest(slug=slug):
+                self.assertEqual(result['models'][slug]['status'], 'failed')
+                self.assertIn('No executable runtime', result['models'][slug]['detail'])
+                self.assertNotIn(slug, registry.loaded_slugs())
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'facet-tests'}})
+class FacetCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('owner')
+        cls.vision = AIModelCategory.objects.create(name='Vision', slug='vision')
+        cls.model = AIModel.objects.create(name='Model', slug='model', description='Model', model_type='classification',
+                                           category=cls.vision, status='ready', is_public=True, created_by=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def counts(self):
+        facets = get_facets(AIModel.objects.filter(is_public=True, status='ready'))
+        return {category['slug']: category['count'] for category in facets['categories']}
+
+    def test_counts_follow_changes_made_by_other_workers(self):
+        self.assertEqual(self.counts(), {'vision': 1})
+        # No signal runs in this process, as when another worker saves the model
+        AIModel.objects.filter(pk=self.model.pk).update(status='training', updated_at=timezone.now())
+        self.assertEqual(self.counts(), {'vision': 0})
+        AIModelCategory.objects.filter(pk=self.vision.pk).update(slug='images')
+        self.assertEqual(self.counts(), {'images': 0})
+
+
+class FakeSession:
+    """Echoes its feeds back, the way an identity ONNX graph would"""
+
+    def __init__(self, inputs):
+        self.inputs = [SimpleNamespace(name=name, type=type_) for name, type_ in inputs]
+        self.feeds = None
+
+    def get_inputs(self):
+        return self.inputs
+
+    def run(self, output_names, feeds):
+        self.feeds = feeds
+        return [feeds[node.name] for node in self.inputs]
+
+
+@skipUnless(numpy, 'numpy is not installed')
+class OnnxInputTests(SimpleTestCase):
+    def test_inputs_get_the_dtype_of_their_node(self):
+        types = {'f': ('tensor(float)', 'float32'), 'd': ('tensor(double)', 'float64'),
+                 'i': ('tensor(int32)', 'int32'), 'l': ('tensor(int64)', 'int64'),
+                 'b': ('tensor(bool)', 'bool'), 's': ('tensor(string)', 'object')}
+        session = FakeSession([(name, type_) for name, (type_, _) in types.items()])
+        _run_onnx(session, {'f': [0.5], 'd': [0.5], 'i': [1], 'l': [1], 'b': [True], 's': ['text']})
+        self.assertEqual({name: str(array.dtype) for name, array in session.feeds.items()},
+                         {name: dtype for name, (_, dtype) in types.items()})
+
+    def test_unsupported_types_are_reported(self):
+        session = FakeSession([('x', 'tensor(complex64)')])
+        with self.assertRaisesMessage(InferenceUnavailable, 'Unsupported ONNX input type tensor(complex64) for "x"'):
+            _run_onnx(session, {'x': [1]})
@@ -0,0 +1,23 @@
+from rest_framework.throttling import BaseThrottle
+
+from blog_app.ratelimit import check_rate
+
+
+class ScopedRateThrottle(BaseThrottle):
+    """DRF throttle backed by the shared RATE_LIMITS scopes"""
+    scope = 'api'
+
+    def allow_request(self, request, view):
+        allowed, self.retry_after = check_rate(self.scope, request)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
+
+
+class APIRateThrottle(ScopedRateThrottle):
+    scope = 'api'
+
+
+class JobSubmitRateThrottle(ScopedRateThrottle):
+    scope = 'api_jobs'
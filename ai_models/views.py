@@ -2,18 +2,26 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Count, Q
+from blog_app.metrics import count_upload_bytes
 from .models import AIModel, AIModelCategory
 from .forms import AIModelForm, AIModelCategoryForm
+from .permissions import can_edit_model
+from .facets import SORT_OPTIONS, apply_base_filters, get_facets, parse_metric_filters
 
 
 def model_list_view(request):
-    """Display list of available AI models"""
+    """Display list of available AI models with faceted filters"""
     category_slug = request.GET.get('category')
     search_query = request.GET.get('search')
     model_type = request.GET.get('type')
+    metric_bounds = parse_metric_filters(request.GET)
+    sort = request.GET.get('sort')
+    if sort not in SORT_OPTIONS:
+        sort = 'newest'
     
-    models = AIModel.objects.filter(is_public=True, status='ready')
+    base_models = AIModel.objects.filter(is_public=True, status='ready')
+    models = apply_base_filters(base_models, search_query, metric_bounds)
     
     # Filter by category
     if category_slug:
@@ -23,29 +31,30 @@ def model_list_view(request):
     if model_type:
         models = models.filter(model_type=model_type)
     
-    # Search functionality
-    if search_query:
-        models = models.filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+    models = models.select_related('category').order_by(*SORT_OPTIONS[sort][1])
     
     # Pagination
     paginator = Paginator(models, 12)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Get categories and model types for filters
-    categories = AIModelCategory.objects.all()
-    model_types = AIModel.MODEL_TYPES
+    # Facet counts for the active filters (one grouped query, cached)
+    facets = get_facets(base_models, search_query, metric_bounds, category_slug, model_type)
+    
+    filter_params = request.GET.copy()
+    filter_params.pop('page', None)
     
     context = {
         'page_obj': page_obj,
-        'categories': categories,
-        'model_types': model_types,
+        'categories': facets['categories'],
+        'model_types': facets['model_types'],
+        'sort_options': [(key, label) for key, (label, _) in SORT_OPTIONS.items()],
         'current_category': category_slug,
         'current_type': model_type,
+        'current_sort': sort,
+        'metric_bounds': metric_bounds,
         'search_query': search_query,
+        'filter_query': filter_params.urlencode(),
     }
     
     return render(request, 'ai_models/model_list.html', context)
@@ -55,10 +64,8 @@ def model_detail_view(request, slug):
     """Display detailed view of an AI model"""
     model = get_object_or_404(AIModel, slug=slug, is_public=True)
     
-    # Get recent inference requests for this model
-    recent_inferences = InferenceRequest.objects.filter(
-        model=model
-    ).order_by('-created_at')[:10]
+    # Get recent inference jobs for this model
+    recent_inferences = model.jobs.select_related('user').order_by('-created_at')[:10]
     
     context = {
         'model': model,
@@ -82,22 +89,23 @@ def user_dashboard_view(request):
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Statistics
-    total_models = user_models.count()
-    public_models = user_models.filter(is_public=True).count()
-    ready_models = user_models.filter(status='ready').count()
+    # Statistics in a single conditional aggregate
+    stats = user_models.order_by().aggregate(
+        total_models=Count('id'),
+        public_models=Count('id', filter=Q(is_public=True)),
+        ready_models=Count('id', filter=Q(status='ready')),
+    )
     
     context = {
         'page_obj': page_obj,
-        'total_models': total_models,
-        'public_models': public_models,
-        'ready_models': ready_models,
+        **stats,
     }
     
     return render(request, 'ai_models/user_dashboard.html', context)
 
 
 @login_required
+@count_upload_bytes('ai_model')
 def create_model_view(request):
     """Create a new AI model"""
     if request.method == 'POST':
@@ -118,12 +126,13 @@ def create_model_view(request):
 
 
 @login_required
+@count_upload_bytes('ai_model')
 def edit_model_view(request, slug):
     """Edit an existing AI model"""
     model = get_object_or_404(AIModel, slug=slug)
     
     # Check if user can edit this model
-    if not (request.user == model.created_by or request.user in model.team_members.all() or request.user.is_staff):
+    if not can_edit_model(request.user, model, request):
         messages.error(request, 'You do not have permission to edit this model.')
         return redirect('ai_models:model_detail', slug=slug)
     
@@ -0,0 +1,141 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from .inference import InferenceUnavailable, registry
+from .models import AIModel
+
+logger = logging.getLogger(__name__)
+
+WARMUP_STATUSES = ['deployed', 'ready']
+
+_SYNTHETIC_VALUES = {
+    'string': 'warm up',
+    'str': 'warm up',
+    'text': 'warm up',
+    'int': 1,
+    'integer': 1,
+    'float': 0.5,
+    'number': 0.5,
+    'bool': False,
+    'boolean': False,
+}
+
+
+def get_warmup_settings():
+    config = getattr(settings, 'AI_MODELS_WARMUP', {})
+    return {
+        'ON_START': config.get('ON_START', False),
+        'LIMIT': config.get('LIMIT', 5),
+    }
+
+
+def synthetic_input(input_format, max_input_length=512):
+    """Build a small valid input from an ``input_format`` specification"""
+    if isinstance(input_format, dict):
+        return {key: synthetic_input(value, max_input_length) for key, value in input_format.items()}
+    if isinstance(input_format, list):
+        return [synthetic_input(input_format[0], max_input_length)] if input_format else []
+    if isinstance(input_format, str):
+        value = _SYNTHETIC_VALUES.get(input_format.lower(), input_format)
+        if isinstance(value, str):
+            return value[:max_input_length]
+        return value
+    # Literal defaults such as {"max_length": 512} are passed through
+    return input_format
+
+
+class WarmupState:
+    """Readiness of this worker, reported by the health endpoint"""
+
+    def __init__(self):
+        self.status = 'idle'
+        self.models = {}
+        self.started_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self):
+        # A single broken model file should not take the whole worker out of rotation
+        return self.status in ('idle', 'ready', 'degraded')
+
+    def as_dict(self):
+        return {
+            'status': self.status,
+            'ready': self.is_ready,
+            'models': dict(self.models),
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+
+
+state = WarmupState()
+
+
+def get_warmup_candidates(limit):
+    """Return the ``limit`` most-used deployed or ready models with a file"""
+    return (
+        AIModel.objects.filter(status__in=WARMUP_STATUSES)
+        .exclude(model_file='')
+        .exclude(model_file__isnull=True)
+        .order_by('-total_inferences', '-updated_at')[:limit]
+    )
+
+
+def warm_up_model(ai_model):
+    """Load one model and push a synthetic input through it"""
+    started = time.perf_counter()
+    loaded = registry.get(ai_model)
+    if not loaded.executable:
+        # predict() would fail on every request, so the model is not ready
+        registry.unload(ai_model.slug)
+        raise InferenceUnavailable(f'No executable runtime for {ai_model.slug} ({loaded.backend})')
+    result = {'backend': loaded.backend, 'executed': False}
+    try:
+        loaded.predict(synthetic_input(ai_model.input_format, ai_model.max_input_length))
+        result['executed'] = True
+    except InferenceUnavailable as exc:
+        # The synthetic input did not fit the model's inputs; the model itself is loaded
+        result['detail'] = str(exc)
+    result['seconds'] = round(time.perf_counter() - started, 4)
+    return result
+
+
+def warm_up_models(limit=None):
+    """Preload the most-used models and record readiness in ``state``"""
+    if limit is None:
+        limit = get_warmup_settings()['LIMIT']
+
+    with state._lock:
+        state.status = 'warming'
+        state.models = {}
+        state.started_at = time.time()
+        state.finished_at = None
+
+    failed = False
+    for ai_model in get_warmup_candidates(limit):
+        try:
+            state.models[ai_model.slug] = {'status': 'ready', **warm_up_model(ai_model)}
+        except InferenceUnavailable as exc:
+            failed = True
+            logger.warning('Warm-up failed for %s: %s', ai_model.slug, exc)
+            state.models[ai_model.slug] = {'status': 'failed', 'detail': str(exc)}
+        except Exception as exc:
+            failed = True
+            logger.exception('Warm-up failed for %s', ai_model.slug)
+            state.models[ai_model.slug] = {'status': 'failed', 'detail': str(exc)}
+
+    state.status = 'degraded' if failed else 'ready'
+    state.finished_at = time.time()
+    return state.as_dict()
+
+
+def start_background_warmup(limit=None):
+    """Warm up in a daemon thread so worker start is not blocked"""
+    state.status = 'warming'
+    thread = threading.Thread(target=warm_up_models, kwargs={'limit': limit}, name='ai-models-warmup', daemon=True)
+    thread.start()
+    return thread
@@ -2,7 +2,7 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import Post, Tag, Comment, PostImage
+from .models import Follow, Notification, Post, PostDailyStats, Tag, Comment, PostImage
 
 class PostImageInline(admin.TabularInline):
     model = PostImage
@@ -41,17 +41,44 @@ class TagAdmin(admin.ModelAdmin):
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ['post', 'author', 'created_at', 'is_approved']
-    list_filter = ['is_approved', 'created_at']
+    list_display = ['post', 'author', 'created_at', 'is_approved', 'is_rejected', 'spam_score']
+    list_filter = ['is_approved', 'is_rejected', 'created_at']
     search_fields = ['content', 'author__username']
     raw_id_fields = ['post', 'author']
-    actions = ['approve_comments']
+    readonly_fields = ['spam_score', 'spam_reasons']
+    actions = ['approve_comments', 'reject_comments']
     
     def approve_comments(self, request, queryset):
-        queryset.update(is_approved=True)
+        queryset.update(is_approved=True, is_rejected=False)
     approve_comments.short_description = "Approve selected comments"
+    
+    def reject_comments(self, request, queryset):
+        queryset.update(is_approved=False, is_rejected=True)
+    reject_comments.short_description = "Reject selected comments"
 
 @admin.register(PostImage)
 class PostImageAdmin(admin.ModelAdmin):
     list_display = ['post', 'alt_text', 'uploaded_at']
-    search_fields = ['post__title', 'alt_text']
\ No newline at end of file
+    search_fields = ['post__title', 'alt_text']
+
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ['follower', 'author', 'tag', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['follower__username', 'author__username', 'tag__name']
+    raw_id_fields = ['follower', 'author', 'tag']
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'kind', 'post', 'frequency', 'created_at', 'sent_at']
+    list_filter = ['kind', 'frequency', 'created_at']
+    search_fields = ['user__username', 'post__title']
+    raw_id_fields = ['user', 'post', 'comment']
+
+@admin.register(PostDailyStats)
+class PostDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['post', 'day', 'views', 'unique_visitors']
+    list_filter = ['day']
+    search_fields = ['post__title']
+    raw_id_fields = ['post']
+    exclude = ['visitor_sketch']
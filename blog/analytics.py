@@ -0,0 +1,242 @@
+"""
+Post analytics: a batched view-event log compacted into daily rollups.
+
+Reader requests append a ``ViewEvent`` to an in-process buffer that is
+written with one bulk insert every FLUSH_SIZE events or FLUSH_SECONDS,
+so a page view costs no extra query most of the time. Events still in
+the buffer when a worker dies are lost, which is acceptable for
+analytics.
+
+``rollup_events`` (the ``rollup_analytics`` command, run every few
+minutes) folds the log into one ``PostDailyStats`` row per post and day
+(views, a HyperLogLog sketch of visitors, top referrer hosts) and then
+deletes the events it consumed. Dashboards read only the rollups, so
+their cost depends on posts and days shown, not on traffic.
+"""
+import atexit
+import hashlib
+import hmac
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from blog_app.hyperloglog import HyperLogLog
+from blog_app.ratelimit import client_ip
+
+from .models import PostDailyStats, ViewEvent
+
+
+def get_analytics_settings():
+    config = getattr(settings, 'ANALYTICS', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'FLUSH_SIZE': config.get('FLUSH_SIZE', 100),
+        'FLUSH_SECONDS': config.get('FLUSH_SECONDS', 10),
+        'HLL_PRECISION': config.get('HLL_PRECISION', 10),
+        'REFERRERS_KEPT': config.get('REFERRERS_KEPT', 20),
+        'ROLLUP_BATCH': config.get('ROLLUP_BATCH', 20000),
+    }
+
+
+class EventBuffer:
+    """Per-process buffer of unsaved view events, flushed in bulk"""
+
+    def __init__(self):
+        self._events = []
+        self._lock = threading.Lock()
+        self._oldest = None
+
+    def add(self, event):
+        config = get_analytics_settings()
+        with self._lock:
+            self._events.append(event)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            due = (len(self._events) >= config['FLUSH_SIZE']
+                   or time.monotonic() - self._oldest >= config['FLUSH_SECONDS'])
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, self._events, self._oldest = self._events, [], None
+        if events:
+            ViewEvent.objects.bulk_create(events, batch_size=500)
+        return len(events)
+
+    def __len__(self):
+        return len(self._events)
+
+
+event_buffer = EventBuffer()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        event_buffer.flush()
+    except Exception:
+        # The database may already be gone at interpreter shutdown
+        pass
+
+
+def visitor_id(request):
+    """Keyed hash identifying the visitor without storing who they are"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        raw = f'user:{user.pk}'
+    else:
+        raw = f"anon:{client_ip(request)}:{request.META.get('HTTP_USER_AGENT', '')}"
+    return hmac.new(settings.SECRET_KEY.encode(), raw.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def referrer_host(request):
+    """Host of an external referrer; '' for direct traffic and internal links"""
+    host = urlparse(request.META.get('HTTP_REFERER', '')).hostname or ''
+    if host and host == request.get_host().split(':')[0]:
+        return ''
+    return host[:255]
+
+
+def record_view_event(request, post):
+    if not get_analytics_settings()['ENABLED']:
+        return
+    event_buffer.add(ViewEvent(
+        post_id=post.pk,
+        created_at=timezone.now(),
+        visitor=visitor_id(request),
+        referrer=referrer_host(request),
+    ))
+
+
+def top_referrers(counts, limit):
+    return dict(Counter(counts).most_common(limit))
+
+
+def _merge_day(stats, views, sketch, referrers, config):
+    stats.views += views
+    merged_sketch = HyperLogLog.from_bytes(stats.visitor_sketch, config['HLL_PRECISION']).merge(sketch)
+    stats.visitor_sketch = merged_sketch.to_bytes()
+    stats.unique_visitors = merged_sketch.count()
+    merged = Counter(stats.referrers)
+    merged.update(referrers)
+    stats.referrers = top_referrers(merged, config['REFERRERS_KEPT'])
+
+
+def _rollup_batch(events, config):
+    """Fold ``events`` into PostDailyStats rows; return the last event id consumed"""
+    views = Counter()
+    sketches = defaultdict(lambda: HyperLogLog(config['HLL_PRECISION']))
+    referrers = defaultdict(Counter)
+    for event_id, post_id, created_at, visitor, referrer in events:
+        key = (post_id, timezone.localdate(created_at))
+        views[key] += 1
+        sketches[key].add(visitor)
+        referrers[key][referrer] += 1
+
+    post_ids = {post_id for post_id, _ in views}
+    days = {day for _, day in views}
+    existing = {(stats.post_id, stats.day): stats
+                for stats in PostDailyStats.objects.filter(post_id__in=post_ids, day__in=days)}
+    created, updated = [], []
+    for key, count in views.items():
+        stats = existing.get(key)
+        if stats is None:
+            stats = PostDailyStats(post_id=key[0], day=key[1], visitor_sketch=b'', referrers={})
+            created.append(stats)
+        else:
+            updated.append(stats)
+        _merge_day(stats, count, sketches[key], referrers[key], config)
+    PostDailyStats.objects.bulk_create(created, batch_size=500)
+    PostDailyStats.objects.bulk_update(
+        updated, ['views', 'unique_visitors', 'visitor_sketch', 'referrers'], batch_size=500)
+    return events[-1][0]
+
+
+def rollup_events():
+    """
+    Compact the view log into daily rollups; return the number of events consumed.
+
+    Works through the log in id order, ROLLUP_BATCH events per
+    transaction, and deletes each batch together with writing its
+    aggregates. Events inserted while it runs are left for the next run.
+    """
+    config = get_analytics_settings()
+    event_buffer.flush()
+    last_id = ViewEvent.objects.aggregate(last=Max('pk'))['last']
+    consumed, after = 0, 0
+    while last_id is not None and after < last_id:
+        events = list(ViewEvent.objects.filter(pk__gt=after, pk__lte=last_id).order_by('pk')
+                      .values_list('pk', 'post_id', 'created_at', 'visitor', 'referrer')[:config['ROLLUP_BATCH']])
+        if not events:
+            break
+        with transaction.atomic():
+            through = _rollup_batch(events, config)
+            ViewEvent.objects.filter(pk__gt=after, pk__lte=through).delete()
+        consumed += len(events)
+        after = through
+    return consumed
+
+
+def author_dashboard(author, days=30, today=None):
+    """
+    Daily series and per-post totals for ``author``'s posts over ``days`` days.
+
+    Unique visitors over several days (or posts) come from merging the
+    daily sketches, so a visitor seen on two days is counted once.
+    """
+    config = get_analytics_settings()
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = (PostDailyStats.objects.filter(post__author=author, day__gte=start, day__lte=today)
+            .select_related('post').only('post__title', 'post__slug', 'day', 'views', 'visitor_sketch', 'referrers'))
+
+    daily_views = Counter()
+    daily_sketches = defaultdict(lambda: HyperLogLog(config['HLL_PRECISION']))
+    posts = {}
+    total_sketch = HyperLogLog(config['HLL_PRECISION'])
+    total_referrers = Counter()
+    for stats in rows:
+        sketch = HyperLogLog.from_bytes(stats.visitor_sketch, config['HLL_PRECISION'])
+        daily_views[stats.day] += stats.views
+        daily_sketches[stats.day].merge(sketch)
+        total_sketch.merge(sketch)
+        total_referrers.update(stats.referrers)
+        entry = posts.setdefault(stats.post_id, {
+            'post': stats.post, 'views': 0, 'sketch': HyperLogLog(config['HLL_PRECISION']), 'referrers': Counter(),
+        })
+        entry['views'] += stats.views
+        entry['sketch'].merge(sketch)
+        entry['referrers'].update(stats.referrers)
+
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        series.append({
+            'day': day.isoformat(),
+            'views': daily_views.get(day, 0),
+            'unique_visitors': daily_sketches[day].count() if day in daily_sketches else 0,
+        })
+    post_rows = sorted((
+        {
+            'post': entry['post'],
+            'views': entry['views'],
+            'unique_visitors': entry['sketch'].count(),
+            'referrers': top_referrers(entry['referrers'], 3),
+        }
+        for entry in posts.values()
+    ), key=lambda row: row['views'], reverse=True)
+    return {
+        'series': series,
+        'posts': post_rows,
+        'total_views': sum(daily_views.values()),
+        'unique_visitors': total_sketch.count() if posts else 0,
+        'referrers': top_referrers(total_referrers, 10),
+    }
@@ -0,0 +1,287 @@
+"""
+Streaming export and import of posts with their tags, comments and image references.
+
+Both directions work in fixed-size batches so memory stays bounded no
+matter how many posts there are. Two formats are supported: JSONL (one
+post per line) and a tar of Markdown files whose front matter lines are
+``key: <json value>``, which any YAML parser also accepts.
+"""
+import io
+import json
+import tarfile
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from blog_app.slugs import BulkSlugAllocator
+
+from .models import Comment, Post, PostImage, Tag
+
+POST_FIELDS = ['id', 'title', 'slug', 'body', 'excerpt', 'status', 'created_at', 'updated_at', 'views', 'featured_image', 'author__username']
+FRONT_MATTER_DELIMITER = '---'
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def iter_post_records(batch_size=1000, queryset=None):
+    """
+    Yield one dict per post, fetching related rows one batch at a time.
+
+    Posts are read with keyset pagination on ``id`` so each batch is an
+    indexed range scan and no more than ``batch_size`` posts are held.
+    """
+    queryset = (queryset if queryset is not None else Post.objects.all()).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).values(*POST_FIELDS)[:batch_size])
+        if not batch:
+            return
+        ids = [row['id'] for row in batch]
+        last_id = ids[-1]
+
+        tags = {}
+        for post_id, name, slug, color in Post.tags.through.objects.filter(post_id__in=ids).values_list(
+            'post_id', 'tag__name', 'tag__slug', 'tag__color'
+        ):
+            tags.setdefault(post_id, []).append({'name': name, 'slug': slug, 'color': color})
+
+        comments = {}
+        for row in Comment.objects.filter(post_id__in=ids).order_by('created_at').values(
+            'post_id', 'author__username', 'content', 'created_at', 'is_approved'
+        ):
+            comments.setdefault(row['post_id'], []).append({
+                'author': row['author__username'],
+                'content': row['content'],
+                'created_at': _iso(row['created_at']),
+                'is_approved': row['is_approved'],
+            })
+
+        images = {}
+        for post_id, image, alt_text in PostImage.objects.filter(post_id__in=ids).values_list('post_id', 'image', 'alt_text'):
+            images.setdefault(post_id, []).append({'image': image, 'alt_text': alt_text})
+
+        for row in batch:
+            yield {
+                'title': row['title'],
+                'slug': row['slug'],
+                'author': row['author__username'],
+                'status': row['status'],
+                'excerpt': row['excerpt'],
+                'featured_image': row['featured_image'] or None,
+                'views': row['views'],
+                'created_at': _iso(row['created_at']),
+                'updated_at': _iso(row['updated_at']),
+                'tags': tags.get(row['id'], []),
+                'images': images.get(row['id'], []),
+                'comments': comments.get(row['id'], []),
+                'body': row['body'],
+            }
+
+
+def record_to_markdown(record):
+    """Render a record as Markdown with ``key: <json>`` front matter"""
+    lines = [FRONT_MATTER_DELIMITER]
+    for key, value in record.items():
+        if key != 'body':
+            lines.append(f'{key}: {json.dumps(value, ensure_ascii=False)}')
+    lines.append(FRONT_MATTER_DELIMITER)
+    return '\n'.join(lines) + '\n' + (record.get('body') or '')
+
+
+def markdown_to_record(text):
+    if not text.startswith(FRONT_MATTER_DELIMITER + '\n'):
+        raise ValueError('Missing front matter')
+    header, _, body = text[len(FRONT_MATTER_DELIMITER) + 1:].partition('\n' + FRONT_MATTER_DELIMITER + '\n')
+    record = {}
+    for line in header.splitlines():
+        key, _, value = line.partition(': ')
+        record[key.strip()] = json.loads(value)
+    record['body'] = body
+    return record
+
+
+def write_jsonl(records, stream):
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def write_markdown_tar(records, fileobj, compress=False):
+    count = 0
+    with tarfile.open(fileobj=fileobj, mode='w|gz' if compress else 'w|') as archive:
+        for record in records:
+            data = record_to_markdown(record).encode('utf-8')
+            info = tarfile.TarInfo(f"posts/{record['slug']}.md")
+            info.size = len(data)
+            info.mtime = int(time.time())
+            archive.addfile(info, io.BytesIO(data))
+            count += 1
+    return count
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_markdown_tar(fileobj):
+    # Stream mode reads members sequentially without loading the archive index
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if member.isfile() and member.name.endswith('.md'):
+                yield markdown_to_record(archive.extractfile(member).read().decode('utf-8'))
+
+
+class PostImporter:
+    """
+    Import post records in batches with ``bulk_create``.
+
+    Tags are upserted by slug, authors are matched by username, and a post
+    whose slug is already taken is either skipped or given a free suffix.
+    """
+
+    def __init__(self, batch_size=500, on_conflict='rename', default_author=None, progress=None):
+        self.batch_size = batch_size
+        self.on_conflict = on_conflict
+        self.default_author = default_author
+        self.progress = progress
+        self.stats = {'created': 0, 'skipped': 0, 'renamed': 0, 'tags_created': 0, 'comments': 0}
+        self._users = {}
+        self._tags = {}
+        self._slugs = BulkSlugAllocator(Post)
+
+    def run(self, records):
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.stats
+
+    def _resolve_users(self, usernames):
+        missing = set(usernames) - set(self._users)
+        if missing:
+            for user in User.objects.filter(username__in=missing).only('id', 'username'):
+                self._users[user.username] = user
+        return self._users
+
+    def _upsert_tags(self, tag_records):
+        """Map each incoming tag slug to a row, reusing tags that match by slug or by (unique) name"""
+        wanted = {tag['slug']: tag for tag in tag_records if tag['slug'] not in self._tags}
+        if not wanted:
+            return
+
+        def match():
+            rows = Tag.objects.filter(Q(slug__in=wanted) | Q(name__in={tag['name'] for tag in wanted.values()}))
+            by_slug, by_name = {}, {}
+            for tag in rows:
+                by_slug[tag.slug] = by_name[tag.name] = tag
+            return {slug: by_slug.get(slug) or by_name.get(tag['name']) for slug, tag in wanted.items()}
+
+        matched = match()
+        # One new row per name: incoming slugs that share a name share the tag
+        new_tags = {}
+        for slug, tag in wanted.items():
+            if matched[slug] is None:
+                new_tags.setdefault(tag['name'], Tag(name=tag['name'], slug=slug, color=tag.get('color') or '#007bff'))
+        if new_tags:
+            before = {tag.pk for tag in matched.values() if tag is not None}
+            Tag.objects.bulk_create(new_tags.values(), ignore_conflicts=True)
+            matched = match()
+            self.stats['tags_created'] += len({tag.pk for tag in matched.values()} - before)
+        self._tags.update(matched)
+
+    def _resolve_slugs(self, records):
+        """Return the final slug per record, or None to skip it"""
+        self._slugs.prime(record['slug'] for record in records)
+        resolved = []
+        for record in records:
+            slug = self._slugs.allocate(record['slug'])
+            if slug != self._slugs.base(record['slug']):
+                if self.on_conflict == 'skip':
+                    slug = None
+                else:
+                    self.stats['renamed'] += 1
+            resolved.append(slug)
+        return resolved
+
+    @transaction.atomic
+    def import_batch(self, records):
+        users = self._resolve_users(
+            {record['author'] for record in records}
+            | {comment['author'] for record in records for comment in record.get('comments', [])}
+        )
+        self._upsert_tags([tag for record in records for tag in record.get('tags', [])])
+        slugs = self._resolve_slugs(records)
+
+        posts, kept = [], []
+        for record, slug in zip(records, slugs):
+            author = users.get(record['author']) or self.default_author
+            if slug is None or author is None:
+                self.stats['skipped'] += 1
+                continue
+            post = Post(
+                title=record['title'],
+                slug=slug,
+                author=author,
+                body=record.get('body') or '',
+                excerpt=record.get('excerpt') or '',
+                status=record.get('status') or 'draft',
+                views=record.get('views') or 0,
+                featured_image=record.get('featured_image') or None,
+            )
+            if not post.excerpt:
+                post.excerpt = post.build_excerpt()
+            post.render_body()
+            posts.append(post)
+            kept.append(record)
+
+        Post.objects.bulk_create(posts, batch_size=self.batch_size)
+
+        # auto_now/auto_now_add overwrite timestamps on create; bulk_update does not
+        for post, record in zip(posts, kept):
+            post.created_at = parse_datetime(record['created_at']) if record.get('created_at') else post.created_at
+            post.updated_at = parse_datetime(record['updated_at']) if record.get('updated_at') else post.updated_at
+        Post.objects.bulk_update(posts, ['created_at', 'updated_at'], batch_size=self.batch_size)
+
+        post_tags, images, comments = [], [], []
+        for post, record in zip(posts, kept):
+            for tag in record.get('tags', []):
+                post_tags.append(Post.tags.through(post_id=post.pk, tag_id=self._tags[tag['slug']].pk))
+            for image in record.get('images', []):
+                images.append(PostImage(post=post, image=image['image'], alt_text=image.get('alt_text', '')))
+            for comment in record.get('comments', []):
+                comment_author = users.get(comment['author'])
+                if comment_author is None:
+                    continue
+                comments.append((Comment(
+                    post=post,
+                    author=comment_author,
+                    content=comment['content'],
+                    is_approved=comment.get('is_approved', True),
+                ), comment.get('created_at')))
+
+        Post.tags.through.objects.bulk_create(post_tags, batch_size=self.batch_size, ignore_conflicts=True)
+        PostImage.objects.bulk_create(images, batch_size=self.batch_size)
+        created_comments = Comment.objects.bulk_create([comment for comment, _ in comments], batch_size=self.batch_size)
+        for comment, created_at in comments:
+            if created_at:
+                comment.created_at = parse_datetime(created_at)
+        Comment.objects.bulk_update([c for c, created_at in comments if created_at], ['created_at'], batch_size=self.batch_size)
+
+        self.stats['created'] += len(posts)
+        self.stats['comments'] += len(created_comments)
+        if self.progress:
+            self.progress(self.stats)
@@ -0,0 +1,136 @@
+"""
+Post-processing of rendered body HTML for images and embeds.
+
+Runs on sanitized HTML as part of the body render, so its output is
+stored with the post (and in the Markdown block cache) rather than
+computed per request:
+
+* ``<img>`` gets ``loading="lazy"`` and ``decoding="async"``, plus
+  intrinsic ``width``/``height`` for files under MEDIA_URL so the
+  browser reserves space before the image arrives. Sizes come from the
+  image header and are cached per file and modification time.
+* YouTube and Vimeo ``<iframe>`` players become click-to-load facades:
+  a link to the video (works without JavaScript) that the script in
+  base.html swaps for the real player on click. Other iframes are
+  lazy-loaded.
+
+The input is sanitizer output, so tags and double-quoted attributes are
+well-formed and simple patterns are enough to rewrite them.
+"""
+import os
+import re
+from functools import lru_cache
+from html import escape, unescape
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from PIL import Image
+
+IMG_RE = re.compile(r'<img\b([^>]*)>', re.IGNORECASE)
+IFRAME_RE = re.compile(r'<iframe\b([^>]*)>.*?</iframe>', re.IGNORECASE | re.DOTALL)
+ATTR_RE = re.compile(r'([\w:-]+)(?:="([^"]*)")?')
+YOUTUBE_RE = re.compile(r'(?:youtube(?:-nocookie)?\.com/(?:embed|v)/|youtu\.be/)([\w-]{11})')
+VIMEO_RE = re.compile(r'player\.vimeo\.com/video/(\d+)')
+
+
+def get_embed_settings():
+    config = getattr(settings, 'POST_EMBEDS', {})
+    return {
+        'LAZY_IMAGES': config.get('LAZY_IMAGES', True),
+        'IMAGE_DIMENSIONS': config.get('IMAGE_DIMENSIONS', True),
+        'VIDEO_FACADES': config.get('VIDEO_FACADES', True),
+    }
+
+
+def parse_attrs(text):
+    return {name.lower(): unescape(value) if value is not None else None
+            for name, value in ATTR_RE.findall(text) if name}
+
+
+def render_attrs(attrs):
+    return ''.join(
+        f' {name}="{escape(value, quote=True)}"' if value is not None else f' {name}'
+        for name, value in attrs.items()
+    )
+
+
+@lru_cache(maxsize=2048)
+def _image_size(path, mtime_ns):
+    # Image.open only reads the header; pixel data is never decoded
+    with Image.open(path) as image:
+        return image.size
+
+
+def media_image_size(src):
+    """(width, height) of a local media file referenced by ``src``, or None"""
+    url = urlparse(src)
+    if url.netloc or not url.path.startswith(settings.MEDIA_URL):
+        return None
+    try:
+        path = default_storage.path(unquote(url.path[len(settings.MEDIA_URL):]))
+        return _image_size(path, os.stat(path).st_mtime_ns)
+    except (NotImplementedError, SuspiciousFileOperation, OSError, ValueError):
+        return None
+
+
+def process_image(match, config):
+    attrs = parse_attrs(match.group(1))
+    if config['LAZY_IMAGES']:
+        attrs.setdefault('loading', 'lazy')
+        attrs.setdefault('decoding', 'async')
+    if config['IMAGE_DIMENSIONS'] and 'width' not in attrs and 'height' not in attrs and attrs.get('src'):
+        size = media_image_size(attrs['src'])
+        if size:
+            attrs['width'], attrs['height'] = str(size[0]), str(size[1])
+    return f'<img{render_attrs(attrs)}>'
+
+
+def video_facade(attrs):
+    """Facade markup for a known video player iframe, or None"""
+    src = attrs.get('src') or ''
+    youtube, vimeo = YOUTUBE_RE.search(src), VIMEO_RE.search(src)
+    if youtube:
+        video_id = youtube.group(1)
+        link = f'https://www.youtube.com/watch?v={video_id}'
+        player = f'https://www.youtube-nocookie.com/embed/{video_id}?autoplay=1'
+        poster = f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg'
+    elif vimeo:
+        video_id = vimeo.group(1)
+        link = f'https://vimeo.com/{video_id}'
+        player = f'https://player.vimeo.com/video/{video_id}?autoplay=1'
+        poster = None
+    else:
+        return None
+
+    width, height = attrs.get('width') or '', attrs.get('height') or ''
+    ratio = f'{width} / {height}' if width.isdigit() and height.isdigit() and int(height) else '16 / 9'
+    parts = [
+        f'<a class="video-facade" href="{escape(link)}" data-embed-src="{escape(player)}" '
+        f'style="aspect-ratio: {ratio}" target="_blank" rel="noopener">'
+    ]
+    if poster:
+        parts.append(f'<img src="{escape(poster)}" alt="" loading="lazy" decoding="async" width="480" height="360">')
+    parts.append('<span class="video-facade-play" aria-label="Play video"></span></a>')
+    return ''.join(parts)
+
+
+def process_iframe(match, config):
+    attrs = parse_attrs(match.group(1))
+    if config['VIDEO_FACADES']:
+        facade = video_facade(attrs)
+        if facade:
+            return facade
+    attrs.setdefault('loading', 'lazy')
+    return f'<iframe{render_attrs(attrs)}></iframe>'
+
+
+def postprocess_html(html):
+    """Apply lazy loading, intrinsic image sizes and video facades to ``html``"""
+    config = get_embed_settings()
+    if '<img' in html:
+        html = IMG_RE.sub(lambda match: process_image(match, config), html)
+    if '<iframe' in html:
+        html = IFRAME_RE.sub(lambda match: process_iframe(match, config), html)
+    return html
@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import feedgenerator
+
+from .models import Post, Tag
+
+FEED_ITEMS = 20
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+FEED_CONTENT_TYPES = {
+    'rss': 'application/rss+xml; charset=utf-8',
+    'atom': 'application/atom+xml; charset=utf-8',
+    'json': 'application/feed+json; charset=utf-8',
+}
+
+
+class RssFeed(feedgenerator.Rss201rev2Feed):
+    """RSS 2.0 with the full rendered body in content:encoded"""
+
+    def rss_attributes(self):
+        attrs = super().rss_attributes()
+        attrs['xmlns:content'] = 'http://purl.org/rss/1.0/modules/content/'
+        return attrs
+
+    def add_item_elements(self, handler, item):
+        super().add_item_elements(handler, item)
+        if item.get('content'):
+            handler.addQuickElement('content:encoded', item['content'])
+
+
+class AtomFeed(feedgenerator.Atom1Feed):
+    """Atom 1.0 with the full rendered body as HTML content"""
+
+    def add_item_elements(self, handler, item):
+        super().add_item_elements(handler, item)
+        if item.get('content'):
+            handler.addQuickElement('content', item['content'], {'type': 'html'})
+
+
+def get_feed_scope(kind, slug=None):
+    """Return (title, link, queryset) for the site, a tag or an author"""
+    posts = Post.objects.filter(status='published').select_related('author').prefetch_related('tags')
+    if kind == 'tag':
+        tag = get_object_or_404(Tag, slug=slug)
+        return f'{tag.name} - Ta\'limiy Blog', tag.get_absolute_url(), posts.filter(tags=tag)
+    if kind == 'author':
+        author = get_object_or_404(User, username=slug)
+        link = reverse('blog:user_profile', kwargs={'username': author.username})
+        return f'{author.username} - Ta\'limiy Blog', link, posts.filter(author=author)
+    return 'Ta\'limiy Blog', reverse('blog:home'), posts
+
+
+def _item(post, base_url):
+    return {
+        'title': post.title,
+        'link': base_url + post.get_absolute_url(),
+        'description': post.excerpt,
+        'content': post.get_body_html(),
+        'author_name': post.author.username,
+        'pubdate': post.created_at,
+        'updateddate': post.updated_at,
+        'unique_id': base_url + post.get_absolute_url(),
+        'categories': [tag.name for tag in post.tags.all()],
+    }
+
+
+def _render_json_feed(title, link, feed_url, items):
+    return json.dumps({
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': title,
+        'home_page_url': link,
+        'feed_url': feed_url,
+        'items': [
+            {
+                'id': item['unique_id'],
+                'url': item['link'],
+                'title': item['title'],
+                'summary': item['description'],
+                'content_html': item['content'],
+                'date_published': item['pubdate'].isoformat(),
+                'date_modified': item['updateddate'].isoformat(),
+                'authors': [{'name': item['author_name']}],
+                'tags': item['categories'],
+            }
+            for item in items
+        ],
+    }, ensure_ascii=False)
+
+
+def render_feed(fmt, title, link, feed_url, posts, base_url):
+    """Render feed output for the newest published posts"""
+    items = [_item(post, base_url) for post in posts[:FEED_ITEMS]]
+    if fmt == 'json':
+        return _render_json_feed(title, base_url + link, feed_url, items)
+
+    feed_class = AtomFeed if fmt == 'atom' else RssFeed
+    feed = feed_class(
+        title=title,
+        link=base_url + link,
+        description=title,
+        language='uz',
+        feed_url=feed_url,
+    )
+    for item in items:
+        feed.add_item(**item)
+    return feed.writeString('utf-8')
+
+
+def get_cached_feed(fmt, kind, slug, feed_url, base_url):
+    """
+    Return {'content', 'etag', 'last_modified'} for a feed, rendering it
+    only when no published post changed since the cached copy was built.
+
+    The cache key carries the number of posts in the feed's scope and their
+    latest ``updated_at``, read from the database on every request, so a
+    change made through any worker is seen by all of them even when each
+    keeps its own cache. Tag changes touch the tagged posts' ``updated_at``
+    (see blog.signals).
+    """
+    title, link, posts = get_feed_scope(kind, slug)
+    fingerprint = posts.order_by().aggregate(count=Count('pk'), latest=Max('updated_at'))
+    latest = fingerprint['latest']
+    version = f"{fingerprint['count']}-{latest.timestamp() if latest else 0}"
+    key = f'blog:feeds:{version}:{fmt}:{kind}:{slug or ""}:{hashlib.md5(feed_url.encode("utf-8")).hexdigest()}'
+    entry = cache.get(key)
+    if entry is None:
+        content = render_feed(fmt, title, link, feed_url, posts, base_url)
+        entry = {
+            'content': content,
+            'etag': hashlib.md5(f'{version}:{content}'.encode('utf-8')).hexdigest(),
+            'last_modified': latest.timestamp() if latest else None,
+        }
+        cache.set(key, entry, FEED_CACHE_TIMEOUT)
+    return entry
@@ -1,5 +1,5 @@
 from django import forms
-from .models import Post, Tag, Comment
+from .models import NotificationPreference, Post, Tag, Comment
 from markdownx.widgets import MarkdownxWidget
 
 class PostForm(forms.ModelForm):
@@ -66,4 +66,17 @@ class SearchForm(forms.Form):
             'class': 'form-control',
             'placeholder': 'Search posts...'
         })
-    )
\ No newline at end of file
+    )
+
+class NotificationPreferenceForm(forms.ModelForm):
+    class Meta:
+        model = NotificationPreference
+        fields = ['new_posts', 'comment_replies']
+        labels = {
+            'new_posts': "Kuzatilayotgan mualliflar va teglardagi yangi maqolalar",
+            'comment_replies': "Maqolalarim va muhokamalarimdagi yangi izohlar",
+        }
+        widgets = {
+            'new_posts': forms.Select(attrs={'class': 'form-select'}),
+            'comment_replies': forms.Select(attrs={'class': 'form-select'}),
+        }
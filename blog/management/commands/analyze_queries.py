@@ -0,0 +1,270 @@
+import logging
+import random
+import shutil
+import tempfile
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import NoReverseMatch, reverse
+from django.utils import timezone
+
+from ai_models import api_urls as ai_models_api_urls, urls as ai_models_urls
+from ai_models.models import AIModel, AIModelCategory, InferenceJob
+from blog import urls as blog_urls
+from blog.analytics import event_buffer
+from blog.models import Comment, Follow, Post, PostDailyStats, RelatedPost, Tag, TimelineEntry
+from blog_app.index_advisor import (
+    capture_selects, explain, index_repr, measure, problems, suggest_indexes,
+)
+
+PREFIX = 'analyze-'
+URLCONFS = [(blog_urls, 'blog'), (ai_models_urls, 'ai_models'), (ai_models_api_urls, None)]
+
+# Extra query strings for views whose queries depend on their filters
+VARIANTS = {
+    'blog:home': [{'page': 2}],
+    'blog:post_list': [{'page': 2}, {'query': 'python'}, {'tag': '{tag}'}],
+    'blog:analytics_dashboard': [{'days': 90}],
+    'blog:moderate_comments': [{'status': 'rejected'}],
+    'ai_models:model_list': [{'sort': '-accuracy'}, {'category': '{category}', 'type': 'text_generation'}],
+}
+
+
+def url_kwargs(seed):
+    """Keyword arguments for each URL name that takes any"""
+    post, tag, ai_model, job = seed['post'], seed['tag'], seed['ai_model'], seed['job']
+    return {
+        'blog:post_detail': {'slug': post.slug},
+        'blog:edit_post': {'slug': post.slug},
+        'blog:delete_post': {'slug': post.slug},
+        'blog:user_profile': {'username': post.author.username},
+        'blog:follow_author': {'username': post.author.username},
+        'blog:tag_posts': {'slug': tag.slug},
+        'blog:follow_tag': {'slug': tag.slug},
+        'blog:feed': {'fmt': 'rss'},
+        'blog:tag_feed': {'slug': tag.slug, 'fmt': 'rss'},
+        'blog:author_feed': {'slug': post.author.username, 'fmt': 'rss'},
+        'ai_models:model_detail': {'slug': ai_model.slug},
+        'ai_models:edit_model': {'slug': ai_model.slug},
+        'api_model_detail': {'slug': ai_model.slug},
+        'api_model_cache_stats': {'slug': ai_model.slug},
+        'api_job_detail': {'job_id': job.pk},
+        'api_job_result': {'job_id': job.pk},
+    }
+
+
+class Command(BaseCommand):
+    help = ('Request every blog and AI model URL against seeded data, EXPLAIN the queries behind them and '
+            'propose indexes, measured by building each one (runs in a throwaway test database)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=3000, help='Posts to seed (other tables scale with it)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs per query (best is kept)')
+        parser.add_argument('--min-speedup', type=float, default=1.2,
+                            help='Smallest measured speedup for an index to be recommended')
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Replace a leftover test database without asking')
+
+    def seed(self, size):
+        rng = random.Random(0)
+        now = timezone.now()
+        analyst = User.objects.create_user(username=f'{PREFIX}analyst', email='analyst@example.com',
+                                           password=uuid.uuid4().hex, is_staff=True, is_superuser=True)
+        User.objects.bulk_create([User(username=f'{PREFIX}author-{i}', email=f'author{i}@example.com', password='!')
+                                  for i in range(max(size // 100, 5))])
+        authors = [analyst] + list(User.objects.filter(username__startswith=f'{PREFIX}author-'))
+        Tag.objects.bulk_create([Tag(name=f'{PREFIX}tag-{i}', slug=f'{PREFIX}tag-{i}') for i in range(30)])
+        tags = list(Tag.objects.filter(slug__startswith=PREFIX))
+
+        Post.objects.bulk_create([
+            Post(title=f'Post {i}', slug=f'{PREFIX}post-{i}', author=rng.choice(authors),
+                 body=f'Body {i}', body_html=f'<p>Body {i}</p>', excerpt=f'Body {i}',
+                 status='published' if rng.random() < 0.8 else 'draft',
+                 views=rng.randrange(1000), trending_score=rng.random(), weekly_views=rng.randrange(100))
+            for i in range(size)
+        ], batch_size=500)
+        posts = list(Post.objects.filter(slug__startswith=PREFIX).only('pk', 'author_id', 'created_at'))
+        Post.tags.through.objects.bulk_create([
+            Post.tags.through(post_id=post.pk, tag_id=tag.pk) for post in posts for tag in rng.sample(tags, 3)
+        ], batch_size=1000)
+        Comment.objects.bulk_create([
+            Comment(post=post, author=rng.choice(authors), content='Comment', is_approved=rng.random() < 0.9)
+            for post in posts for _ in range(3)
+        ], batch_size=1000)
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post=post, related=rng.choice(posts), score=1.0 / rank, rank=rank)
+            for post in posts[:200] for rank in range(1, 5)
+        ], batch_size=1000)
+        Follow.objects.bulk_create([Follow(follower=analyst, author=author) for author in authors[1:6]]
+                                   + [Follow(follower=analyst, tag=tag) for tag in tags[:3]])
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=analyst, post=post, created_at=post.created_at) for post in posts[::2]
+        ], batch_size=1000)
+        own_posts = [post for post in posts if post.author_id == analyst.pk]
+        PostDailyStats.objects.bulk_create([
+            PostDailyStats(post=post, day=now.date() - timedelta(days=day), views=rng.randrange(50),
+                           unique_visitors=10, visitor_sketch=b'', referrers={})
+            for post in own_posts[:50] for day in range(30)
+        ], batch_size=1000)
+
+        categories = AIModelCategory.objects.bulk_create([
+            AIModelCategory(name=f'{PREFIX}category-{i}', slug=f'{PREFIX}category-{i}') for i in range(8)
+        ])
+        model_types = [choice for choice, _ in AIModel.MODEL_TYPES]
+        statuses = [choice for choice, _ in AIModel.STATUS_CHOICES]
+        AIModel.objects.bulk_create([
+            AIModel(name=f'Model {i}', slug=f'{PREFIX}model-{i}', description='Model', model_type=rng.choice(model_types),
+                    category=rng.choice(categories), status=rng.choice(statuses), is_public=rng.random() < 0.7,
+                    created_by=rng.choice(authors), accuracy=rng.random(), f1_score=rng.random())
+            for i in range(max(size // 5, 10))
+        ], batch_size=500)
+        # A public model the analyst can edit, so its detail and edit pages render
+        ai_model = AIModel.objects.filter(slug__startswith=PREFIX).first()
+        AIModel.objects.filter(pk=ai_model.pk).update(created_by=analyst, is_public=True, status='ready')
+        InferenceJob.objects.bulk_create([
+            InferenceJob(model=ai_model, user=analyst, status=rng.choice(['pending', 'completed']), input_data={})
+            for _ in range(50)
+        ])
+        return {
+            'user': analyst,
+            'post': Post.objects.filter(slug__startswith=PREFIX, author=analyst, status='published').first(),
+            'tag': tags[0],
+            'category': categories[0].slug,
+            'ai_model': ai_model,
+            'job': InferenceJob.objects.filter(user=analyst).first(),
+        }
+
+    def urls(self, seed):
+        """(url name, path) for every route, plus the filter variants"""
+        kwargs_by_name = url_kwargs(seed)
+        for module, namespace in URLCONFS:
+            for pattern in module.urlpatterns:
+                name = f'{namespace}:{pattern.name}' if namespace else pattern.name
+                kwargs = kwargs_by_name.get(name, {})
+                try:
+                    path = reverse(name, kwargs=kwargs)
+                except NoReverseMatch:
+                    self.stderr.write(f'Skipping {name}: no arguments known for {pattern.pattern}')
+                    continue
+                yield name, path
+                for params in VARIANTS.get(name, []):
+                    query = '&'.join(f'{key}={str(value).format(tag=seed["tag"].slug, category=seed["category"])}'
+                                     for key, value in params.items())
+                    yield name, f'{path}?{query}'
+
+    def exercise(self, seed):
+        """{sql: {'params', 'views', 'count'}} for every SELECT behind every URL"""
+        # Broken pages are reported with their status instead of aborting the run
+        client = Client(raise_request_exception=False)
+        client.force_login(seed['user'])
+        queries = {}
+        request_logger = logging.getLogger('django.request')
+        level, request_logger.level = request_logger.level, logging.CRITICAL
+        try:
+            for name, path in self.urls(seed):
+                with capture_selects(connection) as captured:
+                    response = client.get(path)
+                self.stdout.write(f'{response.status_code}  {len(captured):>3} queries  {name:<32} {path}')
+                for sql, params in captured:
+                    entry = queries.setdefault(sql, {'params': params, 'views': set(), 'count': 0})
+                    entry['views'].add(name)
+                    entry['count'] += 1
+        finally:
+            request_logger.level = level
+        return queries
+
+    def handle(self, *args, **options):
+        # Seeding and trial CREATE INDEX run in a test database and a temporary MEDIA_ROOT (generated
+        # avatars, uploads), so the real database is never locked and nothing is left behind
+        media_root = tempfile.mkdtemp(prefix='analyze-queries-')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=not options['interactive'], serialize=False)
+        try:
+            with override_settings(
+                # Every request reaches the database, and nothing seeded is left in a shared cache
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+                MEDIA_ROOT=media_root,
+            ):
+                seed = self.seed(options['posts'])
+                queries = self.exercise(seed)
+                suggestions = self.advise(queries, options['repeat'], options['min_speedup'])
+                event_buffer.flush()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(queries, suggestions, options['verbosity'])
+
+    def advise(self, queries, repeat, min_speedup):
+        """Measured candidates, best first, each flagged whether it is worth adding"""
+        candidates, names = {}, set()
+        for sql, entry in queries.items():
+            plan = explain(connection, sql, entry['params'])
+            if plan is None:
+                self.stderr.write(f'EXPLAIN parsing is not supported for {connection.vendor}')
+                return []
+            entry['problems'] = problems(connection.vendor, plan, sql)
+            for kind, identifier, detail in entry['problems']:
+                if identifier is None:
+                    continue
+                for model, index in suggest_indexes(connection, sql, entry['params'], identifier):
+                    key = (model._meta.label, tuple(index.fields), str(index.condition))
+                    if key not in candidates:
+                        if index.name in names:
+                            index.name = f'{index.name[:27]}_{len(names) % 100}'
+                        names.add(index.name)
+                        candidates[key] = {'model': model, 'index': index, 'queries': []}
+                    if sql not in candidates[key]['queries']:
+                        candidates[key]['queries'].append(sql)
+
+        measured = []
+        for candidate in candidates.values():
+            sample = [(sql, queries[sql]['params']) for sql in candidate['queries']]
+            result = measure(connection, candidate['model'], candidate['index'], sample, repeat)
+            # Weight by how often each query ran across the exercised pages
+            runs = sum(queries[sql]['count'] for sql in candidate['queries']) / len(sample)
+            measured.append({**candidate, **result, 'saved': (result['before'] - result['after']) * runs})
+        measured.sort(key=lambda candidate: candidate['saved'], reverse=True)
+
+        # Greedy: keep a candidate only if it speeds up a query no better candidate already serves
+        served = set()
+        for candidate in measured:
+            helped = {sql for sql, used in zip(candidate['queries'], candidate['helped']) if used}
+            candidate['recommended'] = bool(helped - served) and candidate['before'] >= candidate['after'] * min_speedup
+            if candidate['recommended']:
+                served |= helped
+        return measured
+
+    def report(self, queries, suggestions, verbosity):
+        flagged = {sql: entry for sql, entry in queries.items() if entry.get('problems')}
+        self.stdout.write(f'\n{len(queries)} distinct SELECTs, {len(flagged)} with full scans or temp B-trees:')
+        for sql, entry in sorted(flagged.items(), key=lambda item: -item[1]['count']):
+            self.stdout.write(f"\n  x{entry['count']} in {', '.join(sorted(entry['views']))}")
+            self.stdout.write(f'    {sql if verbosity > 1 else sql[:160] + ("..." if len(sql) > 160 else "")}')
+            for kind, identifier, detail in entry['problems']:
+                self.stdout.write(f'    {kind}: {detail}')
+
+        recommended = [suggestion for suggestion in suggestions if suggestion['recommended']]
+        self.stdout.write(f'\nSuggested indexes ({len(recommended)} of {len(suggestions)} candidates; the rest were '
+                          f'unused by the planner, slower or overlapping{"" if verbosity > 1 else ", see -v 2"}):')
+        grouped = defaultdict(list)
+        for suggestion in suggestions if verbosity > 1 else recommended:
+            grouped[suggestion['model']._meta.label].append(suggestion)
+        for label, items in grouped.items():
+            self.stdout.write(f'\n  {label}.Meta.indexes:')
+            for suggestion in items:
+                views = sorted({view for sql in suggestion['queries'] for view in queries[sql]['views']})
+                speedup = suggestion['before'] / suggestion['after'] if suggestion['after'] else float('inf')
+                marker = '' if suggestion['recommended'] else '  (not recommended)'
+                self.stdout.write(f"    {index_repr(suggestion['index'])},{marker}")
+                self.stdout.write(f"      {sum(suggestion['helped'])}/{len(suggestion['queries'])} flagged queries use it, "
+                                  f"in {', '.join(views)}")
+                self.stdout.write(f"      {suggestion['before'] * 1000:.2f} ms -> {suggestion['after'] * 1000:.2f} ms "
+                                  f"({speedup:.1f}x); about {suggestion['saved'] * 1000:.2f} ms saved per pass over "
+                                  f"all pages")
+        self.stdout.write(self.style.SUCCESS('Done; the test database with the seeded data was destroyed'))
@@ -0,0 +1,70 @@
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from django.template.loader import render_to_string
+
+from blog.models import Notification, Post
+from blog.notifications import MessageRenderer, get_notification_settings, send_bulk
+
+BACKENDS = {
+    'file': 'django.core.mail.backends.filebased.EmailBackend',
+    'console': 'django.core.mail.backends.console.EmailBackend',
+    'locmem': 'django.core.mail.backends.locmem.EmailBackend',
+    'dummy': 'django.core.mail.backends.dummy.EmailBackend',
+}
+
+
+class Command(BaseCommand):
+    help = ('Send a new-post notification to N synthetic recipients through a file/console stand-in backend: '
+            'per-recipient rendering and connections vs render-once batched sending')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=100000)
+        parser.add_argument('--backend', choices=sorted(BACKENDS), default='file')
+        parser.add_argument('--output', help='Directory for the file backend (default: a temporary directory)')
+        parser.add_argument('--naive-sample', type=int, default=1000,
+                            help='Recipients sent the naive way; the total is extrapolated')
+
+    def handle(self, *args, **options):
+        post = Post.objects.filter(status='published').select_related('author').first()
+        if post is None:
+            raise CommandError('No published post to notify about')
+        config = get_notification_settings()
+        recipients = [f'reader{i}@example.com' for i in range(options['recipients'])]
+        backend = BACKENDS[options['backend']]
+        output = options['output'] or tempfile.mkdtemp(prefix='notifications-')
+        kwargs = {'file_path': output} if options['backend'] == 'file' else {}
+
+        # Naive: render the templates and open a connection for every recipient
+        sample = recipients[:options['naive_sample']]
+        context = {'post': post, 'site_url': config['SITE_URL'], 'settings_url': '/notifications/settings/'}
+        started = time.perf_counter()
+        for address in sample:
+            subject = render_to_string('blog/email/new_post_subject.txt', context).strip()
+            body = render_to_string('blog/email/new_post.txt', context)
+            EmailMessage(subject, body, config['FROM_EMAIL'], [address],
+                         connection=get_connection(backend, **kwargs)).send()
+        naive = (time.perf_counter() - started) / max(len(sample), 1) * len(recipients)
+
+        # Batched: render once, one connection, BATCH_SIZE messages per send_messages call
+        renderer = MessageRenderer(config)
+        notification = Notification(kind='new_post', post=post, user=User(email=''))
+        started = time.perf_counter()
+        subject, body = renderer.message(notification)
+        sent = 0
+        with get_connection(backend, **kwargs) as connection:
+            for start in range(0, len(recipients), config['BATCH_SIZE']):
+                messages = [EmailMessage(subject, body, config['FROM_EMAIL'], [address], connection=connection)
+                            for address in recipients[start:start + config['BATCH_SIZE']]]
+                sent += send_bulk(messages, connection)
+        batched = time.perf_counter() - started
+
+        self.stdout.write(f'Recipients: {len(recipients)} via {backend}')
+        if options['backend'] == 'file':
+            self.stdout.write(f'Output: {output}')
+        self.stdout.write(f'Naive (extrapolated from {len(sample)}): {naive:.1f}s')
+        self.stdout.write(f'Batched: {batched:.1f}s ({sent / batched:.0f} messages/s)')
+        self.stdout.write(self.style.SUCCESS('Done'))
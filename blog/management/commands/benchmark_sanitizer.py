@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from markdownx.utils import markdownify
+
+from blog.markdown_blocks import block_cache
+from blog.rendering import get_policy, render_post_body
+
+SECTION = '''
+## Section {n}
+
+Some **bold** text, *emphasis*, `inline code` and a [link](https://example.com/{n}).
+An unsafe <a href="javascript:alert({n})" onclick="steal()">link</a> and <script>alert({n})</script>.
+
+```python
+def handler_{n}(request):
+    return render(request, "page.html", {{"n": {n}}})
+```
+
+| Name | Value |
+|------|-------|
+| a{n} | {n}   |
+
+> Quoted paragraph with an <img src="x" onerror="alert({n})"> image.
+
+- item one
+- item two
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure sanitizer throughput on large posts, and save-time vs per-request rendering'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sections', type=int, default=400, help='Markdown sections per synthetic post')
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def timed(self, func, rounds, setup=None):
+        """Mean seconds per call of ``func``; ``setup`` runs before each call, outside the timing"""
+        total = 0.0
+        for _ in range(rounds):
+            if setup is not None:
+                setup()
+            started = time.perf_counter()
+            result = func()
+            total += time.perf_counter() - started
+        return total / rounds, result
+
+    def handle(self, *args, **options):
+        rounds = options['rounds']
+        body = ''.join(SECTION.format(n=n) for n in range(options['sections']))
+        html = markdownify(body)
+        policy = get_policy()
+
+        markdown_seconds, _ = self.timed(lambda: markdownify(body), rounds)
+        clean_seconds, cleaned = self.timed(lambda: policy.clean(html), rounds)
+        # Every block is rendered from scratch, as on the first save of a new post
+        render_seconds, _ = self.timed(lambda: render_post_body(body), rounds, setup=block_cache.clear)
+        # Left warm by the rounds above: every block is a cache hit
+        cached_seconds, _ = self.timed(lambda: render_post_body(body), rounds)
+        # What a request pays once the safe HTML is stored: nothing but the column read
+        stored_seconds, _ = self.timed(lambda: str(cleaned), rounds)
+
+        megabytes = len(html.encode('utf-8')) / 1024 / 1024
+        self.stdout.write(f'Sanitizer: {policy.backend}; post body {len(body) / 1024:.0f} KB markdown, {megabytes * 1024:.0f} KB HTML')
+        self.stdout.write(f'markdown render      {markdown_seconds * 1000:10.1f} ms')
+        self.stdout.write(f'sanitize             {clean_seconds * 1000:10.1f} ms  ({megabytes / clean_seconds:.1f} MB/s)')
+        self.stdout.write(f'render + sanitize    {render_seconds * 1000:10.1f} ms  (paid once per save, cold block cache)')
+        self.stdout.write(f'  with cached blocks {cached_seconds * 1000:10.1f} ms  (re-save of an unchanged post)')
+        self.stdout.write(f'stored HTML          {stored_seconds * 1000:10.3f} ms  (paid per request)')
+        self.stdout.write(self.style.SUCCESS(f'{1 / render_seconds:.1f} large posts/s rendered at save time'))
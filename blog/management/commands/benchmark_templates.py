@@ -0,0 +1,77 @@
+import time
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.core.paginator import Paginator
+from django.template.loader import get_template
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from blog.forms import SearchForm
+from blog.models import Post, Tag
+from blog_app.template_profiles import build_templates, jinja2_available
+
+PROFILES = ['uncached', 'production', 'jinja2']
+LISTINGS = ['blog/home.html', 'blog/post_list.html', 'blog/tag_posts.html', 'blog/our_work.html']
+
+
+class Command(BaseCommand):
+    help = 'Measure render time of each listing template under the uncached, production and jinja2 profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=100, help='Renders per template and profile')
+        parser.add_argument('--per-page', type=int, default=9, help='Post cards per listing page')
+
+    def contexts(self, per_page):
+        posts = list(Post.objects.filter(status='published').select_related('author').prefetch_related('tags')[:per_page])
+        if not posts:
+            raise CommandError('No published posts to render')
+        # Repeat posts to fill a page on small databases
+        page_obj = Paginator(list(islice(cycle(posts), per_page)), per_page).get_page(1)
+        tag = Tag.objects.first() or Tag(name='tag', slug='tag')
+        return {
+            'blog/home.html': {
+                'page_obj': page_obj,
+                'featured_posts': posts[:3],
+                'trending_posts': posts[:5],
+                'most_read_posts': posts[:5],
+            },
+            'blog/post_list.html': {
+                'page_obj': page_obj,
+                'search_form': SearchForm(),
+                'all_tags': list(Tag.objects.all()),
+                'current_tag': None,
+            },
+            'blog/tag_posts.html': {'tag': tag, 'page_obj': page_obj},
+            'blog/our_work.html': {'page_obj': page_obj, 'title': 'Loyihalarimiz', 'description': ''},
+        }
+
+    def measure(self, profile, name, context, request, renders):
+        # Warm the loader cache (and per-author avatar URLs) before timing
+        get_template(name).render(context, request)
+        started = time.perf_counter()
+        for _ in range(renders):
+            get_template(name).render(context, request)
+        return (time.perf_counter() - started) * 1000 / renders
+
+    def handle(self, *args, **options):
+        contexts = self.contexts(options['per_page'])
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        profiles = [profile for profile in PROFILES if profile != 'jinja2' or jinja2_available()]
+        if 'jinja2' not in profiles:
+            self.stdout.write(self.style.WARNING('Jinja2 is not installed; skipping the jinja2 profile'))
+
+        results = {}
+        for profile in profiles:
+            with override_settings(TEMPLATES=build_templates(profile, settings.BASE_DIR)):
+                for name, context in contexts.items():
+                    results[name, profile] = self.measure(profile, name, context, request, options['renders'])
+
+        self.stdout.write(f'{"ms/render":<24}' + ''.join(f'{profile:>12}' for profile in profiles))
+        for name in LISTINGS:
+            self.stdout.write(f'{name:<24}' + ''.join(f'{results[name, profile]:>12.2f}' for profile in profiles))
+        self.stdout.write(self.style.SUCCESS('Done'))
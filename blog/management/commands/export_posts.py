@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+from blog.bulk_io import iter_post_records, write_jsonl, write_markdown_tar
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Stream posts with tags, comments and image references to JSONL or a tar of Markdown files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Output file (.jsonl, .tar or .tar.gz), or - for JSONL on stdout')
+        parser.add_argument('--status', choices=['draft', 'published'], help='Only export posts with this status')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        records = iter_post_records(batch_size=options['batch_size'], queryset=queryset)
+        output = options['output']
+
+        if output == '-':
+            count = write_jsonl(records, sys.stdout)
+        elif output.endswith(('.tar', '.tar.gz', '.tgz')):
+            with open(output, 'wb') as handle:
+                count = write_markdown_tar(records, handle, compress=not output.endswith('.tar'))
+        else:
+            with open(output, 'w', encoding='utf-8') as handle:
+                count = write_jsonl(records, handle)
+
+        self.stderr.write(self.style.SUCCESS(f'Exported {count} posts'))
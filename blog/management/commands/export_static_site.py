@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from blog.static_export import ExportFailed, export_site
+
+
+class Command(BaseCommand):
+    help = 'Render the public blog (listings, posts, tags) to static HTML files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir', help='Directory to write the site into')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count)')
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Re-render every page instead of only pages affected by posts changed since the last export',
+        )
+        parser.add_argument(
+            '--base-url',
+            default=None,
+            help='Public URL of the site, e.g. https://blog.example.com; its host must be in ALLOWED_HOSTS '
+                 '(default: http:// plus the first plain ALLOWED_HOSTS entry, else localhost)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            summary = export_site(
+                options['output_dir'],
+                workers=options['workers'],
+                incremental=not options['full'],
+                base_url=options['base_url'],
+            )
+        except ExportFailed as exc:
+            for path, status in exc.failures:
+                self.stderr.write(f'Failed {path} (HTTP {status})')
+            raise CommandError(f'{len(exc.failures)} pages did not render; the export is incomplete')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {summary['written']} pages, removed {summary['removed']}, "
+            f"copied {summary['assets']} assets to {options['output_dir']}"
+        ))
@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from blog.bulk_io import PostImporter, read_jsonl, read_markdown_tar
+from blog.related import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Import posts from JSONL or a tar of Markdown files in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Input file (.jsonl, .tar, .tar.gz)')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--on-conflict',
+            choices=['rename', 'skip'],
+            default='rename',
+            help='What to do when a slug already exists',
+        )
+        parser.add_argument('--default-author', help='Username to use when a post author does not exist')
+        parser.add_argument(
+            '--rebuild-related',
+            action='store_true',
+            help='Rebuild related posts afterwards (loads the whole corpus into memory; by default run '
+                 'rebuild_related_posts separately)',
+        )
+
+    def handle(self, *args, **options):
+        default_author = None
+        if options['default_author']:
+            try:
+                default_author = User.objects.get(username=options['default_author'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['default_author']} does not exist")
+
+        importer = PostImporter(
+            batch_size=options['batch_size'],
+            on_conflict=options['on_conflict'],
+            default_author=default_author,
+            progress=lambda stats: self.stdout.write(f"Imported {stats['created']} posts...")
+        )
+
+        path = options['input']
+        if path.endswith(('.tar', '.tar.gz', '.tgz')):
+            with open(path, 'rb') as handle:
+                stats = importer.run(read_markdown_tar(handle))
+        else:
+            with open(path, encoding='utf-8') as handle:
+                stats = importer.run(read_jsonl(handle))
+
+        # bulk_create skips model signals, so derived data is refreshed once at the end
+        # (feeds pick up the new posts through their post count)
+        if options['rebuild_related']:
+            rebuild_all()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {stats['created']} posts ({stats['renamed']} renamed, {stats['skipped']} skipped), "
+            f"{stats['tags_created']} tags and {stats['comments']} comments"
+        ))
+        if not options['rebuild_related'] and stats['created']:
+            self.stdout.write('Imported posts have no related posts yet; run rebuild_related_posts to compute them')
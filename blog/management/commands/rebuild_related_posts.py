@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from blog.related import rebuild_all
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-posts table for every published post'
+
+    def handle(self, *args, **options):
+        posts, rows = rebuild_all()
+        self.stdout.write(
+            self.style.SUCCESS(f'Stored {rows} related-post links for {posts} posts')
+        )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from blog.models import Post
+from blog.rendering import render_post_body
+
+
+class Command(BaseCommand):
+    help = 'Re-render and sanitize the stored HTML of every post (run after changing the BLEACH_* settings)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--missing', action='store_true', help='Only render posts without stored HTML')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.only('id', 'body', 'body_html').order_by('id')
+        if options['missing']:
+            posts = posts.filter(body_html='')
+
+        batch, rendered = [], 0
+        for post in posts.iterator(chunk_size=options['batch_size']):
+            post.body_html = render_post_body(post.body)
+            batch.append(post)
+            if len(batch) >= options['batch_size']:
+                Post.objects.bulk_update(batch, ['body_html'])
+                rendered += len(batch)
+                batch = []
+        if batch:
+            Post.objects.bulk_update(batch, ['body_html'])
+            rendered += len(batch)
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} posts'))
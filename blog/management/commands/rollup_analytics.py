@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog.analytics import rollup_events
+
+
+class Command(BaseCommand):
+    help = 'Compact logged post views into daily per-post rollups (run every few minutes)'
+
+    def handle(self, *args, **options):
+        consumed = rollup_events()
+        self.stdout.write(self.style.SUCCESS(f'Rolled up {consumed} view events'))
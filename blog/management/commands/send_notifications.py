@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from blog.notifications import send_pending
+
+
+class Command(BaseCommand):
+    help = 'Send queued notification mail: hourly or daily digests, or a catch-up run of immediate ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('frequency', choices=['immediate', 'hourly', 'daily'])
+
+    def handle(self, *args, **options):
+        sent = send_pending(options['frequency'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} {options['frequency']} messages"))
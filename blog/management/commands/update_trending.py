@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from blog.trending import recompute_scores
+
+
+class Command(BaseCommand):
+    help = 'Recompute time-decayed trending scores and weekly view counts (run hourly)'
+
+    def handle(self, *args, **options):
+        changed = recompute_scores()
+        self.stdout.write(self.style.SUCCESS(f'Updated trending scores for {changed} posts'))
@@ -0,0 +1,184 @@
+"""
+Incremental Markdown rendering by top-level block.
+
+A document is split into top-level blocks (paragraphs, headings, lists,
+tables, fenced code, ...). Each block's sanitized HTML is memoized in a
+bounded per-process LRU keyed by a hash of its source, so re-rendering
+a long post after a small edit only runs Markdown and Pygments on the
+blocks that changed. The live preview and the save-time render share
+the cache.
+
+Documents using features that need the whole document at once (link
+reference definitions, footnotes, abbreviations, definition lists,
+raw HTML blocks and comments, ``[TOC]``) are rendered as a single
+block.
+Heading ids are made unique across blocks afterwards, the way the toc
+extension does within one document (``intro``, ``intro_1``).
+"""
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from markdown import Markdown
+from markdown.extensions.toc import unique
+
+from blog_app import metrics
+
+FENCE_RE = re.compile(r'^ {0,3}(`{3,}|~{3,})')
+LIST_ITEM_RE = re.compile(r'^ {0,3}(?:[*+-]|\d+[.)])\s')
+# Raw HTML blocks and comments may span blank lines, so splitting on those could cut them open
+WHOLE_DOCUMENT_RE = re.compile(
+    r'^ {0,3}\[[^\]]+\]:\s|\[\^|^\*\[|\[TOC\]|^ {0,3}:\s|\bmarkdown=|^ {0,3}<[a-zA-Z/!?]|<!--', re.MULTILINE
+)
+HEADING_ID_RE = re.compile(r'(<h[1-6]\b[^>]*?\sid=")([^"]*)(")')
+
+RENDER_SECONDS = metrics.histogram('markdown_render_seconds', 'Time to render a Markdown document')
+BLOCK_LOOKUPS = metrics.counter('markdown_block_cache_total', 'Markdown block cache lookups by result', ['result'])
+
+
+def get_block_cache_settings():
+    config = getattr(settings, 'MARKDOWN_BLOCK_CACHE', {})
+    return {
+        'MAX_BLOCKS': config.get('MAX_BLOCKS', 5000),
+    }
+
+
+def _continues(block_lines, line):
+    """Whether ``line`` after a blank line still belongs to the current block"""
+    if line[:1] in (' ', '\t'):
+        return True
+    first = block_lines[0]
+    if LIST_ITEM_RE.match(first) and LIST_ITEM_RE.match(line):
+        return True
+    return first.lstrip().startswith('>') and line.lstrip().startswith('>')
+
+
+def split_blocks(text):
+    """Split Markdown ``text`` into top-level block sources"""
+    text = (text or '').replace('\r\n', '\n')
+    if WHOLE_DOCUMENT_RE.search(text):
+        return [text] if text.strip() else []
+
+    blocks, current, fence = [], [], None
+    for line in text.split('\n'):
+        if fence:
+            current.append(line)
+            if line.strip().startswith(fence):
+                fence = None
+            continue
+        if not line.strip():
+            if current:
+                current.append(line)
+            continue
+        if current and not current[-1].strip() and not _continues(current, line):
+            blocks.append('\n'.join(current).strip('\n'))
+            current = []
+        match = FENCE_RE.match(line)
+        if match:
+            fence = match.group(1)
+        current.append(line)
+    if current:
+        blocks.append('\n'.join(current).strip('\n'))
+    return blocks
+
+
+class BlockCache:
+    """Thread-safe LRU of rendered block HTML keyed by source hash"""
+
+    def __init__(self):
+        self._blocks = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._blocks.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._blocks.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def set(self, key, html):
+        max_blocks = get_block_cache_settings()['MAX_BLOCKS']
+        with self._lock:
+            self._blocks[key] = html
+            self._blocks.move_to_end(key)
+            while len(self._blocks) > max_blocks:
+                self._blocks.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'blocks': len(self._blocks),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+block_cache = BlockCache()
+_local = threading.local()
+
+
+def _markdown():
+    # Building a Markdown instance loads every extension; reuse one per thread
+    md = getattr(_local, 'markdown', None)
+    if md is None:
+        md = _local.markdown = Markdown(
+            extensions=settings.MARKDOWNX_MARKDOWN_EXTENSIONS,
+            extension_configs=getattr(settings, 'MARKDOWNX_MARKDOWN_EXTENSION_CONFIGS', {}),
+        )
+    return md
+
+
+def _unique_heading_ids(html):
+    """Suffix heading ids repeated across blocks, as toc does within one document"""
+    seen = set()
+    return HEADING_ID_RE.sub(lambda match: match.group(1) + unique(match.group(2), seen) + match.group(3), html)
+
+
+def render_block(source):
+    from .embeds import postprocess_html
+    from .rendering import get_policy
+    return postprocess_html(get_policy().clean(_markdown().reset().convert(source)))
+
+
+def render_markdown(text):
+    """
+    Render ``text`` to sanitized HTML block by block.
+
+    Returns (html, stats) where stats counts this call's cache hits.
+    """
+    parts, hits = [], 0
+    with RENDER_SECONDS.time():
+        blocks = split_blocks(text)
+        for source in blocks:
+            key = hashlib.sha1(source.encode('utf-8')).hexdigest()
+            html = block_cache.get(key)
+            if html is None:
+                html = render_block(source)
+                block_cache.set(key, html)
+            else:
+                hits += 1
+            parts.append(html)
+    if hits:
+        BLOCK_LOOKUPS.inc(hits, result='hit')
+    if len(blocks) > hits:
+        BLOCK_LOOKUPS.inc(len(blocks) - hits, result='miss')
+    stats = {
+        'blocks': len(blocks),
+        'hits': hits,
+        'hit_ratio': round(hits / len(blocks), 4) if blocks else 0.0,
+    }
+    html = '\n'.join(parts)
+    return (_unique_heading_ids(html) if len(parts) > 1 else html), stats
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.7 on 2026-10-19 01:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_relatedpost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-hour'],
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='trending_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='weekly_views',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-views'], name='blog_post_most_viewed_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-trending_score'], name='blog_post_trending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-weekly_views'], name='blog_post_weekly_views_idx'),
+        ),
+        migrations.AddField(
+            model_name='postviewbucket',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_buckets', to='blog.post'),
+        ),
+        migrations.AddIndex(
+            model_name='postviewbucket',
+            index=models.Index(fields=['hour'], name='blog_postvi_hour_2cb678_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postviewbucket',
+            constraint=models.UniqueConstraint(fields=('post', 'hour'), name='blog_postviewbucket_post_hour_uniq'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_trending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='is_rejected',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='spam_reasons',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='spam_score',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'is_approved', '-created_at'], name='blog_comment_post_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['is_approved', 'is_rejected', '-created_at'], name='blog_comment_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ViewEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('visitor', models.CharField(max_length=16)),
+                ('referrer', models.CharField(blank=True, max_length=255)),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.post')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PostDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('unique_visitors', models.PositiveIntegerField(default=0)),
+                ('visitor_sketch', models.BinaryField()),
+                ('referrers', models.JSONField(default=dict)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='blog.post')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['day'], name='blog_postda_day_b727d2_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postdailystats',
+            constraint=models.UniqueConstraint(fields=('post', 'day'), name='blog_postdailystats_post_day_uniq'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-19 02:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_analytics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('is_approved', False), ('is_rejected', False)), fields=['-created_at'], name='blog_comment_held_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['status', '-created_at'], name='blog_post_published_idx'),
+        ),
+    ]
@@ -3,9 +3,9 @@ from django.db import models
 # Create your models here.
 from django.contrib.auth.models import User
 from django.urls import reverse
-from django.utils.text import slugify
 from markdownx.models import MarkdownxField
 from markdownx.utils import markdownify
+from blog_app.slugs import save_with_unique_slug
 
 
 
@@ -25,7 +25,7 @@ class Tag(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.slug:
-            self.slug = slugify(self.name)
+            return save_with_unique_slug(self, self.name, super().save, *args, **kwargs)
         super().save(*args, **kwargs)
 
 class Post(models.Model):
@@ -38,6 +38,8 @@ class Post(models.Model):
     slug = models.SlugField(max_length=200, unique=True)
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='blog_posts')
     body = MarkdownxField()
+    # Sanitized HTML rendered from body on save (see blog.rendering)
+    body_html = models.TextField(blank=True, editable=False)
     featured_image = models.ImageField(upload_to='posts/featured/%Y/%m/', blank=True, null=True)
     excerpt = models.TextField(max_length=300, blank=True)
     tags = models.ManyToManyField(Tag, blank=True, related_name='posts')
@@ -45,6 +47,9 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     views = models.PositiveIntegerField(default=0)
+    # Maintained by the periodic trending job from PostViewBucket rows
+    trending_score = models.FloatField(default=0)
+    weekly_views = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['-created_at']
@@ -52,6 +57,11 @@ class Post(models.Model):
             models.Index(fields=['-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['author']),
+            # Published listings and feeds (found by analyze_queries)
+            models.Index(fields=['status', '-created_at'], name='blog_post_published_idx'),
+            models.Index(fields=['status', '-views'], name='blog_post_most_viewed_idx'),
+            models.Index(fields=['status', '-trending_score'], name='blog_post_trending_idx'),
+            models.Index(fields=['status', '-weekly_views'], name='blog_post_weekly_views_idx'),
         ]
     
     def __str__(self):
@@ -60,23 +70,55 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse('blog:post_detail', kwargs={'slug': self.slug})
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_body = instance.__dict__.get('body')
+        return instance
+    
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = slugify(self.title)
         # Auto-generate excerpt if not provided
         if not self.excerpt:
-            # Convert markdown to text and take first 150 characters
-            plain_text = markdownify(self.body)
-            self.excerpt = plain_text[:150] + '...' if len(plain_text) > 150 else plain_text
+            self.excerpt = self.build_excerpt()
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'body' in update_fields:
+            if not self.body_html or self.body != getattr(self, '_loaded_body', None):
+                self.render_body()
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'body_html'}
+        self._loaded_body = self.body
 
+        if not self.slug:
+            return save_with_unique_slug(self, self.title, super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
+    def build_excerpt(self):
+        # Convert markdown to text and take first 150 characters
+        plain_text = markdownify(self.body)
+        return plain_text[:150] + '...' if len(plain_text) > 150 else plain_text
+    
     def get_markdown(self):
         return markdownify(self.body)
     
+    def render_body(self):
+        from .rendering import render_post_body
+        self.body_html = render_post_body(self.body)
+    
+    def get_body_html(self):
+        """Sanitized body HTML, rendered now only for rows saved before body_html existed"""
+        if not self.body_html and self.body:
+            self.render_body()
+            Post.objects.filter(pk=self.pk).update(body_html=self.body_html)
+        return self.body_html
+    
     def increment_views(self):
+        from .trending import record_view
+
+        # Atomic UPDATE so concurrent readers do not lose increments
+        Post.objects.filter(pk=self.pk).update(views=models.F('views') + 1)
         self.views += 1
-        self.save(update_fields=['views'])
+        record_view(self.pk)
     
 class PostImage(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
@@ -95,9 +137,189 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_approved = models.BooleanField(default=True)
+    is_rejected = models.BooleanField(default=False)
+    spam_score = models.FloatField(default=0)
+    spam_reasons = models.CharField(max_length=200, blank=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Approved comments of a post, newest first (post_detail)
+            models.Index(fields=['post', 'is_approved', '-created_at'], name='blog_comment_post_approved_idx'),
+            # Moderation queue
+            models.Index(fields=['is_approved', 'is_rejected', '-created_at'], name='blog_comment_queue_idx'),
+            # Held comments; SQLite cannot search the index above with the bare
+            # boolean terms Django generates, but matches this partial one
+            models.Index(fields=['-created_at'], name='blog_comment_held_idx',
+                         condition=models.Q(is_approved=False, is_rejected=False)),
+        ]
     
     def __str__(self):
-        return f'Comment by {self.author.username} on {self.post.title}'
\ No newline at end of file
+        return f'Comment by {self.author.username} on {self.post.title}'
+
+
+class PostViewBucket(models.Model):
+    """Views of a post within one clock hour, fed from the view-count path"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='view_buckets')
+    hour = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-hour']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'hour'], name='blog_postviewbucket_post_hour_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f'{self.views} views of {self.post_id} at {self.hour:%Y-%m-%d %H:00}'
+
+
+class RelatedPost(models.Model):
+    """Precomputed top-K neighbors of a post, refreshed when posts change"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='related_entries')
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        ordering = ['post', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'rank'], name='blog_relatedpost_post_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.related.title} related to {self.post.title}'
+
+
+class Follow(models.Model):
+    """A user following either an author or a tag"""
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follows')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='followers')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, null=True, blank=True, related_name='followers')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(author__isnull=False, tag__isnull=True) | models.Q(author__isnull=True, tag__isnull=False),
+                name='blog_follow_author_xor_tag',
+            ),
+            models.UniqueConstraint(fields=['follower', 'author'], name='blog_follow_follower_author_uniq'),
+            models.UniqueConstraint(fields=['follower', 'tag'], name='blog_follow_follower_tag_uniq'),
+        ]
+
+    def __str__(self):
+        return f'{self.follower.username} follows {self.author or self.tag}'
+
+
+class TimelineEntry(models.Model):
+    """A post materialized into a follower's timeline by fan-out on publish"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    # Copied from the post so pages are read from this table's index alone
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-post']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='blog_timelineentry_user_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='blog_timeline_keyset_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} in timeline of {self.user_id}'
+
+
+NOTIFICATION_FREQUENCIES = [
+    ('off', 'Off'),
+    ('immediate', 'Immediately'),
+    ('hourly', 'Hourly digest'),
+    ('daily', 'Daily digest'),
+]
+
+
+class NotificationPreference(models.Model):
+    """How often a user wants each kind of notification; no row means the defaults"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='notification_preference')
+    new_posts = models.CharField(max_length=10, choices=NOTIFICATION_FREQUENCIES, default='daily')
+    comment_replies = models.CharField(max_length=10, choices=NOTIFICATION_FREQUENCIES, default='immediate')
+
+    def __str__(self):
+        return f'Notification preferences of {self.user.username}'
+
+
+class Notification(models.Model):
+    """A pending or sent notification; pending rows are the delivery queue"""
+    KIND_CHOICES = [
+        ('new_post', 'New post'),
+        ('comment_reply', 'Comment reply'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    # Copied from the user's preference when queued
+    frequency = models.CharField(max_length=10, choices=NOTIFICATION_FREQUENCIES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set by the delivery run that is sending the row (see notifications.send_pending)
+    claim_token = models.UUIDField(null=True, blank=True, editable=False)
+    claimed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], condition=models.Q(kind='new_post'),
+                                    name='blog_notification_new_post_uniq'),
+        ]
+        indexes = [
+            # Partial index over the queue only; sent rows are never scanned
+            models.Index(fields=['frequency', 'user'], condition=models.Q(sent_at__isnull=True),
+                         name='blog_notification_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} for {self.user_id}'
+
+
+class ViewEvent(models.Model):
+    """Append-only log of post views, compacted into PostDailyStats by the rollup job"""
+    # Only the primary key is indexed: rows are inserted on every view and read back in id order
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+', db_index=False)
+    created_at = models.DateTimeField()
+    # Keyed hash of the visitor (user id, or IP and user agent); never the raw values
+    visitor = models.CharField(max_length=16)
+    referrer = models.CharField(max_length=255, blank=True)
+
+    def __str__(self):
+        return f'View of {self.post_id} at {self.created_at:%Y-%m-%d %H:%M}'
+
+
+class PostDailyStats(models.Model):
+    """One post's views on one day, with a HyperLogLog sketch of its visitors"""
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    views = models.PositiveIntegerField(default=0)
+    unique_visitors = models.PositiveIntegerField(default=0)
+    visitor_sketch = models.BinaryField()
+    # Most frequent referrer hosts, {host: views}; '' is direct traffic
+    referrers = models.JSONField(default=dict)
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(fields=['post', 'day'], name='blog_postdailystats_post_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f'{self.views} views of {self.post_id} on {self.day}'
@@ -0,0 +1,150 @@
+"""
+Spam scoring and the moderation queue for comments.
+
+Every new comment is scored on submit by a small local classifier:
+word and character n-gram features, link counts and how fast the author
+has been commenting. Comments above HOLD_THRESHOLD are held
+(``is_approved=False``) until a moderator approves or rejects them.
+"""
+import math
+import re
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Comment
+
+LINK_RE = re.compile(r'(?:https?://|www\.)\S+', re.IGNORECASE)
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+DEFAULT_SPAM_NGRAMS = [
+    'buy now', 'click here', 'free money', 'casino', 'viagra', 'crypto giveaway',
+    'work from home', 'earn money', 'limited offer', 'cheap', 'discount', 'loan',
+    'subscribe to my', 'check out my', 'visit my', 'telegram', 'whatsapp',
+]
+
+# Weight per feature in the logistic score; the bias keeps plain text near zero
+WEIGHTS = {
+    'bias': -3.0,
+    'links': 1.4,
+    'spam_ngrams': 1.8,
+    'repetition': 2.5,
+    'uppercase': 2.0,
+    'rate': 0.8,
+    'duplicate': 3.0,
+    'trusted': -2.5,
+}
+
+
+def get_moderation_settings():
+    config = getattr(settings, 'COMMENT_MODERATION', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'HOLD_THRESHOLD': config.get('HOLD_THRESHOLD', 0.5),
+        'FREE_LINKS': config.get('FREE_LINKS', 1),
+        'RATE_WINDOW_SECONDS': config.get('RATE_WINDOW_SECONDS', 600),
+        'RATE_LIMIT': config.get('RATE_LIMIT', 5),
+        'TRUSTED_AFTER': config.get('TRUSTED_AFTER', 3),
+        'SPAM_NGRAMS': config.get('SPAM_NGRAMS', DEFAULT_SPAM_NGRAMS),
+    }
+
+
+def word_ngrams(words, max_n=3):
+    for n in range(1, max_n + 1):
+        for start in range(len(words) - n + 1):
+            yield ' '.join(words[start:start + n])
+
+
+def char_repetition(text, n=3):
+    """Share of repeated character n-grams; close to 1 for 'aaaaaa' or copy-pasted lines"""
+    text = re.sub(r'\s+', ' ', text.lower())
+    grams = [text[i:i + n] for i in range(len(text) - n + 1)]
+    if len(grams) < 20:
+        return 0.0
+    return 1 - len(set(grams)) / len(grams)
+
+
+def extract_features(content, author=None, now=None):
+    """Return the feature values for a comment about to be saved"""
+    config = get_moderation_settings()
+    words = [word.lower() for word in WORD_RE.findall(content)]
+    grams = Counter(word_ngrams(words))
+    letters = [char for char in content if char.isalpha()]
+
+    features = {
+        'links': max(len(LINK_RE.findall(content)) - config['FREE_LINKS'], 0),
+        'spam_ngrams': sum(grams[ngram] for ngram in config['SPAM_NGRAMS']),
+        'repetition': char_repetition(content),
+        'uppercase': (sum(char.isupper() for char in letters) / len(letters)) if len(letters) >= 20 else 0.0,
+        'rate': 0,
+        'duplicate': 0,
+        'trusted': 0,
+    }
+
+    if author is not None and author.pk:
+        if author.is_staff:
+            features['trusted'] = 2
+        window_start = (now or timezone.now()) - timedelta(seconds=config['RATE_WINDOW_SECONDS'])
+        recent = list(
+            Comment.objects.filter(author=author, created_at__gte=window_start)
+            .values_list('content', flat=True)[:config['RATE_LIMIT'] * 2]
+        )
+        features['rate'] = max(len(recent) - config['RATE_LIMIT'] + 1, 0)
+        features['duplicate'] = int(content.strip() in {text.strip() for text in recent})
+        if not features['trusted']:
+            approved = Comment.objects.filter(author=author, is_approved=True)[:config['TRUSTED_AFTER']].count()
+            features['trusted'] = int(approved >= config['TRUSTED_AFTER'])
+    return features
+
+
+def spam_score(features):
+    """Map features to a 0..1 spam probability"""
+    total = WEIGHTS['bias'] + sum(WEIGHTS[name] * value for name, value in features.items())
+    return 1 / (1 + math.exp(-total))
+
+
+def score_comment(comment, now=None):
+    """
+    Score ``comment`` in place before it is saved.
+
+    Sets ``spam_score`` and ``spam_reasons`` and holds the comment for
+    moderation when the score reaches the threshold. Returns True if held.
+    """
+    config = get_moderation_settings()
+    if not config['ENABLED']:
+        return False
+    features = extract_features(comment.content, comment.author, now)
+    comment.spam_score = round(spam_score(features), 4)
+    comment.spam_reasons = ', '.join(
+        name for name, value in features.items() if WEIGHTS[name] * value >= 0.5
+    )
+    held = comment.spam_score >= config['HOLD_THRESHOLD']
+    comment.is_approved = not held
+    return held
+
+
+def moderation_queue(status='held'):
+    """Comments awaiting a decision (``held``) or already ``rejected``"""
+    comments = Comment.objects.select_related('author', 'post')
+    if status == 'rejected':
+        return comments.filter(is_approved=False, is_rejected=True)
+    return comments.filter(is_approved=False, is_rejected=False)
+
+
+def approve_comments(comment_ids):
+    """Approve comments in one UPDATE and notify about newly approved ones; return the number changed"""
+    from .notifications import queue_comment_notifications
+    from .timeline import fan_out_worker
+
+    held = list(Comment.objects.filter(pk__in=comment_ids, is_approved=False).values_list('pk', flat=True))
+    changed = Comment.objects.filter(pk__in=comment_ids).update(is_approved=True, is_rejected=False)
+    for comment_id in held:
+        fan_out_worker.submit(queue_comment_notifications, comment_id)
+    return changed
+
+
+def reject_comments(comment_ids):
+    """Reject comments in one UPDATE; return the number changed"""
+    return Comment.objects.filter(pk__in=comment_ids).update(is_approved=False, is_rejected=True)
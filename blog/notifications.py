@@ -0,0 +1,280 @@
+"""
+Email notifications for new posts and comment replies.
+
+Events are queued as ``Notification`` rows, one per recipient, with the
+recipient's chosen frequency (NotificationPreference, or the defaults in
+NOTIFICATIONS). Queueing runs on the background fan-out pool after the
+post or comment is committed, so requests never wait for mail.
+
+Delivery (``send_pending``) drains the queue for one frequency:
+
+* ``immediate`` rows become one message each. After queueing, the
+  fan-out pool sends at most INLINE_LIMIT of them so it is never tied up
+  by a large audience; ``send_notifications immediate``, scheduled every
+  minute, delivers the rest.
+* ``hourly`` and ``daily`` rows are grouped into one digest per user by
+  the ``send_notifications`` command.
+
+Each batch is claimed with one UPDATE that stamps a run token on rows
+nobody else holds, and only the claimed rows are sent, so runs in
+different processes or hosts can overlap without sending anything
+twice. Claims older than CLAIM_TIMEOUT (a run that died) are taken over.
+
+Templates are rendered once per post, comment and template, never per
+recipient, and messages go out over one reused backend connection in
+batches of BATCH_SIZE.
+
+New-post notifications go to followers of the post's author and tags.
+Comment notifications go to the post author and everyone who already
+commented on the post.
+"""
+import uuid
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Comment, Follow, Notification, Post
+
+DIGEST_FREQUENCIES = ('hourly', 'daily')
+ITEMS_MARKER = '\x00items\x00'
+
+
+def get_notification_settings():
+    config = getattr(settings, 'NOTIFICATIONS', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'BATCH_SIZE': config.get('BATCH_SIZE', 500),
+        'FROM_EMAIL': config.get('FROM_EMAIL', settings.DEFAULT_FROM_EMAIL),
+        'SITE_URL': config.get('SITE_URL', 'http://localhost:8000').rstrip('/'),
+        # Backend for notification mail only; None uses EMAIL_BACKEND
+        'EMAIL_BACKEND': config.get('EMAIL_BACKEND'),
+        'DEFAULT_NEW_POSTS': config.get('DEFAULT_NEW_POSTS', 'daily'),
+        'DEFAULT_COMMENT_REPLIES': config.get('DEFAULT_COMMENT_REPLIES', 'immediate'),
+        # Immediate messages sent by the fan-out pool right after queueing; 0 leaves all to the command
+        'INLINE_LIMIT': config.get('INLINE_LIMIT', 100),
+        'CLAIM_TIMEOUT': config.get('CLAIM_TIMEOUT', 900),
+    }
+
+
+def _queue(kind, recipients, default_frequency, post_id, comment_id=None):
+    """Bulk-insert notifications for (user_id, frequency) pairs; return how many were offered"""
+    batch_size = get_notification_settings()['BATCH_SIZE']
+    queued, batch = 0, []
+    for user_id, frequency in recipients:
+        frequency = frequency or default_frequency
+        if frequency == 'off':
+            continue
+        batch.append(Notification(user_id=user_id, kind=kind, post_id=post_id,
+                                  comment_id=comment_id, frequency=frequency))
+        if len(batch) >= batch_size:
+            Notification.objects.bulk_create(batch, ignore_conflicts=True)
+            queued, batch = queued + len(batch), []
+    if batch:
+        Notification.objects.bulk_create(batch, ignore_conflicts=True)
+        queued += len(batch)
+    return queued
+
+
+def queue_post_notifications(post_id, tag_ids=None):
+    """
+    Queue new-post notifications for the author's and tags' followers.
+
+    With ``tag_ids`` only followers of those tags are considered (tags
+    added after publishing). Users already notified about the post are
+    skipped, including after it is unpublished and published again.
+    """
+    config = get_notification_settings()
+    post = Post.objects.filter(pk=post_id, status='published').first()
+    if post is None or not config['ENABLED']:
+        return 0
+    tags = post.tags.all() if tag_ids is None else post.tags.filter(pk__in=tag_ids)
+    sources = Q(tag__in=tags.values('pk'))
+    if tag_ids is None:
+        sources |= Q(author_id=post.author_id)
+    notified = Notification.objects.filter(kind='new_post', post_id=post.pk).values('user_id')
+    recipients = (Follow.objects.filter(sources)
+                  .exclude(follower_id=post.author_id).exclude(follower__email='')
+                  .exclude(follower_id__in=notified)
+                  .values_list('follower_id', 'follower__notification_preference__new_posts')
+                  .distinct().order_by('follower_id'))
+    queued = _queue('new_post', recipients.iterator(chunk_size=config['BATCH_SIZE']),
+                    config['DEFAULT_NEW_POSTS'], post.pk)
+    if queued:
+        _send_inline(config)
+    return queued
+
+
+def queue_comment_notifications(comment_id):
+    """Queue reply notifications for the post author and earlier commenters"""
+    config = get_notification_settings()
+    comment = Comment.objects.filter(pk=comment_id, is_approved=True).select_related('post').first()
+    if comment is None or not config['ENABLED']:
+        return 0
+    participants = (Comment.objects.filter(post_id=comment.post_id, is_approved=True, created_at__lt=comment.created_at)
+                    .values('author'))
+    recipients = (User.objects
+                  .filter(Q(pk=comment.post.author_id) | Q(pk__in=participants))
+                  .exclude(pk=comment.author_id).exclude(email='')
+                  .values_list('pk', 'notification_preference__comment_replies').order_by('pk'))
+    queued = _queue('comment_reply', recipients.iterator(chunk_size=config['BATCH_SIZE']),
+                    config['DEFAULT_COMMENT_REPLIES'], comment.post_id, comment.pk)
+    _send_inline(config)
+    return queued
+
+
+def _send_inline(config):
+    if config['INLINE_LIMIT'] > 0:
+        send_pending('immediate', limit=config['INLINE_LIMIT'])
+
+
+class MessageRenderer:
+    """Renders each template once per post/comment and reuses the text for every recipient"""
+
+    def __init__(self, config):
+        self.base_context = {
+            'site_url': config['SITE_URL'],
+            'settings_url': reverse('blog:notification_settings'),
+        }
+        self._rendered = {}
+        self._posts = {}
+        self._comments = {}
+
+    def _render(self, key, template, context):
+        if key not in self._rendered:
+            self._rendered[key] = render_to_string(template, {**self.base_context, **context})
+        return self._rendered[key]
+
+    def _event_context(self, notification):
+        # Each post and comment is loaded once per run, not joined onto every queued row
+        if notification.post_id not in self._posts:
+            self._posts[notification.post_id] = (
+                Post.objects.select_related('author').defer('body', 'body_html').get(pk=notification.post_id))
+        comment = None
+        if notification.comment_id:
+            if notification.comment_id not in self._comments:
+                self._comments[notification.comment_id] = (
+                    Comment.objects.select_related('author').get(pk=notification.comment_id))
+            comment = self._comments[notification.comment_id]
+        return {'kind': notification.kind, 'post': self._posts[notification.post_id], 'comment': comment}
+
+    def message(self, notification):
+        """(subject, body) of a single notification"""
+        key = (notification.kind, notification.post_id, notification.comment_id)
+        context = self._event_context(notification)
+        subject = self._render(key + ('subject',), f'blog/email/{notification.kind}_subject.txt', context)
+        body = self._render(key + ('body',), f'blog/email/{notification.kind}.txt', context)
+        return subject.strip(), body
+
+    def digest(self, frequency, notifications):
+        """(subject, body) of one user's digest"""
+        subject = self._render(('digest', frequency, 'subject'), 'blog/email/digest_subject.txt',
+                               {'frequency': frequency})
+        head, _, tail = self._render(('digest', frequency, 'body'), 'blog/email/digest.txt',
+                                     {'frequency': frequency, 'items': ITEMS_MARKER}).partition(ITEMS_MARKER)
+        items = ''.join(
+            self._render((n.kind, n.post_id, n.comment_id, 'item'), 'blog/email/digest_item.txt',
+                         self._event_context(n))
+            for n in notifications
+        )
+        return subject.strip(), head + items + tail
+
+
+def send_bulk(messages, connection):
+    """Send prepared messages over one open connection; return how many were sent"""
+    return connection.send_messages(messages) or 0
+
+
+def _unclaimed(config):
+    """Unsent rows that no live run holds; claims older than CLAIM_TIMEOUT are up for grabs"""
+    stale = timezone.now() - timedelta(seconds=config['CLAIM_TIMEOUT'])
+    return Q(sent_at__isnull=True) & (Q(claim_token__isnull=True) | Q(claimed_at__lt=stale))
+
+
+def _pending(frequency, config):
+    return Notification.objects.filter(_unclaimed(config), frequency=frequency)
+
+
+def _claim(pks, token, config):
+    """Stamp ``token`` on the rows of ``pks`` still unclaimed, in one UPDATE; return the rows this run holds"""
+    Notification.objects.filter(_unclaimed(config), pk__in=pks).update(claim_token=token, claimed_at=timezone.now())
+    return (Notification.objects.filter(claim_token=token, pk__in=pks, sent_at__isnull=True).select_related('user')
+            .only('kind', 'post_id', 'comment_id', 'created_at', 'user__email'))
+
+
+def send_pending(frequency, limit=None):
+    """
+    Deliver queued notifications of ``frequency``; return messages sent.
+
+    Sends at most ``limit`` messages if given. Rows are claimed batch
+    by batch, so concurrent runs split the queue instead of both sending
+    it; rows of a batch that fails to send are released for the next run.
+    """
+    config = get_notification_settings()
+    token = uuid.uuid4()
+    renderer = MessageRenderer(config)
+    try:
+        with get_connection(backend=config['EMAIL_BACKEND'], fail_silently=False) as connection:
+            if frequency in DIGEST_FREQUENCIES:
+                return _send_digests(frequency, renderer, connection, config, token, limit)
+            return _send_immediate(renderer, connection, config, token, limit)
+    finally:
+        Notification.objects.filter(claim_token=token, sent_at__isnull=True).update(claim_token=None, claimed_at=None)
+
+
+def _deliver(messages, notification_ids, connection):
+    sent = send_bulk(messages, connection)
+    Notification.objects.filter(pk__in=notification_ids).update(sent_at=timezone.now())
+    return sent
+
+
+def _batch_size(config, sent, limit):
+    return config['BATCH_SIZE'] if limit is None else min(config['BATCH_SIZE'], limit - sent)
+
+
+def _send_immediate(renderer, connection, config, token, limit):
+    sent, last_pk = 0, 0
+    while limit is None or sent < limit:
+        pks = list(_pending('immediate', config).filter(pk__gt=last_pk).order_by('pk')
+                   .values_list('pk', flat=True)[:_batch_size(config, sent, limit)])
+        if not pks:
+            return sent
+        # Rows another run claimed in the meantime are left to it
+        batch = list(_claim(pks, token, config).order_by('pk'))
+        messages = []
+        for notification in batch:
+            subject, body = renderer.message(notification)
+            messages.append(EmailMessage(subject, body, config['FROM_EMAIL'], [notification.user.email],
+                                         connection=connection))
+        if messages:
+            sent += _deliver(messages, [notification.pk for notification in batch], connection)
+        last_pk = pks[-1]
+    return sent
+
+
+def _send_digests(frequency, renderer, connection, config, token, limit):
+    sent, last_user = 0, 0
+    while limit is None or sent < limit:
+        pending = _pending(frequency, config)
+        user_ids = list(pending.filter(user_id__gt=last_user).order_by('user_id')
+                        .values_list('user_id', flat=True).distinct()[:_batch_size(config, sent, limit)])
+        if not user_ids:
+            return sent
+        rows = _claim(list(pending.filter(user_id__in=user_ids).values_list('pk', flat=True)), token, config)
+        messages, delivered = [], []
+        for _, notifications in groupby(rows.order_by('user_id', 'created_at'), key=lambda notification: notification.user_id):
+            notifications = list(notifications)
+            subject, body = renderer.digest(frequency, notifications)
+            messages.append(EmailMessage(subject, body, config['FROM_EMAIL'], [notifications[0].user.email],
+                                         connection=connection))
+            delivered.extend(notification.pk for notification in notifications)
+        if messages:
+            sent += _deliver(messages, delivered, connection)
+        last_user = user_ids[-1]
+    return sent
@@ -0,0 +1,324 @@
+import heapq
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from .models import Post, RelatedPost
+
+TOKEN_RE = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+MARKUP_RE = re.compile(r'!?\[([^\]]*)\]\([^)]*\)|<[^>]+>|```.*?```', re.DOTALL)
+
+TITLE_WEIGHT = 2
+
+logger = logging.getLogger(__name__)
+
+
+def get_related_settings():
+    config = getattr(settings, 'RELATED_POSTS', {})
+    return {
+        'TOP_K': config.get('TOP_K', 5),
+        'TAG_WEIGHT': config.get('TAG_WEIGHT', 0.5),
+        'MIN_SCORE': config.get('MIN_SCORE', 0.01),
+        'ASYNC': config.get('ASYNC', True),
+        'DELAY_SECONDS': config.get('DELAY_SECONDS', 2),
+    }
+
+
+def tokenize(text):
+    """Lowercase word tokens with links, HTML and fenced code stripped"""
+    text = MARKUP_RE.sub(lambda match: match.group(1) or ' ', text or '')
+    return TOKEN_RE.findall(text.lower())
+
+
+def _normalize(vector):
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    if not norm:
+        return {}
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+class SimilarityIndex:
+    """
+    Sparse TF-IDF and tag vectors for published posts, with inverted
+    indexes so a post is only scored against posts sharing a term or tag.
+
+    ``update`` and ``remove`` patch a single post in place. Vectors are
+    weighted with the corpus statistics of the moment they were added, so
+    an index kept current this way drifts slightly from a fresh ``build``
+    until the next full rebuild.
+    """
+
+    def __init__(self, documents, post_tags):
+        self.text_vectors = {}
+        self.tag_vectors = {}
+        self.term_postings = defaultdict(dict)
+        self.tag_postings = defaultdict(dict)
+        self.synced_at = None
+        self._term_counts = {
+            post_id: Counter(tokenize(title) * TITLE_WEIGHT + tokenize(body))
+            for post_id, title, body in documents
+        }
+        self._tags = {post_id: set(post_tags.get(post_id, ())) for post_id in self._term_counts}
+        self.document_frequency = Counter(term for counts in self._term_counts.values() for term in counts)
+        self.tag_frequency = Counter(tag for tags in self._tags.values() for tag in tags)
+        for post_id in self._term_counts:
+            self._add_vectors(post_id)
+
+    @classmethod
+    def build(cls):
+        """Build the index from all published posts and their tags"""
+        started = timezone.now()
+        index = cls(*_load_documents(Post.objects.filter(status='published')))
+        index.synced_at = started
+        return index
+
+    def _add_vectors(self, post_id):
+        total = len(self._term_counts) or 1
+        vector = _normalize({
+            term: (1 + math.log(count)) * math.log(1 + total / self.document_frequency[term])
+            for term, count in self._term_counts[post_id].items()
+        })
+        self.text_vectors[post_id] = vector
+        for term, weight in vector.items():
+            self.term_postings[term][post_id] = weight
+
+        tag_vector = _normalize({
+            tag: math.log(1 + total / self.tag_frequency[tag])
+            for tag in self._tags[post_id]
+        })
+        self.tag_vectors[post_id] = tag_vector
+        for tag, weight in tag_vector.items():
+            self.tag_postings[tag][post_id] = weight
+
+    def remove(self, post_id):
+        """Drop ``post_id`` from the vectors, postings and corpus statistics"""
+        for vectors, postings in ((self.text_vectors, self.term_postings), (self.tag_vectors, self.tag_postings)):
+            for key in vectors.pop(post_id, {}):
+                postings[key].pop(post_id, None)
+                if not postings[key]:
+                    del postings[key]
+        for frequency, keys in ((self.document_frequency, self._term_counts.pop(post_id, ())),
+                                (self.tag_frequency, self._tags.pop(post_id, ()))):
+            for key in keys:
+                frequency[key] -= 1
+                if frequency[key] <= 0:
+                    del frequency[key]
+
+    def update(self, post_id, title, body, tags):
+        """Add ``post_id`` or replace its vectors with ones for the new content"""
+        self.remove(post_id)
+        self._term_counts[post_id] = Counter(tokenize(title) * TITLE_WEIGHT + tokenize(body))
+        self._tags[post_id] = set(tags)
+        self.document_frequency.update(self._term_counts[post_id].keys())
+        self.tag_frequency.update(self._tags[post_id])
+        self._add_vectors(post_id)
+
+    def scores_for(self, post_id):
+        """Return {other_post_id: similarity} for every post sharing a term or tag"""
+        tag_weight = get_related_settings()['TAG_WEIGHT']
+        scores = defaultdict(float)
+        for term, weight in self.text_vectors.get(post_id, {}).items():
+            for other_id, other_weight in self.term_postings[term].items():
+                scores[other_id] += (1 - tag_weight) * weight * other_weight
+        for tag, weight in self.tag_vectors.get(post_id, {}).items():
+            for other_id, other_weight in self.tag_postings[tag].items():
+                scores[other_id] += tag_weight * weight * other_weight
+        scores.pop(post_id, None)
+        return scores
+
+    def top_k(self, post_id, k=None, min_score=None):
+        config = get_related_settings()
+        k = config['TOP_K'] if k is None else k
+        min_score = config['MIN_SCORE'] if min_score is None else min_score
+        scores = self.scores_for(post_id)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
+        return [(other_id, score) for other_id, score in best if score >= min_score]
+
+
+def _load_documents(posts):
+    """Return ``(documents, post_tags)`` for the ``posts`` queryset"""
+    documents = list(posts.values_list('id', 'title', 'body'))
+    post_tags = defaultdict(set)
+    through = Post.tags.through.objects.filter(post__in=posts.values('pk')).values_list('post_id', 'tag_id')
+    for post_id, tag_id in through.iterator(chunk_size=2000):
+        post_tags[post_id].add(tag_id)
+    return documents, post_tags
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _sync_index(post_ids=(), batch_size=500):
+    """
+    Bring this process's index up to date with the database.
+
+    The index is built once per process; after that only posts saved
+    since the last sync (by any process), new or unpublished ones and
+    ``post_ids`` are re-read and patched in. Returns the index and the
+    ids of every post patched or removed. Call with ``_index_lock`` held.
+    """
+    global _index
+    if _index is None:
+        _index = SimilarityIndex.build()
+    started = timezone.now()
+    published = Post.objects.filter(status='published')
+    current = set(published.values_list('pk', flat=True))
+    removed = set(_index.text_vectors) - current
+    for post_id in removed:
+        _index.remove(post_id)
+    changed = (current - set(_index.text_vectors)) | current.intersection(post_ids)
+    changed.update(published.filter(updated_at__gte=_index.synced_at).values_list('pk', flat=True))
+    changed = sorted(changed)
+    for start in range(0, len(changed), batch_size):
+        documents, post_tags = _load_documents(published.filter(pk__in=changed[start:start + batch_size]))
+        for post_id, title, body in documents:
+            _index.update(post_id, title, body, post_tags.get(post_id, ()))
+    _index.synced_at = started
+    return _index, removed.union(changed)
+
+
+def _write_neighbors(post_ids, index):
+    """Replace the stored neighbor lists of ``post_ids``"""
+    rows = []
+    for post_id in post_ids:
+        for rank, (related_id, score) in enumerate(index.top_k(post_id)):
+            rows.append(RelatedPost(post_id=post_id, related_id=related_id, score=score, rank=rank))
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=post_ids).delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def rebuild_all(batch_size=500):
+    """Recompute the neighbor lists of every published post from a fresh index"""
+    global _index
+    index = SimilarityIndex.build()
+    post_ids = list(index.text_vectors)
+    RelatedPost.objects.exclude(post_id__in=post_ids).delete()
+    written = 0
+    for start in range(0, len(post_ids), batch_size):
+        written += _write_neighbors(post_ids[start:start + batch_size], index)
+    with _index_lock:
+        _index = index
+    return len(post_ids), written
+
+
+def update_posts(post_ids, stale=(), batch_size=500):
+    """
+    Refresh neighbor lists affected by changes to ``post_ids``.
+
+    Only the changed posts' vectors are recomputed (see ``_sync_index``);
+    posts saved by other processes since the last refresh count as
+    changed too. Besides the changed posts, only posts that currently
+    list one of them, or that one would now displace a neighbor from,
+    are recomputed. ``stale`` posts (e.g. those that listed a deleted post)
+    are recomputed as well.
+    """
+    config = get_related_settings()
+    with _index_lock:
+        index, synced = _sync_index(post_ids, batch_size)
+        post_ids = synced.union(post_ids)
+
+        affected = set(stale)
+        affected.update(RelatedPost.objects.filter(related_id__in=post_ids).values_list('post_id', flat=True))
+        # Unpublished or deleted: drop them everywhere and refill the lists they left
+        gone = post_ids.difference(index.text_vectors)
+        if gone:
+            RelatedPost.objects.filter(post_id__in=gone).delete()
+        changed = post_ids - gone
+        candidates = {}
+        for post_id in changed:
+            for other_id, score in index.scores_for(post_id).items():
+                if score >= config['MIN_SCORE']:
+                    candidates[other_id] = max(score, candidates.get(other_id, 0))
+        candidate_ids = sorted(candidates)
+        for start in range(0, len(candidate_ids), batch_size):
+            chunk = candidate_ids[start:start + batch_size]
+            current = {
+                row['post_id']: (row['size'], row['weakest'])
+                for row in RelatedPost.objects.filter(post_id__in=chunk).order_by()
+                .values('post_id').annotate(size=Count('id'), weakest=Min('score'))
+            }
+            for other_id in chunk:
+                size, weakest = current.get(other_id, (0, 0))
+                if size < config['TOP_K'] or candidates[other_id] > weakest:
+                    affected.add(other_id)
+        affected |= changed
+        affected = affected.intersection(index.text_vectors)
+        return _write_neighbors(sorted(affected), index) if affected else 0
+
+
+class RelatedPostsQueue:
+    """
+    Refreshes related posts on a background thread once the triggering transaction commits.
+
+    Each refresh re-reads the published post ids and queries the stored
+    lists of every candidate neighbor, so changes are coalesced: ids arriving within DELAY_SECONDS of the
+    first one (the post_save and tag m2m signals of one form save, every
+    post of a renamed tag, a burst of edits) share a single
+    ``update_posts`` call. One thread runs the refreshes in order. With
+    ASYNC off they run synchronously on commit instead, one per call.
+    """
+
+    def __init__(self):
+        self._changed = set()
+        self._stale = set()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def add(self, post_ids, stale=()):
+        post_ids, stale = set(post_ids), set(stale)
+        if not post_ids and not stale:
+            return
+        if not get_related_settings()['ASYNC']:
+            transaction.on_commit(lambda: update_posts(post_ids, stale))
+            return
+        transaction.on_commit(lambda: self._enqueue(post_ids, stale))
+
+    def _enqueue(self, post_ids, stale):
+        with self._lock:
+            idle = not self._changed and not self._stale
+            self._changed |= post_ids
+            self._stale |= stale
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='blog-related')
+        if idle:
+            self._executor.submit(self._run)
+
+    def _run(self):
+        time.sleep(get_related_settings()['DELAY_SECONDS'])
+        with self._lock:
+            post_ids, stale = self._changed, self._stale
+            self._changed, self._stale = set(), set()
+        if not post_ids and not stale:
+            return
+        close_old_connections()
+        try:
+            update_posts(post_ids, stale)
+        except Exception:
+            logger.exception('Related posts refresh of %d posts failed', len(post_ids | stale))
+        finally:
+            close_old_connections()
+
+
+related_queue = RelatedPostsQueue()
+
+
+def get_related_posts(post):
+    """Return the precomputed related posts with a single indexed lookup"""
+    return [
+        entry.related for entry in
+        RelatedPost.objects.filter(post=post, related__status='published')
+        .select_related('related', 'related__author')
+        .order_by('rank')
+    ]
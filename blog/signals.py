@@ -0,0 +1,89 @@
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import Comment, Post, RelatedPost, Tag
+from .notifications import queue_comment_notifications, queue_post_notifications
+from .related import related_queue
+from .timeline import fan_out_post, fan_out_worker, retract_post
+
+RELATED_FIELDS = {'title', 'body', 'status'}
+
+
+@receiver(post_save, sender=Post)
+def refresh_related_on_save(sender, instance, update_fields=None, **kwargs):
+    """Recompute related posts when content or status changes, not on view bumps"""
+    if update_fields is not None and not RELATED_FIELDS.intersection(update_fields):
+        return
+    related_queue.add([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def refresh_related_on_tags(sender, instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    # With reverse set, a tag gained or lost posts; they are refreshed together
+    related_queue.add((kwargs.get('pk_set') or ()) if reverse else [instance.pk])
+
+
+@receiver(pre_delete, sender=Post)
+def refresh_related_on_delete(sender, instance, **kwargs):
+    """Refill the lists that pointed at a deleted post once the delete commits"""
+    post_ids = list(RelatedPost.objects.filter(related=instance).values_list('post_id', flat=True))
+    related_queue.add([], stale=[post_id for post_id in post_ids if post_id != instance.pk])
+
+
+@receiver(pre_save, sender=Post)
+def remember_published_state(sender, instance, **kwargs):
+    instance._was_published = bool(instance.pk) and Post.objects.filter(pk=instance.pk, status='published').exists()
+
+
+def touch_posts(posts):
+    """Move ``updated_at`` without save(), so feed fingerprints see changes shown alongside a post"""
+    posts.update(updated_at=timezone.now())
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def touch_posts_on_tags(sender, instance, action, reverse, pk_set=None, **kwargs):
+    if not reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        touch_posts(Post.objects.filter(pk=instance.pk))
+    elif reverse and action in ('post_add', 'post_remove'):
+        touch_posts(Post.objects.filter(pk__in=pk_set))
+    elif reverse and action == 'pre_clear':
+        touch_posts(Post.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def touch_posts_on_tag_change(sender, instance, **kwargs):
+    """Tag names appear in the feeds of every post carrying the tag"""
+    touch_posts(Post.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Post)
+def fan_out_on_publish(sender, instance, created=False, update_fields=None, **kwargs):
+    """Push newly published posts into followers' timelines; pull unpublished ones back out"""
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    was_published = getattr(instance, '_was_published', False)
+    if instance.status == 'published' and not was_published:
+        fan_out_worker.submit(fan_out_post, instance.pk)
+        fan_out_worker.submit(queue_post_notifications, instance.pk)
+    elif instance.status != 'published' and was_published:
+        fan_out_worker.submit(retract_post, instance.pk)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def fan_out_on_tags(sender, instance, action, reverse, pk_set=None, **kwargs):
+    """Tags are saved after the post itself; reach followers of the tags just added"""
+    if action != 'post_add' or reverse or instance.status != 'published' or not pk_set:
+        return
+    tag_ids = sorted(pk_set)
+    fan_out_worker.submit(fan_out_post, instance.pk, tag_ids)
+    fan_out_worker.submit(queue_post_notifications, instance.pk, tag_ids)
+
+
+@receiver(post_save, sender=Comment)
+def notify_on_comment(sender, instance, created=False, **kwargs):
+    """Held comments notify once a moderator approves them (see moderation.approve_comments)"""
+    if created and instance.is_approved:
+        fan_out_worker.submit(queue_comment_notifications, instance.pk)
@@ -0,0 +1,316 @@
+"""
+Render the public blog to plain HTML files that any web server or CDN can serve.
+
+Pages are rendered through the full Django stack with the test client,
+paginated listings are written to ``page/<n>/index.html`` with their
+``?page=`` links rewritten, and every media or static file a page
+references is copied next to them.
+
+Requests carry the site's real host (``base_url``), so ALLOWED_HOSTS and
+absolute URLs behave as in production, and an ``EXPORT_ENVIRON_KEY``
+entry in the WSGI environ that no HTTP client can set, so views can tell
+export renders from reader visits. Any page that does not answer 200
+fails the export.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.db import connections
+from django.db.models import Count, Max
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Post, RelatedPost, Tag
+
+MANIFEST_NAME = '.static-export.json'
+# Not an HTTP_* key, so a request header can never produce it
+EXPORT_ENVIRON_KEY = 'blog.static_export'
+
+PAGE_LINK_RE = re.compile(r'href="\?(?:[^"]*?&(?:amp;)?)?page=(\d+)"')
+ASSET_RE = re.compile(r'(?:src|href)="(?P<url>/(?:media|static)/[^"?#]+)')
+
+# Listing views and their page sizes, mirroring blog.views
+LISTINGS = {
+    'home': 6,
+    'post_list': 9,
+    'our_work': 9,
+}
+TAG_PAGE_SIZE = 9
+
+
+class ExportFailed(Exception):
+    """Some pages did not render; ``failures`` lists (path, status code)"""
+
+    def __init__(self, failures):
+        self.failures = failures
+        super().__init__(', '.join(f'{path} (HTTP {status})' for path, status in failures))
+
+
+def is_export_request(request):
+    return bool(request.META.get(EXPORT_ENVIRON_KEY))
+
+
+def default_base_url():
+    """http:// plus the first ALLOWED_HOSTS entry that is a plain host name"""
+    hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+    return f"http://{hosts[0] if hosts else 'localhost'}"
+
+
+def _client(base_url):
+    url = urlsplit(base_url if '//' in base_url else f'http://{base_url}')
+    secure = url.scheme == 'https'
+    return Client(**{
+        'HTTP_HOST': url.netloc,
+        'SERVER_NAME': url.hostname,
+        'SERVER_PORT': str(url.port or (443 if secure else 80)),
+        'wsgi.url_scheme': 'https' if secure else 'http',
+        EXPORT_ENVIRON_KEY: True,
+    })
+
+
+def _page_paths(path, total, per_page):
+    pages = max(1, math.ceil(total / per_page))
+    return [path] + [f'{path}page/{number}/' for number in range(2, pages + 1)]
+
+
+def listing_paths():
+    """Every page of the home, post list and our-work listings"""
+    published = Post.objects.filter(status='published')
+    totals = {
+        'home': published.count(),
+        'post_list': published.count(),
+        'our_work': published.filter(tags__name__icontains='our').distinct().count(),
+    }
+    paths = []
+    for url_name, per_page in LISTINGS.items():
+        paths += _page_paths(reverse(f'blog:{url_name}'), totals[url_name], per_page)
+    return paths
+
+
+def tag_paths(tag_ids=None):
+    tags = Tag.objects.all()
+    if tag_ids is not None:
+        tags = tags.filter(pk__in=tag_ids)
+    paths = []
+    for tag in tags.iterator():
+        total = tag.posts.filter(status='published').count()
+        paths += _page_paths(tag.get_absolute_url(), total, TAG_PAGE_SIZE)
+    return paths
+
+
+def post_paths(posts):
+    return [post.get_absolute_url() for post in posts.only('slug').iterator()]
+
+
+def output_file(output_dir, path):
+    """Map ``/post/slug/`` to ``<output>/post/slug/index.html``"""
+    return os.path.join(output_dir, path.strip('/'), 'index.html')
+
+
+def _page_query(path):
+    """Turn ``/posts/page/3/`` back into the live URL ``/posts/?page=3``"""
+    match = re.match(r'^(?P<base>.*/)page/(?P<number>\d+)/$', path)
+    if match:
+        return match.group('base'), {'page': match.group('number')}
+    return path, {}
+
+
+def rewrite_page_links(html, path):
+    base, _ = _page_query(path)
+
+    def replace(match):
+        number = int(match.group(1))
+        return f'href="{base}"' if number == 1 else f'href="{base}page/{number}/"'
+
+    return PAGE_LINK_RE.sub(replace, html)
+
+
+def render_paths(paths, output_dir, base_url):
+    """Render ``paths`` to files; return (written, failed, asset URLs)"""
+    client = _client(base_url)
+    assets = set()
+    written = 0
+    failed = []
+    for path in paths:
+        live_path, params = _page_query(path)
+        response = client.get(live_path, params)
+        if response.status_code != 200:
+            failed.append((path, response.status_code))
+            continue
+        html = rewrite_page_links(response.content.decode(response.charset or 'utf-8'), path)
+        assets.update(match.group('url') for match in ASSET_RE.finditer(html))
+        destination = output_file(output_dir, path)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, 'w', encoding='utf-8') as handle:
+            handle.write(html)
+        written += 1
+    return written, failed, assets
+
+
+def _close_connections():
+    # Forked workers must open their own database connections
+    connections.close_all()
+
+
+def render_in_pool(paths, output_dir, workers, base_url, chunk_size=50):
+    if workers <= 1 or len(paths) <= chunk_size:
+        return render_paths(paths, output_dir, base_url)
+
+    chunks = [paths[start:start + chunk_size] for start in range(0, len(paths), chunk_size)]
+    _close_connections()
+    written, failed, assets = 0, [], set()
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('fork'), initializer=_close_connections) as pool:
+        results = pool.map(render_paths, chunks, [output_dir] * len(chunks), [base_url] * len(chunks))
+        for chunk_written, chunk_failed, chunk_assets in results:
+            written += chunk_written
+            failed += chunk_failed
+            assets |= chunk_assets
+    return written, failed, assets
+
+
+def copy_assets(asset_urls, output_dir):
+    """Copy referenced media and static files into the export; return the count"""
+    copied = 0
+    for url in sorted(asset_urls):
+        if url.startswith(settings.MEDIA_URL):
+            source = os.path.join(settings.MEDIA_ROOT, url[len(settings.MEDIA_URL):])
+        else:
+            source = finders.find(url[len('/' + settings.STATIC_URL.strip('/') + '/'):])
+        if not source or not os.path.isfile(source):
+            continue
+        destination = os.path.join(output_dir, url.lstrip('/'))
+        if os.path.exists(destination) and os.path.getmtime(destination) >= os.path.getmtime(source):
+            continue
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        shutil.copy2(source, destination)
+        copied += 1
+    return copied
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding='utf-8') as handle:
+            manifest = json.load(handle)
+    except (OSError, ValueError):
+        return None
+    # Manifests without each post's tags and page digest cannot tell which pages changed
+    if not isinstance(manifest.get('posts'), dict) or not isinstance(manifest.get('pages'), dict):
+        return None
+    return manifest
+
+
+def published_tags():
+    """{slug: [tag ids]} of every published post"""
+    post_tags = {slug: [] for slug in Post.objects.filter(status='published').values_list('slug', flat=True)}
+    rows = Post.tags.through.objects.filter(post__status='published').values_list('post__slug', 'tag_id')
+    for slug, tag_id in rows.iterator():
+        post_tags[slug].append(tag_id)
+    return post_tags
+
+
+def page_digests():
+    """
+    {slug: digest} of what a published post's page shows besides the post itself.
+
+    Covers its approved comments (count and latest change) and its related
+    posts list, neither of which moves the post's ``updated_at``.
+    """
+    comments = {
+        row['post_id']: [row['count'], row['latest'].isoformat()]
+        for row in Comment.objects.filter(is_approved=True, post__status='published')
+        .order_by().values('post_id').annotate(count=Count('pk'), latest=Max('updated_at'))
+    }
+    related = {}
+    rows = RelatedPost.objects.filter(post__status='published').order_by('post_id', 'rank')
+    for post_id, related_id in rows.values_list('post_id', 'related_id').iterator():
+        related.setdefault(post_id, []).append(related_id)
+    digests = {}
+    for post_id, slug in Post.objects.filter(status='published').values_list('pk', 'slug').iterator():
+        payload = json.dumps([comments.get(post_id), related.get(post_id, [])])
+        digests[slug] = hashlib.md5(payload.encode('utf-8')).hexdigest()[:16]
+    return digests
+
+
+def save_manifest(output_dir, started_at, post_tags, digests):
+    with open(os.path.join(output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as handle:
+        json.dump({'exported_at': started_at.isoformat(), 'posts': post_tags, 'pages': digests}, handle, sort_keys=True)
+
+
+def plan_export(output_dir, incremental=True, digests=None):
+    """
+    Return (paths, stale_paths) to render and delete.
+
+    An incremental run re-renders changed posts, the listings, and the
+    tags changed or removed posts carry now or carried at the last
+    export; a full run renders every public page. A post also counts as
+    changed when its comments or related posts list differ from the last
+    export (see ``page_digests``), or when a post it lists as related
+    changed.
+    """
+    published = Post.objects.filter(status='published')
+    manifest = load_manifest(output_dir) if incremental else None
+    current_slugs = set(published.values_list('slug', flat=True))
+
+    if manifest is None:
+        return listing_paths() + tag_paths() + post_paths(published), []
+
+    since = parse_datetime(manifest['exported_at'])
+    changed = Post.objects.filter(updated_at__gt=since)
+    removed_slugs = set(manifest['posts']) - current_slugs
+    tag_ids = set(Post.tags.through.objects.filter(post__in=changed).values_list('tag_id', flat=True))
+    # Tag pages the posts were removed from since the last export
+    for slug in removed_slugs.union(changed.values_list('slug', flat=True)):
+        tag_ids.update(manifest['posts'].get(slug, ()))
+
+    digests = page_digests() if digests is None else digests
+    # Related lists show the other posts' titles, so their pages change with them
+    linked = RelatedPost.objects.filter(related__in=changed).values_list('post__slug', flat=True)
+    dirty = {slug for slug, digest in digests.items() if manifest['pages'].get(slug) != digest} | set(linked)
+    pages = published.filter(pk__in=changed.values('pk')) | published.filter(slug__in=dirty)
+
+    paths = listing_paths() + tag_paths(tag_ids) + post_paths(pages)
+    stale = [reverse('blog:post_detail', kwargs={'slug': slug}) for slug in removed_slugs]
+    stale += [
+        reverse('blog:post_detail', kwargs={'slug': slug})
+        for slug in changed.exclude(status='published').values_list('slug', flat=True)
+    ]
+    return paths, stale
+
+
+def export_site(output_dir, workers=None, incremental=True, base_url=None):
+    """
+    Export the public site into ``output_dir``; return a summary dict.
+
+    Raises ExportFailed if any page does not render, after writing the
+    rest; the manifest is then left as it was so the next incremental
+    run retries them.
+    """
+    started_at = timezone.now()
+    # Taken before rendering, like started_at, so changes made meanwhile are picked up next time
+    digests = page_digests()
+    os.makedirs(output_dir, exist_ok=True)
+    paths, stale = plan_export(output_dir, incremental, digests)
+
+    for path in stale:
+        destination = output_file(output_dir, path)
+        if os.path.exists(destination):
+            os.remove(destination)
+
+    written, failed, assets = render_in_pool(paths, output_dir, workers or os.cpu_count() or 1,
+                                             base_url or default_base_url())
+    copied = copy_assets(assets, output_dir)
+    if failed:
+        raise ExportFailed(failed)
+    save_manifest(output_dir, started_at, published_tags(), digests)
+    return {'written': written, 'removed': len(stale), 'assets': copied}
@@ -1,15 +1,35 @@
 from django import template
+from django.template import engines
+from django.template.utils import InvalidTemplateEngineError
+from django.utils.safestring import mark_safe
 from django.contrib.auth.models import User
 from blog.models import Tag
+from account.avatars import avatar_url as get_avatar_url
 import hashlib
+from functools import lru_cache
 
 register = template.Library()
 
 @register.filter
+@lru_cache(maxsize=4096)
 def md5(email):
     """Generate MD5 hash for Gravatar"""
     return hashlib.md5(email.lower().encode('utf-8')).hexdigest()
 
+@register.filter
+def avatar_url(user):
+    """Locally served avatar URL for a user"""
+    return get_avatar_url(user)
+
+@register.simple_tag
+def post_cards(listing, posts, **extra):
+    """Render a listing's post cards, with Jinja2 when that engine is configured"""
+    try:
+        engine = engines['jinja2']
+    except InvalidTemplateEngineError:
+        engine = engines['django']
+    return mark_safe(engine.get_template(f'blog/cards/{listing}.html').render({'posts': posts, **extra}))
+
 @register.simple_tag
 def get_all_tags():
     """Get all tags for dropdown"""
@@ -1,3 +1,713 @@
-from django.test import TestCase
+import re
+import shutil
+import tempfile
+from html.parser import HTMLParser
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from datetime import date, datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from markdownx.utils import markdownify
+
+try:
+    import bleach
+except ImportError:
+    bleach = None
+
+from blog_app.ratelimit import check_rate, client_ip, get_rate_limit_cache
+from blog_app.slugs import BulkSlugAllocator, allocate_slug
+
+from .analytics import event_buffer, rollup_events
+from .bulk_io import PostImporter
+from .embeds import postprocess_html
+from .feeds import get_cached_feed
+from .markdown_blocks import block_cache, render_markdown, split_blocks
+from .models import Comment, Follow, Notification, Post, PostDailyStats, PostViewBucket, RelatedPost, Tag, TimelineEntry, ViewEvent
+from .related import SimilarityIndex, rebuild_all, update_posts
+from .rendering import SanitizerPolicy, get_policy
+from .static_export import page_digests, plan_export, published_tags, save_manifest
+from .trending import current_hour, recompute_scores
+from .timeline import decode_cursor, encode_cursor, popular_sources, timeline_page
+
+
+class BlockRenderingTests(SimpleTestCase):
+    """Block-by-block rendering must match rendering the whole document"""
+
+    def setUp(self):
+        block_cache.clear()
+
+    def assertMatchesWholeDocument(self, text):
+        expected = postprocess_html(get_policy().clean(markdownify(text)))
+        # Blocks are joined with a newline; only whitespace between elements may differ
+        self.assertHTMLEqual(render_markdown(text)[0], expected)
+        # Again from the block cache
+        self.assertHTMLEqual(render_markdown(text)[0], expected)
+
+    def test_independent_blocks(self):
+        text = '# Title\n\nA *paragraph*.\n\n- one\n- two\n\n```python\nprint(1)\n\nprint(2)\n```\n\n> quote'
+        self.assertEqual(len(split_blocks(text)), 5)
+        self.assertMatchesWholeDocument(text)
+
+    def test_definition_list(self):
+        text = 'Intro\n\nTerm\n\n:   Definition\n\nOutro'
+        self.assertEqual(split_blocks(text), [text])
+        self.assertMatchesWholeDocument(text)
+
+    def test_markdown_in_html_block(self):
+        text = 'Intro\n\n<div markdown="1">\n*inside*\n\nmore\n</div>\n\nOutro'
+        self.assertEqual(split_blocks(text), [text])
+        self.assertMatchesWholeDocument(text)
+
+    def test_raw_html_blocks_and_comments(self):
+        for text in ('<!--\n\ncomment\n\n-->\n\ntext',
+                     'Intro <!-- a\n\nlong note -->\n\nOutro',
+                     '<div>\n\nHello **x**\n\n</div>\n\nOutro',
+                     'Intro\n\n<table>\n<tr><td>cell</td></tr>\n\n</table>'):
+            with self.subTest(text=text):
+                self.assertEqual(split_blocks(text), [text])
+                self.assertMatchesWholeDocument(text)
+        self.assertHTMLEqual(render_markdown('<!--\n\ncomment\n\n-->\n\ntext')[0], '<p>text</p>')
+
+    def test_repeated_heading_ids(self):
+        text = '# Intro\n\ntext\n\n# Intro\n\n## Intro\n\n# Intro\n\n## Other'
+        self.assertGreater(len(split_blocks(text)), 1)
+        self.assertMatchesWholeDocument(text)
+        self.assertIn('id="intro_3"', render_markdown(text)[0])
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'ratelimit-tests'}},
+    RATE_LIMIT_ENABLED=True,
+    RATE_LIMITS={
+        'sliding': {'anon': '3/m', 'algorithm': 'sliding'},
+        'bucket': {'anon': '4/m', 'algorithm': 'token_bucket'},
+    },
+)
+class CheckRateTests(SimpleTestCase):
+    def setUp(self):
+        get_rate_limit_cache().clear()
+        self.request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.1')
+        self.request.user = AnonymousUser()
+
+    def hits(self, scope, now, count):
+        return [check_rate(scope, self.request, now=now) for _ in range(count)]
+
+    def test_sliding_window(self):
+        start = 6000.0  # the start of a one-minute window
+        self.assertEqual(self.hits('sliding', start, 3), [(True, 0)] * 3)
+        allowed, retry_after = check_rate('sliding', self.request, now=start + 10)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 50)
+        # Halfway through the next window half of the previous count still applies
+        self.assertEqual([allowed for allowed, _ in self.hits('sliding', start + 90, 2)], [True, False])
+        self.assertTrue(check_rate('sliding', self.request, now=start + 180)[0])
+
+    def test_token_bucket_refills(self):
+        start = 6000.0
+        self.assertEqual(self.hits('bucket', start, 4), [(True, 0)] * 4)
+        self.assertEqual(check_rate('bucket', self.request, now=start), (False, 15))
+        # One token every 15 seconds
+        self.assertTrue(check_rate('bucket', self.request, now=start + 15)[0])
+        self.assertFalse(check_rate('bucket', self.request, now=start + 16)[0])
+
+    def test_clients_are_counted_separately(self):
+        self.hits('sliding', 6000.0, 3)
+        other = RequestFactory().post('/', REMOTE_ADDR='10.0.0.2')
+        other.user = AnonymousUser()
+        self.assertTrue(check_rate('sliding', other, now=6000.0)[0])
+
+    def test_forged_forwarded_addresses_get_no_fresh_bucket(self):
+        def request(forwarded):
+            request = RequestFactory().post('/', REMOTE_ADDR='10.0.0.254', HTTP_X_FORWARDED_FOR=forwarded)
+            request.user = AnonymousUser()
+            return request
+
+        with self.settings(RATE_LIMIT_TRUSTED_PROXIES=1):
+            allowed = [check_rate('sliding', request(f'198.51.100.{index}, 203.0.113.7'), now=6000.0)[0]
+                       for index in range(5)]
+        self.assertEqual(allowed, [True, True, True, False, False])
+
+    def test_client_ip_counts_trusted_proxies_from_the_right(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.254',
+                                       HTTP_X_FORWARDED_FOR='1.1.1.1, 203.0.113.7, 10.0.0.9')
+        for proxies, expected in ((0, '10.0.0.254'), (1, '10.0.0.9'), (2, '203.0.113.7'), (5, '1.1.1.1')):
+            with self.subTest(proxies=proxies), self.settings(RATE_LIMIT_TRUSTED_PROXIES=proxies):
+                self.assertEqual(client_ip(request), expected)
+
+    def test_unlimited(self):
+        self.assertEqual(check_rate('unknown', self.request), (True, 0))
+        self.request.user = User(pk=1)
+        # No 'user' rate is configured for this scope
+        self.assertEqual(self.hits('sliding', 6000.0, 5), [(True, 0)] * 5)
+
+
+def _url_attributes(html):
+    """href and src values of ``html`` with entities decoded, as a browser sees them"""
+    values = []
+
+    class Collector(HTMLParser):
+        def handle_starttag(self, tag, attrs):
+            values.extend(value or '' for name, value in attrs if name in ('href', 'src'))
+
+    Collector(convert_charrefs=True).feed(html)
+    return values
+
+
+def _policy(backend):
+    args = (settings.BLEACH_ALLOWED_TAGS, settings.BLEACH_ALLOWED_ATTRIBUTES)
+    if backend == 'html.parser':
+        with mock.patch.object(SanitizerPolicy, '_build_bleach_cleaner', return_value=None):
+            return SanitizerPolicy(*args)
+    return SanitizerPolicy(*args)
+
+
+class SanitizerTestsMixin:
+    """What both sanitizer backends must guarantee for post bodies"""
+    backend = None
+
+    def setUp(self):
+        self.policy = _policy(self.backend)
+        self.assertEqual(self.policy.backend, self.backend)
+
+    def clean(self, html):
+        return self.policy.clean(html)
+
+    def test_script_urls_are_removed(self):
+        for url in [
+            'javascript:alert(1)',
+            'JaVaScRiPt:alert(1)',
+            ' javascript:alert(1)',
+            'java&#x09;script:alert(1)',
+            'java\nscript:alert(1)',
+            '&#106;avascript:alert(1)',
+            '&#x6A;&#x61;vascript:alert(1)',
+            'javascript&colon;alert(1)',
+            'vbscript:msgbox(1)',
+            'data:text/html,<script>alert(1)</script>',
+        ]:
+            with self.subTest(url=url):
+                output = self.clean(f'<a href="{url}">link</a><img src="{url}" alt="x">')
+                # Either dropped or escaped into a harmless relative URL, as the browser would decode it
+                for value in _url_attributes(output):
+                    self.assertNotRegex(re.sub(r'[\x00-\x20]', '', value).lower(), r'^(javascript|vbscript|data):')
+                self.assertIn('link</a>', output)
+
+    def test_safe_urls_are_kept(self):
+        html = '<a href="https://example.com/a?b=1&amp;c=2">a</a><a href="/post/x/">b</a><a href="mailto:a@b.c">c</a>'
+        self.assertHTMLEqual(self.clean(html), html)
+
+    def test_event_handlers_and_unknown_attributes_are_removed(self):
+        self.assertHTMLEqual(self.clean('<img src="/a.png" onerror="alert(1)">'), '<img src="/a.png">')
+        self.assertHTMLEqual(self.clean('<p class="c" onclick="x()" style="color:red" ONMOUSEOVER="y()">t</p>'),
+                             '<p class="c">t</p>')
+
+    def test_attribute_values_cannot_break_out(self):
+        self.assertHTMLEqual(self.clean('<a href="/" title=\'a" onclick="x()\'>t</a>'),
+                             '<a href="/" title="a&quot; onclick=&quot;x()">t</a>')
+
+    def test_script_and_style_elements_are_removed(self):
+        for html in ['<script>alert(1)</script>', '<SCRIPT SRC="//evil/x.js"></SCRIPT>', '<style>p{}</style>',
+                     '<scr<script>ipt>alert(1)</script>', '<svg onload="alert(1)"><script>x</script></svg>']:
+            with self.subTest(html=html):
+                output = self.clean(html + '<p>after</p>').lower()
+                self.assertNotIn('<script', output)
+                self.assertNotIn('<style', output)
+                self.assertNotIn('<svg', output)
+                self.assertIn('<p>after</p>', output)
+
+    def test_comments_are_removed(self):
+        self.assertHTMLEqual(self.clean('<!-- hidden --><p>x</p><!--[if IE]><script>y</script><![endif]-->'),
+                             '<p>x</p>')
+
+    def test_text_is_escaped(self):
+        self.assertEqual(self.clean('1 < 2 & <b>3</b>'), '1 &lt; 2 &amp; <b>3</b>')
+
+    def test_unclosed_tags_are_balanced(self):
+        self.assertEqual(self.clean('<p><strong>bold'), '<p><strong>bold</strong></p>')
+        self.assertEqual(self.clean('<ul><li>a</ul><p>b'), '<ul><li>a</li></ul><p>b</p>')
+        self.assertEqual(self.clean('</div><p>x</p></span>'), '<p>x</p>')
+        self.assertEqual(self.clean('<div><p>x</div><p>y'), '<div><p>x</p></div><p>y</p>')
+
+
+class HTMLParserSanitizerTests(SanitizerTestsMixin, SimpleTestCase):
+    backend = 'html.parser'
+
+    def test_dropped_element_content_is_removed(self):
+        self.assertEqual(self.clean('<script>alert(1)</script><style>p{}</style><p>ok</p>'), '<p>ok</p>')
+
+
+@skipUnless(bleach, 'bleach is not installed')
+class BleachSanitizerTests(SanitizerTestsMixin, SimpleTestCase):
+    backend = 'bleach'
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'timeline-tests'}},
+    TIMELINE={'PAGE_SIZE': 3, 'POPULAR_FOLLOWERS': 2, 'POPULAR_CACHE_SECONDS': 60},
+)
+class TimelinePageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader')
+        cls.other_reader = User.objects.create_user('other-reader')
+        cls.author = User.objects.create_user('author')
+        cls.popular = User.objects.create_user('popular')
+        Follow.objects.create(follower=cls.reader, author=cls.author)
+        Follow.objects.create(follower=cls.reader, author=cls.popular)
+        Follow.objects.create(follower=cls.other_reader, author=cls.popular)
+
+        start = timezone.now() - timedelta(days=1)
+        # Pairs of posts share a timestamp, so pages have to break ties on the post id
+        times = [start + timedelta(minutes=index // 2) for index in range(8)]
+        cls.fanned_out = cls.make_posts(cls.author, times)
+        cls.pulled = cls.make_posts(cls.popular, [start + timedelta(seconds=30 + 60 * index) for index in range(3)])
+        TimelineEntry.objects.bulk_create([TimelineEntry(user=cls.reader, post=post, created_at=post.created_at)
+                                           for post in cls.fanned_out])
+        # Unpublished after fan-out: its entry stays but it is not shown
+        Post.objects.filter(pk=cls.fanned_out[0].pk).update(status='draft')
+
+    @classmethod
+    def make_posts(cls, author, times):
+        first = Post.objects.count()
+        posts = Post.objects.bulk_create([
+            Post(title=f'{author.username} {index}', slug=f'post-{first + index}', author=author,
+                 body='Body', body_html='<p>Body</p>', excerpt='Body', status='published')
+            for index in range(len(times))
+        ])
+        for post, created_at in zip(posts, times):
+            Post.objects.filter(pk=post.pk).update(created_at=created_at)
+            post.created_at = created_at
+        return posts
+
+    def setUp(self):
+        cache.clear()
+
+    def read_all(self, user):
+        posts, cursor, pages = [], None, 0
+        while True:
+            page, cursor = timeline_page(user, cursor)
+            self.assertLessEqual(len(page), 3)
+            posts += page
+            pages += 1
+            if cursor is None:
+                return posts, pages
+
+    def test_pages_cover_every_post_once_newest_first(self):
+        posts, pages = self.read_all(self.reader)
+        expected = sorted(self.fanned_out[1:] + self.pulled, key=lambda post: (post.created_at, post.pk), reverse=True)
+        self.assertEqual([post.pk for post in posts], [post.pk for post in expected])
+        self.assertEqual(pages, 4)
+
+    def test_cursor_round_trip(self):
+        post = self.fanned_out[3]
+        cursor = encode_cursor(post.created_at, post.pk)
+        self.assertEqual(decode_cursor(cursor), (post.created_at, post.pk))
+        for malformed in (None, '', 'abc', '12', '1-x', '9' * 40 + '-1'):
+            with self.subTest(cursor=malformed):
+                self.assertIsNone(decode_cursor(malformed))
+
+    def test_malformed_cursor_starts_from_the_top(self):
+        self.assertEqual(timeline_page(self.reader, 'garbage'), timeline_page(self.reader))
+
+    def test_entries_added_after_the_first_page_do_not_shift_later_pages(self):
+        first, cursor = timeline_page(self.reader)
+        newest = self.make_posts(self.author, [timezone.now()])[0]
+        TimelineEntry.objects.create(user=self.reader, post=newest, created_at=newest.created_at)
+        second, _ = timeline_page(self.reader, cursor)
+        self.assertFalse({post.pk for post in first} & {post.pk for post in second})
+        self.assertNotIn(newest, second)
+        self.assertEqual(timeline_page(self.reader)[0][0], newest)
+
+    def test_popular_authors_are_pulled_without_entries(self):
+        self.assertEqual(popular_sources(), (frozenset([self.popular.pk]), frozenset()))
+        posts, _ = self.read_all(self.other_reader)
+        self.assertEqual([post.pk for post in posts], [post.pk for post in reversed(self.pulled)])
+
+
+@override_settings(ANALYTICS={'ENABLED': True, 'FLUSH_SIZE': 1000, 'FLUSH_SECONDS': 3600, 'ROLLUP_BATCH': 3})
+class RollupEventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        cls.first, cls.second = Post.objects.bulk_create([
+            Post(title=f'Post {index}', slug=f'post-{index}', author=author,
+                 body='Body', body_html='<p>Body</p>', excerpt='Body', status='published')
+            for index in range(2)
+        ])
+
+    def setUp(self):
+        event_buffer.flush()
+
+    def views(self, post, day, visitors, referrer=''):
+        created_at = timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=12))
+        return [ViewEvent(post=post, created_at=created_at, visitor=visitor, referrer=referrer) for visitor in visitors]
+
+    def stats(self, post, day):
+        return PostDailyStats.objects.get(post=post, day=day)
+
+    def test_events_are_folded_into_daily_rows_and_deleted(self):
+        monday, tuesday = date(2026, 3, 2), date(2026, 3, 3)
+        ViewEvent.objects.bulk_create(
+            self.views(self.first, monday, ['a', 'b', 'a'], 'example.com')
+            + self.views(self.first, monday, ['c'])
+            + self.views(self.first, tuesday, ['a'])
+            + self.views(self.second, monday, ['d', 'd'], 'news.example.org')
+        )
+        # Three batches; the first day of the first post spans two of them
+        self.assertEqual(rollup_events(), 7)
+        self.assertFalse(ViewEvent.objects.exists())
+
+        stats = self.stats(self.first, monday)
+        self.assertEqual((stats.views, stats.unique_visitors), (4, 3))
+        self.assertEqual(stats.referrers, {'example.com': 3, '': 1})
+        self.assertEqual((self.stats(self.first, tuesday).views, self.stats(self.first, tuesday).unique_visitors), (1, 1))
+        stats = self.stats(self.second, monday)
+        self.assertEqual((stats.views, stats.unique_visitors), (2, 1))
+        self.assertEqual(stats.referrers, {'news.example.org': 2})
+        self.assertEqual(PostDailyStats.objects.count(), 3)
+
+    def test_later_runs_merge_into_existing_rows(self):
+        monday = date(2026, 3, 2)
+        ViewEvent.objects.bulk_create(self.views(self.first, monday, ['a', 'b'], 'example.com'))
+        rollup_events()
+        ViewEvent.objects.bulk_create(self.views(self.first, monday, ['b', 'c'], 'example.com'))
+        self.assertEqual(rollup_events(), 2)
+        stats = self.stats(self.first, monday)
+        # The visitor seen in both runs is counted once
+        self.assertEqual((stats.views, stats.unique_visitors), (4, 3))
+        self.assertEqual(stats.referrers, {'example.com': 4})
+
+    def test_buffered_events_are_flushed_first(self):
+        monday = date(2026, 3, 2)
+        for event in self.views(self.first, monday, ['a', 'b']):
+            event_buffer.add(event)
+        self.assertEqual(len(event_buffer), 2)
+        self.assertEqual(rollup_events(), 2)
+        self.assertEqual(len(event_buffer), 0)
+        self.assertEqual(self.stats(self.first, monday).views, 2)
+
+    @override_settings(ANALYTICS={'REFERRERS_KEPT': 2, 'ROLLUP_BATCH': 100})
+    def test_only_top_referrers_are_kept(self):
+        monday = date(2026, 3, 2)
+        ViewEvent.objects.bulk_create(
+            self.views(self.first, monday, ['a', 'b', 'c'], 'a.example')
+            + self.views(self.first, monday, ['a', 'b'], 'b.example')
+            + self.views(self.first, monday, ['a'], 'c.example')
+        )
+        rollup_events()
+        self.assertEqual(self.stats(self.first, monday).referrers, {'a.example': 3, 'b.example': 2})
+
+    def test_empty_log(self):
+        self.assertEqual(rollup_events(), 0)
+        self.assertFalse(PostDailyStats.objects.exists())
+
+
+class AllocateSlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.bulk_create([Tag(name=slug, slug=slug) for slug in ('django-2024', 'zeta-7', 'taken', 'taken-3')])
+
+    def test_free_base_is_used_even_when_suffixed_slugs_exist(self):
+        self.assertEqual(allocate_slug(Tag, 'Django'), 'django')
+        self.assertEqual(allocate_slug(Tag, 'Zeta'), 'zeta')
+
+    def test_taken_base_gets_the_next_suffix(self):
+        self.assertEqual(allocate_slug(Tag, 'Taken'), 'taken-4')
+        Tag.objects.create(name='Django', slug='django')
+        self.assertEqual(allocate_slug(Tag, 'Django'), 'django-2025')
+
+    def test_own_slug_is_excluded(self):
+        tag = Tag.objects.get(slug='taken')
+        self.assertEqual(allocate_slug(Tag, 'Taken', exclude_pk=tag.pk), 'taken')
+
+    def test_save_retries_after_losing_a_race(self):
+        # The first allocation returns a slug another writer has just taken
+        with mock.patch('blog_app.slugs.allocate_slug', side_effect=['taken', 'taken-4']) as allocate:
+            tag = Tag.objects.create(name='Taken')
+        self.assertEqual(tag.slug, 'taken-4')
+        self.assertEqual(allocate.call_count, 2)
+        self.assertEqual(Tag.objects.filter(slug='taken').count(), 1)
+
+    def test_other_integrity_errors_are_not_retried(self):
+        with mock.patch('blog_app.slugs.allocate_slug', return_value='fresh') as allocate:
+            with self.assertRaises(IntegrityError):
+                Tag.objects.create(name='zeta-7')
+        self.assertEqual(allocate.call_count, 1)
+
+
+class BulkSlugAllocatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        cls.long_slug = 'x' * 200
+        Post.objects.bulk_create([
+            Post(title=slug, slug=slug, author=author, body='Body', body_html='<p>Body</p>', excerpt='Body')
+            for slug in ('taken', 'taken-3', cls.long_slug)
+        ])
+
+    def setUp(self):
+        self.slugs = BulkSlugAllocator(Post)
+
+    def test_free_valid_slugs_are_kept_as_is(self):
+        for slug in ('y' * 200, 'y' * 195, 'Mixed_Case-slug', 'free'):
+            with self.subTest(slug=slug):
+                self.assertEqual(self.slugs.allocate(slug), slug)
+                self.assertEqual(self.slugs.base(slug), slug)
+
+    def test_invalid_sources_are_slugified(self):
+        self.assertEqual(self.slugs.allocate('Hello World!'), 'hello-world')
+        self.assertEqual(self.slugs.allocate('z' * 201), 'z' * 194)
+
+    def test_taken_slugs_get_the_next_suffix(self):
+        self.slugs.prime(['taken', 'taken', 'free'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.slugs.allocate('taken'), 'taken-4')
+            self.assertEqual(self.slugs.allocate('taken'), 'taken-5')
+            self.assertEqual(self.slugs.allocate('free'), 'free')
+            self.assertEqual(self.slugs.allocate('free'), 'free-2')
+
+    def test_long_slugs_are_only_shortened_for_a_suffix(self):
+        slug = self.slugs.allocate(self.long_slug)
+        self.assertEqual(slug, 'x' * 194 + '-2')
+        self.assertEqual(self.slugs.allocate(self.long_slug), 'x' * 194 + '-3')
+
+    def test_suffixes_skip_slugs_handed_out_in_the_batch(self):
+        self.assertEqual(self.slugs.allocate('free-2'), 'free-2')
+        self.assertEqual(self.slugs.allocate('free'), 'free')
+        self.assertEqual(self.slugs.allocate('free'), 'free-3')
+
+
+class PostImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.python = Tag.objects.create(name='Python', slug='python')
+
+    def record(self, slug, tags):
+        return {'title': slug, 'slug': slug, 'author': 'author', 'body': 'Body', 'status': 'published', 'tags': tags}
+
+    def test_tags_are_matched_by_name_or_slug(self):
+        importer = PostImporter()
+        stats = importer.run([
+            self.record('first', [{'name': 'Python', 'slug': 'python-lang'}, {'name': 'New', 'slug': 'new'}]),
+            self.record('second', [{'name': 'Snake', 'slug': 'python'}, {'name': 'New', 'slug': 'new-alt'}]),
+        ])
+        self.assertEqual(stats['created'], 2)
+        self.assertEqual(stats['tags_created'], 1)
+        new = Tag.objects.get(name='New')
+        self.assertEqual(new.slug, 'new')
+        self.assertEqual(set(Post.objects.get(slug='first').tags.all()), {self.python, new})
+        self.assertEqual(set(Post.objects.get(slug='second').tags.all()), {self.python, new})
+
+    def test_tags_created_counts_only_inserted_rows(self):
+        PostImporter().run([self.record('first', [{'name': 'New', 'slug': 'new'}])])
+        importer = PostImporter()
+        stats = importer.run([self.record('second', [{'name': 'New', 'slug': 'new'}, {'name': 'Python', 'slug': 'py'}])])
+        self.assertEqual(stats['tags_created'], 0)
+        self.assertEqual(Tag.objects.count(), 2)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'feed-tests'}})
+class CachedFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author')
+        cls.tag = Tag.objects.create(name='Python', slug='python')
+        cls.post = Post.objects.create(title='First', slug='first', author=cls.author, body='Body', status='published')
+        cls.post.tags.add(cls.tag)
+
+    def setUp(self):
+        cache.clear()
+
+    def feed(self, kind='site', slug=None):
+        return get_cached_feed('rss', kind, slug, 'http://testserver/feed/rss/', 'http://testserver')
+
+    def test_cached_until_the_database_changes(self):
+        first = self.feed()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.feed(), first)
+        # Written by another worker: this process's cache saw no invalidation
+        Post.objects.filter(pk=self.post.pk).update(title='Renamed', updated_at=timezone.now())
+        second = self.feed()
+        self.assertIn('Renamed', second['content'])
+        self.assertNotEqual(second['etag'], first['etag'])
+        Post.objects.filter(pk=self.post.pk).update(status='draft')
+        self.assertNotIn('Renamed', self.feed()['content'])
+
+    def test_tag_changes_reach_cached_feeds(self):
+        self.assertIn('Python', self.feed()['content'])
+        self.tag.name = 'Snakes'
+        self.tag.save()
+        self.assertIn('Snakes', self.feed()['content'])
+        other = Tag.objects.create(name='Other', slug='other')
+        other.posts.add(self.post)
+        self.assertIn('Other', self.feed()['content'])
+        self.post.tags.remove(other)
+        self.assertNotIn('Other', self.feed()['content'])
+        self.assertIn('First', self.feed('tag', 'python')['content'])
+
+
+class StaticExportPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user('reader')
+        author = User.objects.create_user('author')
+        cls.first, cls.second, cls.third = Post.objects.bulk_create([
+            Post(title=f'Post {index}', slug=f'post-{index}', author=author,
+                 body='Body', body_html='<p>Body</p>', excerpt='Body', status='published')
+            for index in range(3)
+        ])
+        cls.held = Comment.objects.create(post=cls.second, author=cls.reader, content='Held', is_approved=False)
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir, ignore_errors=True)
+        save_manifest(self.output_dir, timezone.now(), published_tags(), page_digests())
+
+    def planned_posts(self):
+        paths, _ = plan_export(self.output_dir)
+        return {post for post in (self.first, self.second, self.third) if post.get_absolute_url() in paths}
+
+    def test_unchanged_posts_are_not_rendered(self):
+        self.assertEqual(self.planned_posts(), set())
+
+    def test_new_and_approved_comments_mark_the_post_changed(self):
+        Comment.objects.create(post=self.first, author=self.reader, content='New')
+        Comment.objects.filter(pk=self.held.pk).update(is_approved=True)
+        self.assertEqual(self.planned_posts(), {self.first, self.second})
+
+    def test_related_list_changes_mark_the_post_changed(self):
+        RelatedPost.objects.create(post=self.third, related=self.first, score=0.5, rank=0)
+        self.assertEqual(self.planned_posts(), {self.third})
+
+    def test_pages_listing_a_changed_post_as_related_are_rendered(self):
+        RelatedPost.objects.create(post=self.third, related=self.first, score=0.5, rank=0)
+        save_manifest(self.output_dir, timezone.now(), published_tags(), page_digests())
+        Post.objects.filter(pk=self.first.pk).update(title='Renamed', updated_at=timezone.now() + timedelta(seconds=1))
+        self.assertEqual(self.planned_posts(), {self.first, self.third})
+
+
+class RecomputeScoresTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        cls.posts = Post.objects.bulk_create([
+            Post(title=f'Post {index}', slug=f'post-{index}', author=author,
+                 body='Body', body_html='<p>Body</p>', excerpt='Body', status='published')
+            for index in range(7)
+        ])
+        # Ranked at the last run but not viewed since
+        Post.objects.filter(pk__in=[post.pk for post in cls.posts[5:]]).update(trending_score=3.0, weekly_views=3)
+
+    def test_scores_are_written_in_bounded_batches(self):
+        now = timezone.now()
+        hour = current_hour(now)
+        PostViewBucket.objects.bulk_create([PostViewBucket(post=post, hour=hour, views=index + 1)
+                                            for index, post in enumerate(self.posts[:5])])
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(recompute_scores(now=now, batch_size=2), 7)
+        in_lists = [re.findall(r' IN \(([^()]*)\)', query['sql']) for query in captured]
+        self.assertEqual(max(len(values.split(',')) for lists in in_lists for values in lists), 2)
+        weekly = dict(Post.objects.values_list('pk', 'weekly_views'))
+        self.assertEqual([weekly[post.pk] for post in self.posts], [1, 2, 3, 4, 5, 0, 0])
+        self.assertFalse(Post.objects.filter(pk__in=[post.pk for post in self.posts[5:]], trending_score__gt=0).exists())
+        self.assertEqual(recompute_scores(now=now, batch_size=2), 0)
+
+
+class UpdateRelatedPostsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user('author')
+        topics = ['python django testing', 'python django models', 'gardening tomatoes soil',
+                  'gardening roses soil', 'cooking pasta sauce', 'cooking pasta dough']
+        cls.posts = Post.objects.bulk_create([
+            Post(title=topic.title(), slug=f'post-{index}', author=author, body=f'{topic}.',
+                 body_html='', excerpt='', status='published')
+            for index, topic in enumerate(topics)
+        ])
+
+    def setUp(self):
+        rebuild_all()
+
+    def related(self):
+        lists = {post.pk: [] for post in self.posts}
+        for post_id, related_id in RelatedPost.objects.order_by('post_id', 'rank').values_list('post_id', 'related_id'):
+            lists[post_id].append(related_id)
+        return lists
+
+    def assert_matches_rebuild(self):
+        incremental = self.related()
+        rebuild_all()
+        self.assertEqual(incremental, self.related())
+
+    def test_edits_patch_the_index_instead_of_rebuilding_it(self):
+        Post.objects.filter(pk=self.posts[4].pk).update(body='python django views.',
+                                                        updated_at=timezone.now())
+        with mock.patch.object(SimilarityIndex, 'build', side_effect=AssertionError('full build')):
+            update_posts([self.posts[4].pk])
+        self.assertIn(self.posts[4].pk, self.related()[self.posts[0].pk])
+        self.assert_matches_rebuild()
+
+    def test_posts_saved_elsewhere_and_unpublished_posts_are_picked_up(self):
+        # Saved by another process: only the timestamp tells this one's index
+        Post.objects.filter(pk=self.posts[3].pk).update(title='Cooking Pasta', updated_at=timezone.now())
+        Post.objects.filter(pk=self.posts[5].pk).update(status='draft', updated_at=timezone.now())
+        with mock.patch.object(SimilarityIndex, 'build', side_effect=AssertionError('full build')):
+            update_posts([self.posts[5].pk])
+        self.assertEqual(self.related()[self.posts[5].pk], [])
+        self.assertNotIn(self.posts[5].pk, self.related()[self.posts[4].pk])
+        self.assert_matches_rebuild()
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'fan-out-tests'}},
+    TIMELINE={'ASYNC': False},
+    NOTIFICATIONS={'INLINE_LIMIT': 0},
+    RELATED_POSTS={'ASYNC': False},
+)
+class FanOutOnTagsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('author', email='author@example.com')
+        cls.python, cls.django = Tag.objects.create(name='Python'), Tag.objects.create(name='Django')
+        cls.followers = {}
+        for name, target in (('of-author', {'author': cls.author}), ('of-python', {'tag': cls.python}),
+                             ('of-django', {'tag': cls.django})):
+            cls.followers[name] = User.objects.create_user(name, email=f'{name}@example.com')
+            Follow.objects.create(follower=cls.followers[name], **target)
+
+    def setUp(self):
+        cache.clear()
+
+    def reached(self):
+        timeline = TimelineEntry.objects.filter(post=self.post).values_list('user__username', flat=True)
+        notified = Notification.objects.filter(post=self.post, kind='new_post').values_list('user__username', flat=True)
+        return sorted(timeline), sorted(notified)
+
+    def test_tag_edits_reach_only_new_followers_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = Post.objects.create(title='Post', slug='post', author=self.author, body='Body', status='published')
+            self.post.tags.add(self.python)
+        first = ['of-author', 'of-python']
+        self.assertEqual(self.reached(), (first, first))
+
+        with mock.patch('blog.signals.fan_out_worker.submit') as submit:
+            self.post.tags.add(self.python)
+        submit.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.remove(self.python)
+            self.post.tags.add(self.python, self.django)
+        everyone = ['of-author', 'of-django', 'of-python']
+        self.assertEqual(self.reached(), (everyone, everyone))
+        with mock.patch('blog.notifications._send_inline') as send_inline, self.captureOnCommitCallbacks(execute=True):
+            self.post.tags.remove(self.django)
+            self.post.tags.add(self.django)
+        send_inline.assert_not_called()
+        self.assertEqual(Notification.objects.filter(post=self.post).count(), 3)
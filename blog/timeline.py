@@ -0,0 +1,229 @@
+"""
+Personal timelines: posts from the authors and tags a user follows.
+
+Timelines are materialized. When a post is published, its id is written
+into ``TimelineEntry`` for every follower of its author and tags, in
+batched inserts on a background thread, so reading a timeline is a
+single index range scan instead of a join over posts, tags and follows.
+
+Authors and tags with at least POPULAR_FOLLOWERS followers are not
+fanned out: writing one row per follower would make each of their posts
+expensive. Their posts are pulled at read time instead and merged with
+the materialized rows (fan-out on read).
+
+Pages use keyset pagination on ``(created_at, post_id)``; the cursor is
+the last entry of the previous page, so deep pages cost the same as the
+first one.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+POPULAR_CACHE_KEY = 'blog:timeline:popular'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def get_timeline_settings():
+    config = getattr(settings, 'TIMELINE', {})
+    return {
+        'BATCH_SIZE': config.get('BATCH_SIZE', 1000),
+        'POPULAR_FOLLOWERS': config.get('POPULAR_FOLLOWERS', 5000),
+        'POPULAR_CACHE_SECONDS': config.get('POPULAR_CACHE_SECONDS', 300),
+        'BACKFILL': config.get('BACKFILL', 50),
+        'PAGE_SIZE': config.get('PAGE_SIZE', 12),
+        'ASYNC': config.get('ASYNC', True),
+        'MAX_WORKERS': config.get('MAX_WORKERS', 2),
+    }
+
+
+def popular_sources():
+    """(author_ids, tag_ids) with enough followers to be pulled on read"""
+    sources = cache.get(POPULAR_CACHE_KEY)
+    if sources is None:
+        config = get_timeline_settings()
+        threshold = config['POPULAR_FOLLOWERS']
+        authors = (Follow.objects.filter(author__isnull=False).values('author')
+                   .annotate(total=Count('id')).filter(total__gte=threshold).values_list('author', flat=True))
+        tags = (Follow.objects.filter(tag__isnull=False).values('tag')
+                .annotate(total=Count('id')).filter(total__gte=threshold).values_list('tag', flat=True))
+        sources = (frozenset(authors), frozenset(tags))
+        cache.set(POPULAR_CACHE_KEY, sources, config['POPULAR_CACHE_SECONDS'])
+    return sources
+
+
+def _insert(user_ids, post, batch_size):
+    entries = [TimelineEntry(user_id=user_id, post_id=post.pk, created_at=post.created_at) for user_id in user_ids]
+    TimelineEntry.objects.bulk_create(entries, batch_size=batch_size, ignore_conflicts=True)
+    return len(entries)
+
+
+def fan_out_post(post_id, tag_ids=None):
+    """
+    Write a published post into its followers' timelines; return rows written.
+
+    With ``tag_ids`` only followers of those tags are reached (tags added
+    after publishing). Users who already have the post are skipped.
+    """
+    post = Post.objects.filter(pk=post_id, status='published').only('pk', 'author_id', 'created_at').first()
+    if post is None:
+        return 0
+    config = get_timeline_settings()
+    popular_authors, popular_tags = popular_sources()
+
+    tags = post.tags.all() if tag_ids is None else post.tags.filter(pk__in=tag_ids)
+    sources = Q(tag__in=tags.exclude(pk__in=popular_tags).values('pk'))
+    if tag_ids is None and post.author_id not in popular_authors:
+        sources |= Q(author_id=post.author_id)
+    followers = (Follow.objects.filter(sources).exclude(follower_id=post.author_id)
+                 .exclude(follower_id__in=TimelineEntry.objects.filter(post_id=post.pk).values('user_id'))
+                 .values_list('follower_id', flat=True).distinct().order_by('follower_id'))
+
+    written, batch = 0, []
+    for user_id in followers.iterator(chunk_size=config['BATCH_SIZE']):
+        batch.append(user_id)
+        if len(batch) >= config['BATCH_SIZE']:
+            written += _insert(batch, post, config['BATCH_SIZE'])
+            batch = []
+    if batch:
+        written += _insert(batch, post, config['BATCH_SIZE'])
+    return written
+
+
+def retract_post(post_id):
+    """Remove an unpublished post from every timeline"""
+    return TimelineEntry.objects.filter(post_id=post_id).delete()[0]
+
+
+class FanOutWorker:
+    """Runs fan-out tasks on a small thread pool once the triggering transaction commits"""
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='blog-fan-out')
+        return self._executor
+
+    def submit(self, func, object_id, *args):
+        if not get_timeline_settings()['ASYNC']:
+            transaction.on_commit(lambda: func(object_id, *args))
+            return
+        transaction.on_commit(lambda: self._get_executor().submit(self._run, func, object_id, *args))
+
+    def _run(self, func, object_id, *args):
+        close_old_connections()
+        try:
+            func(object_id, *args)
+        except Exception:
+            logger.exception('Fan-out task %s(%s) failed', func.__name__, object_id)
+        finally:
+            close_old_connections()
+
+
+fan_out_worker = FanOutWorker(get_timeline_settings()['MAX_WORKERS'])
+
+
+def _source_posts(author_id=None, tag_id=None):
+    posts = Post.objects.filter(status='published')
+    return posts.filter(author_id=author_id) if author_id else posts.filter(tags=tag_id)
+
+
+def follow(user, author=None, tag=None):
+    """Follow an author or tag and backfill its recent posts; return the Follow"""
+    lookup = {'author': author} if author is not None else {'tag': tag}
+    follow_obj, created = Follow.objects.get_or_create(follower=user, **lookup)
+    if created:
+        popular_authors, popular_tags = popular_sources()
+        if (author is not None and author.pk not in popular_authors) or (tag is not None and tag.pk not in popular_tags):
+            recent = (_source_posts(getattr(author, 'pk', None), getattr(tag, 'pk', None))
+                      .exclude(author=user).order_by('-created_at')
+                      .values_list('pk', 'created_at')[:get_timeline_settings()['BACKFILL']])
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(user=user, post_id=post_id, created_at=created_at) for post_id, created_at in recent],
+                ignore_conflicts=True,
+            )
+    return follow_obj
+
+
+def unfollow(user, author=None, tag=None):
+    """Stop following and drop entries no other follow still explains"""
+    lookup = {'author': author} if author is not None else {'tag': tag}
+    if not Follow.objects.filter(follower=user, **lookup).delete()[0]:
+        return False
+    kept = Follow.objects.filter(follower=user)
+    followed_authors = kept.filter(author__isnull=False).values('author')
+    followed_tags = kept.filter(tag__isnull=False).values('tag')
+    entries = TimelineEntry.objects.filter(user=user)
+    entries = entries.filter(post__author=author) if author is not None else entries.filter(post__tags=tag)
+    (entries.exclude(post__author__in=followed_authors)
+     .exclude(post__tags__in=followed_tags)
+     .delete())
+    return True
+
+
+def encode_cursor(created_at, post_id):
+    # Integer microseconds, so the cursor compares equal to the stored value
+    return f'{(created_at - EPOCH) // timedelta(microseconds=1)}-{post_id}'
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; None for a missing or malformed cursor"""
+    try:
+        micros, post_id = (int(part) for part in cursor.split('-', 1))
+        return EPOCH + timedelta(microseconds=micros), post_id
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def _before(cursor, time_field, id_field):
+    if cursor is None:
+        return Q()
+    created_at, post_id = cursor
+    return Q(**{f'{time_field}__lt': created_at}) | Q(**{time_field: created_at, f'{id_field}__lt': post_id})
+
+
+def timeline_page(user, cursor=None, limit=None):
+    """
+    One page of ``user``'s timeline, newest first.
+
+    Returns (posts, next_cursor); next_cursor is None on the last page.
+    """
+    limit = limit or get_timeline_settings()['PAGE_SIZE']
+    cursor = decode_cursor(cursor) if isinstance(cursor, str) else cursor
+
+    rows = list(TimelineEntry.objects.filter(user=user).filter(_before(cursor, 'created_at', 'post_id'))
+                .order_by('-created_at', '-post_id').values_list('created_at', 'post_id')[:limit + 1])
+
+    popular_authors, popular_tags = popular_sources()
+    follows = Follow.objects.filter(follower=user)
+    pulled_authors = list(follows.filter(author__in=popular_authors).values_list('author', flat=True)) if popular_authors else []
+    pulled_tags = list(follows.filter(tag__in=popular_tags).values_list('tag', flat=True)) if popular_tags else []
+    if pulled_authors or pulled_tags:
+        pulled = (Post.objects.filter(status='published')
+                  .filter(Q(author__in=pulled_authors) | Q(tags__in=pulled_tags))
+                  .exclude(author=user)
+                  .filter(_before(cursor, 'created_at', 'pk'))
+                  .order_by('-created_at', '-pk').values_list('created_at', 'pk').distinct()[:limit + 1])
+        rows = sorted(set(rows) | set(pulled), reverse=True)
+
+    page, more = rows[:limit], len(rows) > limit
+    posts_by_id = (Post.objects.filter(pk__in=[post_id for _, post_id in page], status='published')
+                   .select_related('author').prefetch_related('tags').in_bulk())
+    posts = [posts_by_id[post_id] for _, post_id in page if post_id in posts_by_id]
+    next_cursor = encode_cursor(*page[-1]) if more and page else None
+    return posts, next_cursor
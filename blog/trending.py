@@ -0,0 +1,109 @@
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Post, PostViewBucket
+
+
+def get_trending_settings():
+    config = getattr(settings, 'TRENDING', {})
+    return {
+        'HALF_LIFE_HOURS': config.get('HALF_LIFE_HOURS', 24),
+        'WINDOW_DAYS': config.get('WINDOW_DAYS', 7),
+        'RETENTION_DAYS': config.get('RETENTION_DAYS', 30),
+    }
+
+
+def current_hour(now=None):
+    return (now or timezone.now()).replace(minute=0, second=0, microsecond=0)
+
+
+def record_view(post_id, now=None):
+    """Add one view to the post's bucket for the current hour"""
+    hour = current_hour(now)
+    updated = PostViewBucket.objects.filter(post_id=post_id, hour=hour).update(views=F('views') + 1)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            PostViewBucket.objects.create(post_id=post_id, hour=hour, views=1)
+    except IntegrityError:
+        # Another request created the bucket first
+        PostViewBucket.objects.filter(post_id=post_id, hour=hour).update(views=F('views') + 1)
+
+
+def decay_weight(age_hours, half_life_hours):
+    return math.pow(0.5, age_hours / half_life_hours)
+
+
+def recompute_scores(now=None, batch_size=500):
+    """
+    Recompute ``trending_score`` and ``weekly_views`` from recent buckets.
+
+    Returns the number of posts whose ranking columns changed.
+    """
+    config = get_trending_settings()
+    now = now or timezone.now()
+    window_start = current_hour(now) - timedelta(days=config['WINDOW_DAYS'])
+
+    scores = defaultdict(float)
+    weekly = defaultdict(int)
+    buckets = PostViewBucket.objects.filter(hour__gte=window_start).values_list('post_id', 'hour', 'views')
+    for post_id, hour, views in buckets.iterator(chunk_size=2000):
+        age_hours = max((now - hour).total_seconds() / 3600, 0)
+        scores[post_id] += views * decay_weight(age_hours, config['HALF_LIFE_HOURS'])
+        weekly[post_id] += views
+
+    def update(posts):
+        changed = []
+        for post in posts:
+            score = round(scores.get(post.pk, 0.0), 4)
+            week = weekly.get(post.pk, 0)
+            if post.trending_score != score or post.weekly_views != week:
+                post.trending_score = score
+                post.weekly_views = week
+                changed.append(post)
+        Post.objects.bulk_update(changed, ['trending_score', 'weekly_views'], batch_size=batch_size)
+        return len(changed)
+
+    fields = ('id', 'trending_score', 'weekly_views')
+    updated = 0
+    # Posts with fresh views, batch_size ids per query so the IN list stays bounded
+    post_ids = sorted(scores)
+    for start in range(0, len(post_ids), batch_size):
+        updated += update(Post.objects.filter(pk__in=post_ids[start:start + batch_size]).only(*fields))
+    # Previously ranked posts without fresh views drop back to zero; paged by id
+    # rather than streamed, as the rows being read are also being updated
+    ranked = Post.objects.filter(Q(trending_score__gt=0) | Q(weekly_views__gt=0)).only(*fields).order_by('pk')
+    last_id = 0
+    while True:
+        batch = list(ranked.filter(pk__gt=last_id)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1].pk
+        updated += update([post for post in batch if post.pk not in scores])
+
+    retention_start = current_hour(now) - timedelta(days=config['RETENTION_DAYS'])
+    PostViewBucket.objects.filter(hour__lt=retention_start).delete()
+    return updated
+
+
+def get_trending_posts(limit=5):
+    return (
+        Post.objects.filter(status='published', trending_score__gt=0)
+        .select_related('author')
+        .order_by('-trending_score')[:limit]
+    )
+
+
+def get_most_read_this_week(limit=5):
+    return (
+        Post.objects.filter(status='published', weekly_views__gt=0)
+        .select_related('author')
+        .order_by('-weekly_views')[:limit]
+    )
@@ -14,7 +14,19 @@ urlpatterns = [
     path('profile/<str:username>/', views.user_profile, name='user_profile'),
     path('tag/<slug:slug>/', views.tag_posts, name='tag_posts'),
     path('create-tag/', views.create_tag, name='create_tag'),
+    path('timeline/', views.timeline, name='timeline'),
+    path('profile/<str:username>/follow/', views.follow_author, name='follow_author'),
+    path('tag/<slug:slug>/follow/', views.follow_tag, name='follow_tag'),
+    path('notifications/settings/', views.notification_settings, name='notification_settings'),
+    path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
+    path('moderation/comments/', views.moderate_comments, name='moderate_comments'),
+    
+    # Feeds (fmt: rss, atom or json)
+    path('feed/<str:fmt>/', views.feed, name='feed'),
+    path('tag/<slug:slug>/feed/<str:fmt>/', views.feed, {'kind': 'tag'}, name='tag_feed'),
+    path('profile/<str:slug>/feed/<str:fmt>/', views.feed, {'kind': 'author'}, name='author_feed'),
     
     # AJAX endpoints
     path('upload-image/', views.upload_image, name='upload_image'),
+    path('markdown-preview/', views.markdown_preview, name='markdown_preview'),
 ]
\ No newline at end of file
@@ -3,16 +3,32 @@ from django.shortcuts import render
 # Create your views here.
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
 from django.db.models import Q
 from django.core.paginator import Paginator
-from django.http import JsonResponse
-from .models import Post, Tag, Comment
-from .forms import PostForm, CommentForm, SearchForm, TagForm
+from django.http import Http404, HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from .models import Follow, NotificationPreference, Post, Tag, Comment
+from .forms import NotificationPreferenceForm, PostForm, CommentForm, SearchForm, TagForm
+from blog_app.metrics import count_upload_bytes
+from blog_app.ratelimit import ratelimit
+from .analytics import author_dashboard, record_view_event
+from .feeds import FEED_CONTENT_TYPES, get_cached_feed
+from .markdown_blocks import render_markdown
+from .moderation import approve_comments, moderation_queue, reject_comments, score_comment
+from .related import get_related_posts
+from .static_export import is_export_request
+from .timeline import follow, timeline_page, unfollow
+from .trending import get_most_read_this_week, get_trending_posts
+
+ANALYTICS_RANGES = (7, 30, 90)
 
 def home(request):
     """Homepage with recent posts"""
-    posts = Post.objects.filter(status='published').select_related('author')
+    posts = Post.objects.filter(status='published').select_related('author').prefetch_related('tags')
     paginator = Paginator(posts, 6)  # Show 6 posts per page
     
     page_number = request.GET.get('page')
@@ -21,12 +37,14 @@ def home(request):
     context = {
         'page_obj': page_obj,
         'featured_posts': posts.filter(featured_image__isnull=False)[:3],
+        'trending_posts': get_trending_posts(),
+        'most_read_posts': get_most_read_this_week(),
     }
     return render(request, 'blog/home.html', context)
 
 def post_list(request):
     """List all published posts"""
-    posts = Post.objects.filter(status='published').select_related('author')
+    posts = Post.objects.filter(status='published').select_related('author').prefetch_related('tags')
     
     # Search functionality
     search_form = SearchForm(request.GET)
@@ -56,10 +74,14 @@ def post_list(request):
     }
     return render(request, 'blog/post_list.html', context)
 
+@ratelimit('comment')
 def post_detail(request, slug):
     """Display a single post"""
     post = get_object_or_404(Post, slug=slug, status='published')
-    post.increment_views()
+    # Static site exports render every post; they are not reader views
+    if not is_export_request(request):
+        post.increment_views()
+        record_view_event(request, post)
     
     # Handle comments
     if request.method == 'POST':
@@ -68,8 +90,11 @@ def post_detail(request, slug):
             comment = comment_form.save(commit=False)
             comment.post = post
             comment.author = request.user
+            if score_comment(comment):
+                messages.info(request, 'Your comment is awaiting moderation.')
+            else:
+                messages.success(request, 'Your comment has been posted!')
             comment.save()
-            messages.success(request, 'Your comment has been posted!')
             return redirect('blog:post_detail', slug=post.slug)
     else:
         comment_form = CommentForm()
@@ -77,11 +102,13 @@ def post_detail(request, slug):
     context = {
         'post': post,
         'comment_form': comment_form,
-        'comments': post.comments.filter(is_approved=True),
+        'comments': post.comments.filter(is_approved=True).select_related('author'),
+        'related_posts': get_related_posts(post),
     }
     return render(request, 'blog/post_detail.html', context)
 
 @login_required
+@count_upload_bytes('post_image')
 def create_post(request):
     """Create a new post"""
     if request.method == 'POST':
@@ -99,6 +126,7 @@ def create_post(request):
     return render(request, 'blog/post_form.html', {'form': form, 'action': 'Create'})
 
 @login_required
+@count_upload_bytes('post_image')
 def edit_post(request, slug):
     """Edit an existing post"""
     post = get_object_or_404(Post, slug=slug, author=request.user)
@@ -140,14 +168,16 @@ def user_profile(request, username):
     context = {
         'profile_user': user,
         'page_obj': page_obj,
-        'total_posts': posts.count(),
+        # The paginator already counted the posts; reuse it instead of a second COUNT
+        'total_posts': paginator.count,
+        'is_following': request.user.is_authenticated and Follow.objects.filter(follower=request.user, author=user).exists(),
     }
     return render(request, 'accounts/profile.html', context)
 
 def tag_posts(request, slug):
     """Display posts for a specific tag"""
     tag = get_object_or_404(Tag, slug=slug)
-    posts = Post.objects.filter(tags=tag, status='published')
+    posts = Post.objects.filter(tags=tag, status='published').select_related('author').prefetch_related('tags')
     
     paginator = Paginator(posts, 9)
     page_number = request.GET.get('page')
@@ -156,16 +186,89 @@ def tag_posts(request, slug):
     context = {
         'tag': tag,
         'page_obj': page_obj,
+        'is_following': request.user.is_authenticated and Follow.objects.filter(follower=request.user, tag=tag).exists(),
     }
     return render(request, 'blog/tag_posts.html', context)
 
+@login_required
+def timeline(request):
+    """Posts from the authors and tags the user follows, paged by cursor"""
+    posts, next_cursor = timeline_page(request.user, request.GET.get('before'))
+    context = {
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'is_first_page': not request.GET.get('before'),
+        'follow_count': Follow.objects.filter(follower=request.user).count(),
+    }
+    return render(request, 'blog/timeline.html', context)
+
+@login_required
+@require_POST
+def follow_author(request, username):
+    """Follow or unfollow an author"""
+    from django.contrib.auth.models import User
+
+    author = get_object_or_404(User, username=username)
+    if author == request.user:
+        messages.error(request, 'You cannot follow yourself.')
+    elif not unfollow(request.user, author=author):
+        follow(request.user, author=author)
+    return redirect('blog:user_profile', username=username)
+
+@login_required
+@require_POST
+def follow_tag(request, slug):
+    """Follow or unfollow a tag"""
+    tag = get_object_or_404(Tag, slug=slug)
+    if not unfollow(request.user, tag=tag):
+        follow(request.user, tag=tag)
+    return redirect('blog:tag_posts', slug=slug)
+
+@login_required
+def analytics_dashboard(request):
+    """View and visitor charts for the signed-in author's posts, read from daily rollups"""
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    days = days if days in ANALYTICS_RANGES else 30
+    context = {
+        'stats': author_dashboard(request.user, days),
+        'days': days,
+        'ranges': ANALYTICS_RANGES,
+    }
+    return render(request, 'blog/analytics_dashboard.html', context)
+
+@login_required
+def notification_settings(request):
+    """Choose how often to get mail about new posts and comments"""
+    from .notifications import get_notification_settings
+
+    preference = NotificationPreference.objects.filter(user=request.user).first()
+    if preference is None:
+        config = get_notification_settings()
+        preference = NotificationPreference(
+            user=request.user,
+            new_posts=config['DEFAULT_NEW_POSTS'],
+            comment_replies=config['DEFAULT_COMMENT_REPLIES'],
+        )
+    if request.method == 'POST':
+        form = NotificationPreferenceForm(request.POST, instance=preference)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Notification settings saved.')
+            return redirect('blog:notification_settings')
+    else:
+        form = NotificationPreferenceForm(instance=preference)
+    return render(request, 'blog/notification_settings.html', {'form': form})
+
 def our_work(request):
     """Display posts tagged with 'Our Work' or 'Our'"""
     # Get posts tagged with 'Our Work' or any tag containing 'our'
     posts = Post.objects.filter(
         tags__name__icontains='our',
         status='published'
-    ).distinct().select_related('author')
+    ).distinct().select_related('author').prefetch_related('tags')
     
     paginator = Paginator(posts, 9)
     page_number = request.GET.get('page')
@@ -198,8 +301,58 @@ def create_tag(request):
     
     return render(request, 'blog/tag_form.html', context)
 
+@staff_member_required
+def moderate_comments(request):
+    """Moderation queue with bulk approve and reject"""
+    status = 'rejected' if request.GET.get('status') == 'rejected' else 'held'
+    
+    if request.method == 'POST':
+        comment_ids = request.POST.getlist('comment_ids')
+        action = request.POST.get('action')
+        if comment_ids and action == 'approve':
+            count = approve_comments(comment_ids)
+            messages.success(request, f'{count} comment(s) approved.')
+        elif comment_ids and action == 'reject':
+            count = reject_comments(comment_ids)
+            messages.success(request, f'{count} comment(s) rejected.')
+        return redirect(f"{request.path}?status={status}")
+    
+    paginator = Paginator(moderation_queue(status), 50)
+    page_obj = paginator.get_page(request.GET.get('page'))
+    
+    context = {
+        'page_obj': page_obj,
+        'status': status,
+    }
+    return render(request, 'blog/comment_moderation.html', context)
+
+def feed(request, fmt, kind='site', slug=None):
+    """RSS, Atom or JSON Feed for the site, a tag or an author"""
+    if fmt not in FEED_CONTENT_TYPES:
+        raise Http404('Unknown feed format')
+    
+    entry = get_cached_feed(
+        fmt, kind, slug,
+        feed_url=request.build_absolute_uri(request.path),
+        base_url=request.build_absolute_uri('/').rstrip('/'),
+    )
+    etag = quote_etag(entry['etag'])
+    last_modified = int(entry['last_modified']) if entry['last_modified'] else None
+    
+    # Polling readers with a current copy get an empty 304
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(entry['content'], content_type=FEED_CONTENT_TYPES[fmt])
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=300)
+    return response
+
 # AJAX endpoints for enhanced functionality
+@ratelimit('upload')
 @login_required
+@count_upload_bytes('body_image')
 def upload_image(request):
     """Handle image uploads via AJAX"""
     if request.method == 'POST' and request.FILES.get('image'):
@@ -207,4 +360,16 @@ def upload_image(request):
         # Process and save image
         # This is handled by markdownx, but we can add custom logic here
         return JsonResponse({'success': True})
-    return JsonResponse({'success': False})
\ No newline at end of file
+    return JsonResponse({'success': False})
+
+@ratelimit('preview')
+@login_required
+@require_POST
+def markdown_preview(request):
+    """Live editor preview; only blocks changed since the last render are re-rendered"""
+    html, stats = render_markdown(request.POST.get('content', ''))
+    response = HttpResponse(html)
+    response['X-Preview-Blocks'] = stats['blocks']
+    response['X-Preview-Cache-Hits'] = stats['hits']
+    response['X-Preview-Cache-Hit-Ratio'] = stats['hit_ratio']
+    return response
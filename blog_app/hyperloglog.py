@@ -0,0 +1,59 @@
+"""
+HyperLogLog cardinality sketches.
+
+A sketch of precision ``p`` keeps ``2**p`` one-byte registers and
+estimates the number of distinct items added to it with a standard error
+of about ``1.04 / sqrt(2**p)`` (3.3% at p=10, in 1 KB). Sketches of the
+same precision merge by taking the register-wise maximum, so daily
+sketches can be combined into weekly or monthly unique counts without
+the raw items.
+"""
+import hashlib
+import math
+
+
+class HyperLogLog:
+
+    def __init__(self, precision=10, registers=None):
+        if not 4 <= precision <= 16:
+            raise ValueError('precision must be between 4 and 16')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+        if len(self.registers) != self.size:
+            raise ValueError(f'expected {self.size} registers, got {len(self.registers)}')
+
+    @classmethod
+    def from_bytes(cls, data, precision=10):
+        """Load a sketch saved with ``to_bytes``; empty data gives an empty sketch"""
+        return cls(precision, bytes(data) or None)
+
+    def to_bytes(self):
+        return bytes(self.registers)
+
+    def add(self, item):
+        if isinstance(item, str):
+            item = item.encode('utf-8')
+        value = int.from_bytes(hashlib.blake2b(item, digest_size=8).digest(), 'big')
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        # Position of the leftmost 1-bit in the remaining 64 - p bits
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('cannot merge sketches of different precision')
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        m = self.size
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        # Linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
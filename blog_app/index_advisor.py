@@ -0,0 +1,278 @@
+"""
+Index advice from the query plans of captured ORM queries.
+
+``capture_selects`` records the SELECTs run inside a block, ``explain``
+asks the database for their plans and flags full table scans, filtered
+walks over an unrelated index and temporary B-trees built for ORDER BY,
+DISTINCT or GROUP BY. ``suggest_indexes`` derives candidate
+``Meta.indexes`` entries for a flagged query from its WHERE and ORDER BY
+clauses: equality columns first, then the sort columns. A partial
+variant is offered when an equality term compares a choice, boolean or
+NULL test against a constant. ``measure`` builds a candidate for real,
+re-plans and times the affected queries, and drops it again.
+
+Plans are read for SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN);
+other backends are reported as unsupported. Used by the
+``analyze_queries`` command.
+"""
+import re
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import models
+
+IDENTIFIER = r'(?:"(?P<table>\w+)"|(?P<alias>[A-Z]\d+))\."(?P<column>\w+)"'
+# A column compared to a parameter, tested for NULL, or used bare as a boolean ("col", NOT "col")
+CONDITION_RE = re.compile(
+    r'(?P<negated>NOT )?' + IDENTIFIER
+    + r'\s*(?P<op>IS NOT NULL|IS NULL|IN \(|<=|>=|=|<|>|(?=\)| AND | OR | ORDER BY | GROUP BY | LIMIT ))\s*(?P<rhs>%s)?'
+)
+ORDER_ITEM_RE = re.compile(IDENTIFIER + r'(?P<desc> DESC)?')
+ALIAS_RE = re.compile(r'"(\w+)" ([A-Z]\d+)\b')
+SQLITE_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: USING (COVERING )?INDEX (\w+))?')
+SQLITE_TEMP_RE = re.compile(r'USE TEMP B-TREE FOR (?:RIGHT PART OF |LAST TERM OF )?(ORDER BY|DISTINCT|GROUP BY)')
+POSTGRES_SCAN_RE = re.compile(r'Seq Scan on (\w+)(?: (\w+))?')
+
+
+@contextmanager
+def capture_selects(connection):
+    """Collect (sql, params) of every SELECT run on ``connection`` inside the block"""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            queries.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(record):
+        yield queries
+
+
+def explain(connection, sql, params):
+    """Plan lines of a query, or None if the backend is not supported"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[3] for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+    return None
+
+
+def _aliases(sql):
+    return {alias: table for table, alias in ALIAS_RE.findall(sql)}
+
+
+def _order_by(sql):
+    """[(identifier, column, descending)] of the outermost ORDER BY, if it only names columns"""
+    head, found, tail = sql.rpartition(' ORDER BY ')
+    if not found or tail.count('(') != tail.count(')'):
+        return []
+    tail = re.split(r' LIMIT | OFFSET ', tail)[0]
+    items = []
+    for item in tail.split(','):
+        match = ORDER_ITEM_RE.match(item.strip())
+        if match is None:
+            return []
+        items.append((match['table'] or match['alias'], match['column'], bool(match['desc'])))
+    return items
+
+
+def problems(vendor, plan, sql):
+    """
+    [(kind, identifier, detail)] for the flagged steps of ``plan``.
+
+    ``identifier`` is the table or alias as written in the SQL; kind is
+    'full scan', 'index scan' (walking a whole index while filtering
+    rows) or 'temp b-tree'.
+    """
+    tables = {model._meta.db_table for model in apps.get_models(include_auto_created=True)}
+    # A partial index already holds only the filtered rows, so walking it in order is the goal
+    partial = {index.name for model in apps.get_models() for index in model._meta.indexes if index.condition is not None}
+    aliases = _aliases(sql)
+    filtered = {match['table'] or match['alias'] for match in CONDITION_RE.finditer(sql)
+                if match['rhs'] or match['op'] in ('', 'IS NULL', 'IS NOT NULL')}
+    order = _order_by(sql)
+    found = []
+    for line in plan:
+        detail = line.strip()
+        if vendor == 'sqlite':
+            scan = SQLITE_SCAN_RE.match(detail)
+            temp = SQLITE_TEMP_RE.search(detail)
+            if scan:
+                identifier = scan.group(2) or scan.group(1)
+                if aliases.get(identifier, identifier) not in tables or scan.group(3):
+                    continue
+                if scan.group(4) is None:
+                    found.append(('full scan', identifier, detail))
+                elif identifier in filtered and scan.group(4) not in partial:
+                    found.append(('index scan', identifier, detail))
+            elif temp and temp.group(1) == 'ORDER BY' and order:
+                found.append(('temp b-tree', order[0][0], detail))
+            elif temp:
+                found.append(('temp b-tree', None, detail))
+        elif vendor == 'postgresql':
+            scan = POSTGRES_SCAN_RE.search(detail)
+            if scan and scan.group(1) in tables:
+                found.append(('full scan', scan.group(2) or scan.group(1), detail))
+            elif detail.lstrip('-> ').startswith('Sort ') and order:
+                found.append(('temp b-tree', order[0][0], detail))
+    return found
+
+
+def _existing_indexes(connection, table):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [info['columns'] for info in constraints.values() if info['index'] or info['unique']]
+
+
+def _index_name(model, columns, partial):
+    """A readable name within Django's 30 character limit"""
+    suffix = '_part_idx' if partial else '_idx'
+    columns = [column.removesuffix('_id') for column in columns]
+    for prefix in (model._meta.db_table, model._meta.model_name):
+        for parts in (columns, [column[:4] for column in columns]):
+            name = f"{prefix}_{'_'.join(parts)}{suffix}"
+            if len(name) <= 30:
+                return name
+    return None
+
+
+def _condition(field, op, value):
+    """Q for a term worth turning into a partial index condition, else None"""
+    if 'NULL' in op:
+        return models.Q(**{f'{field.name}__isnull': op == 'IS NULL'})
+    if isinstance(field, models.BooleanField) and op in ('', '='):
+        return models.Q(**{field.name: value})
+    # A constant from a short choice list (e.g. status) rather than a user-chosen filter value
+    if op == '=' and field.choices and len(field.choices) <= 5:
+        return models.Q(**{field.name: value})
+    return None
+
+
+def _terms(sql, params, identifier, fields):
+    """(equality [(field, op, value)], range fields) of the WHERE and ON terms on ``identifier``"""
+    equal, ranged = [], []
+    for match in CONDITION_RE.finditer(sql):
+        if (match['table'] or match['alias']) != identifier or match['column'] not in fields:
+            continue
+        if sql[max(match.start() - 5, 0):match.start()].endswith('NOT ('):
+            # Terms of exclude() are negated as a group; they say nothing usable
+            continue
+        op, field = match['op'], fields[match['column']]
+        if op == '' and not isinstance(field, models.BooleanField):
+            continue
+        value = params[sql[:match.start()].count('%s')] if match['rhs'] else not match['negated']
+        if op in ('', 'IN (') or 'NULL' in op or (op == '=' and match['rhs']):
+            if field not in [term[0] for term in equal]:
+                equal.append((field, op, value))
+        elif match['rhs'] and field not in ranged:
+            ranged.append(field)
+    return equal, ranged
+
+
+def suggest_indexes(connection, sql, params, identifier):
+    """
+    Candidate (model, index) pairs that would let ``identifier`` be searched.
+
+    The composite candidate comes first. A partial variant follows when
+    some equality terms are constants (booleans, NULL tests, short
+    choice lists): they become the index condition and the remaining
+    columns its fields. Composite candidates whose columns are already
+    a prefix of an existing index are skipped.
+    """
+    table = _aliases(sql).get(identifier, identifier)
+    model = next((model for model in apps.get_models(include_auto_created=True)
+                  if model._meta.db_table == table), None)
+    if model is None:
+        return []
+    fields = {field.column: field for field in model._meta.concrete_fields}
+    equal, ranged = _terms(sql, params, identifier, fields)
+
+    order_by = _order_by(sql)
+    order = [(fields[column], desc) for ident, column, desc in order_by if ident == identifier and column in fields]
+    if len(order) != len(order_by):
+        order = []
+    equal_fields = [field for field, _, _ in equal]
+    tail = [(field, desc) for field, desc in order if field not in equal_fields] or [(field, False) for field in ranged[:1]]
+    columns = [(field, False) for field in equal_fields] + tail
+    if not columns or columns[0][0].primary_key:
+        return []
+
+    def build(candidate, condition=None):
+        index = models.Index(fields=[('-' if desc else '') + field.name for field, desc in candidate],
+                             name='pending', condition=condition)
+        index.name = _index_name(model, [field.column for field, _ in candidate], condition is not None)
+        if index.name is None:
+            index.set_name_with_model(model)
+        return index
+
+    suggestions = []
+    wanted = [field.column for field, _ in columns]
+    if not any(existing[:len(wanted)] == wanted for existing in _existing_indexes(connection, table)):
+        suggestions.append((model, build(columns)))
+
+    conditions = {field: _condition(field, op, value) for field, op, value in equal}
+    conditions = {field: condition for field, condition in conditions.items() if condition is not None}
+    rest = [(field, desc) for field, desc in columns if field not in conditions]
+    if conditions and rest:
+        combined = models.Q()
+        for condition in conditions.values():
+            combined &= condition
+        suggestions.append((model, build(rest, combined)))
+    return suggestions
+
+
+def index_repr(index):
+    """The index as it would be written in Meta.indexes"""
+    parts = [f'fields={list(index.fields)!r}', f'name={index.name!r}']
+    if index.condition is not None:
+        condition = ', '.join(f'{key}={value!r}' for key, value in index.condition.children)
+        parts.append(f'condition=models.Q({condition})')
+    return f"models.Index({', '.join(parts)})"
+
+
+def time_queries(connection, queries, repeat):
+    """Best-of-``repeat`` seconds to run every query once"""
+    best = []
+    with connection.cursor() as cursor:
+        for sql, params in queries:
+            runs = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                cursor.execute(sql, params)
+                cursor.fetchall()
+                runs.append(time.perf_counter() - started)
+            best.append(min(runs))
+    return sum(best)
+
+
+def measure(connection, model, index, queries, repeat=5):
+    """
+    Plans and timings of ``queries`` without and with ``index``.
+
+    ``helped`` tells, per query, whether its new plan uses the index.
+
+    The index is created and dropped with plain DDL, so this also works
+    inside a transaction that is rolled back afterwards.
+    """
+    before = time_queries(connection, queries, repeat)
+    plans_before = [explain(connection, sql, params) for sql, params in queries]
+    editor = connection.schema_editor(collect_sql=True)
+    with connection.cursor() as cursor:
+        cursor.execute(str(index.create_sql(model, editor)))
+        try:
+            after = time_queries(connection, queries, repeat)
+            plans_after = [explain(connection, sql, params) for sql, params in queries]
+        finally:
+            cursor.execute(str(index.remove_sql(model, editor)))
+    helped = [any(index.name in line for line in plan or ()) for plan in plans_after]
+    return {
+        'before': before,
+        'after': after,
+        'helped': helped,
+        'plans_before': plans_before,
+        'plans_after': plans_after,
+    }
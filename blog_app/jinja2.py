@@ -0,0 +1,34 @@
+"""
+Jinja2 environment with the filters the Django card templates use.
+
+Filters are the Django implementations themselves so both engines
+produce the same markup.
+"""
+from django.templatetags.static import static
+from django.template.defaultfilters import date, striptags, truncatechars
+from django.urls import reverse
+from jinja2 import Environment
+
+from account.avatars import avatar_url
+from blog.templatetags.blog_extras import md5, pluralize
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({
+        'static': static,
+        'url': url,
+    })
+    env.filters.update({
+        'avatar_url': avatar_url,
+        'date': date,
+        'md5': md5,
+        'pluralize': pluralize,
+        'striptags': striptags,
+        'truncatechars': truncatechars,
+    })
+    return env
@@ -0,0 +1,485 @@
+"""
+Counters, gauges and histograms exposed in the Prometheus text format.
+
+Metrics are declared once at import time and updated in place::
+
+    UPLOAD_BYTES = metrics.counter('upload_bytes_total', 'Bytes received in uploads', ['kind'])
+    UPLOAD_BYTES.inc(size, kind='avatar')
+
+Values live in a dict in the process. With METRICS['MULTIPROCESS_DIR']
+set (for pre-fork servers such as gunicorn), every process also writes
+its values to its own memory-mapped file in that directory, and
+``/metrics`` sums the files of all processes, so any worker can answer
+a scrape. Gauges are summed over live processes only. Clear the
+directory when the server restarts.
+
+An update is a dict lookup and an addition under a lock (plus one
+8-byte write into the mmap in multiprocess mode), so metrics can sit
+on hot paths.
+"""
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.signals import setting_changed
+from django.db import connections
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+INITIAL_MMAP_SIZE = 64 * 1024
+
+
+def get_metrics_settings():
+    config = getattr(settings, 'METRICS', {})
+    return {
+        'ENABLED': config.get('ENABLED', True),
+        'MULTIPROCESS_DIR': config.get('MULTIPROCESS_DIR') or os.environ.get('METRICS_MULTIPROC_DIR', ''),
+        'ALLOWED_IPS': config.get('ALLOWED_IPS', []),
+        'TOKEN': config.get('TOKEN') or os.environ.get('METRICS_TOKEN', ''),
+    }
+
+
+class MmapValues:
+    """
+    Append-only file of (key, float64) entries shared with the scraping process.
+
+    Layout: an 8-byte header holding the number of bytes used, then
+    entries of a 4-byte key length, the UTF-8 key padded to 8 bytes and
+    the 8-byte value. Writers update values in place; readers parse up
+    to the used length.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_MMAP_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._used = struct.unpack_from('Q', self._map, 0)[0] or 8
+        self._offsets = {key: offset for key, _, offset in self._entries(self._map, self._used)}
+
+    @staticmethod
+    def _entries(data, used):
+        position = 8
+        while position < used:
+            length = struct.unpack_from('I', data, position)[0]
+            key = bytes(data[position + 4:position + 4 + length]).decode('utf-8')
+            position += 4 + length + (-(4 + length) % 8)
+            yield key, struct.unpack_from('d', data, position)[0], position
+            position += 8
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        if len(data) < 8:
+            return []
+        used = struct.unpack_from('Q', data, 0)[0]
+        return [(key, value) for key, value, _ in cls._entries(data, min(used, len(data)))]
+
+    def write(self, key, value):
+        offset = self._offsets.get(key)
+        if offset is None:
+            offset = self._append(key)
+        struct.pack_into('d', self._map, offset, value)
+
+    def _append(self, key):
+        encoded = key.encode('utf-8')
+        padded = 4 + len(encoded) + (-(4 + len(encoded)) % 8)
+        needed = self._used + padded + 8
+        if needed > len(self._map):
+            capacity = len(self._map)
+            while capacity < needed:
+                capacity *= 2
+            self._map.close()
+            self._file.truncate(capacity)
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        struct.pack_into(f'I{len(encoded)}s', self._map, self._used, len(encoded), encoded)
+        offset = self._used + padded
+        # Publish the entry only after it is fully written
+        self._used = needed
+        struct.pack_into('Q', self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+
+class Registry:
+    """All declared metrics and their current values"""
+
+    def __init__(self):
+        self.metrics = {}
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+        self._files = {}
+        self._pid = None
+        self._config = None
+
+    @property
+    def config(self):
+        if self._config is None:
+            self._config = get_metrics_settings()
+        return self._config
+
+    def register(self, metric):
+        # Re-declaring a metric (e.g. on module reload) returns the existing one
+        return self.metrics.setdefault(metric.name, metric)
+
+    def _mmap_for(self, kind):
+        directory = self.config['MULTIPROCESS_DIR']
+        if not directory:
+            return None
+        pid = os.getpid()
+        if pid != self._pid:
+            # Forked child: start from zero so the parent's values are not counted twice
+            self._pid, self._files = pid, {}
+            self._values.clear()
+        if kind not in self._files:
+            os.makedirs(directory, exist_ok=True)
+            self._files[kind] = MmapValues(os.path.join(directory, f'{kind}_{pid}.db'))
+        return self._files[kind]
+
+    def add(self, kind, *increments):
+        """Apply (key, amount) increments together"""
+        with self._lock:
+            store = self._mmap_for(kind)
+            for key, amount in increments:
+                self._values[key] += amount
+                if store is not None:
+                    store.write(key, self._values[key])
+
+    def set(self, kind, key, value):
+        with self._lock:
+            store = self._mmap_for(kind)
+            self._values[key] = value
+            if store is not None:
+                store.write(key, value)
+
+    def samples(self):
+        """Current values as {(kind, metric, sample, labels): value}, across processes if configured"""
+        directory = self.config['MULTIPROCESS_DIR']
+        if not directory:
+            with self._lock:
+                return {_decode(key): value for key, value in self._values.items()}
+        totals = defaultdict(float)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            kind, _, pid = os.path.basename(path)[:-3].partition('_')
+            if kind == 'gauge' and not _alive(int(pid)):
+                continue
+            for key, value in MmapValues.read(path):
+                totals[_decode(key)] += value
+        return dict(totals)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _encode(kind, name, sample, labels):
+    return json.dumps([kind, name, sample, labels], separators=(',', ':'))
+
+
+def _decode(key):
+    kind, name, sample, labels = json.loads(key)
+    return kind, name, sample, tuple(tuple(pair) for pair in labels)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._keys = {}
+
+    def _key(self, labels, sample='', extra=()):
+        # Encoded keys are memoized, so a repeat update skips validation and JSON
+        values = tuple(labels.get(name) for name in self.labelnames)
+        key = self._keys.get((sample, extra, values))
+        if key is None or len(labels) != len(self.labelnames):
+            if set(labels) != set(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+            pairs = [[name, str(value)] for name, value in zip(self.labelnames, values)] + [list(pair) for pair in extra]
+            key = self._keys[sample, extra, values] = _encode(self.kind, self.name, self.name + sample, pairs)
+        return key
+
+    def _enabled(self):
+        return self.registry.config['ENABLED']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError('counters only go up')
+        if self._enabled():
+            self.registry.add(self.kind, (self._key(labels, '' if self.name.endswith('_total') else '_total'), amount))
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        if self._enabled():
+            self.registry.set(self.kind, self._key(labels), value)
+
+    def inc(self, amount=1, **labels):
+        if self._enabled():
+            self.registry.add(self.kind, (self._key(labels), amount))
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self._bucket_labels = {bound: (('le', _format_value(bound)),) for bound in self.buckets}
+
+    def observe(self, value, **labels):
+        if not self._enabled():
+            return
+        # Each observation increments only its own bucket; exposition makes them cumulative
+        bound = self.buckets[bisect_left(self.buckets, value)]
+        self.registry.add(
+            self.kind,
+            (self._key(labels, '_bucket', self._bucket_labels[bound]), 1),
+            (self._key(labels, '_sum'), value),
+            (self._key(labels, '_count'), 1),
+        )
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+registry = Registry()
+
+
+@receiver(setting_changed)
+def _reset_config(setting, **kwargs):
+    if setting == 'METRICS':
+        registry._config = None
+
+
+def counter(name, documentation, labelnames=()):
+    return registry.register(Counter(registry, name, documentation, labelnames))
+
+
+def gauge(name, documentation, labelnames=()):
+    return registry.register(Gauge(registry, name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return registry.register(Histogram(registry, name, documentation, labelnames, buckets))
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return f'{value:.1f}'
+    return repr(float(value))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _bucket_bound(labels):
+    le = dict(labels)['le']
+    return float('inf') if le == '+Inf' else float(le)
+
+
+def generate_latest(registry=registry):
+    """Render every metric in the text exposition format"""
+    by_metric = defaultdict(list)
+    for (kind, name, sample, labels), value in registry.samples().items():
+        by_metric[name, kind].append((sample, labels, value))
+
+    lines = []
+    for (name, kind), samples in sorted(by_metric.items()):
+        metric = registry.metrics.get(name)
+        if metric is not None:
+            lines.append(f'# HELP {name} {_escape(metric.documentation)}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'histogram':
+            samples = _cumulative_buckets(name, samples, metric)
+        for sample, labels, value in sorted(samples, key=_sample_order):
+            lines.append(f'{sample}{_format_labels(labels)} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _sample_order(entry):
+    sample, labels, _ = entry
+    plain = tuple(pair for pair in labels if pair[0] != 'le')
+    return plain, sample, _bucket_bound(labels) if sample.endswith('_bucket') else 0
+
+
+def _cumulative_buckets(name, samples, metric):
+    bounds = metric.buckets if metric is not None else ()
+    counts, others = defaultdict(dict), []
+    for sample, labels, value in samples:
+        if sample.endswith('_bucket'):
+            plain = tuple(pair for pair in labels if pair[0] != 'le')
+            counts[plain][_bucket_bound(labels)] = value
+        else:
+            others.append((sample, labels, value))
+    for plain, by_bound in counts.items():
+        running = 0.0
+        for bound in sorted(set(bounds) | set(by_bound)):
+            running += by_bound.get(bound, 0.0)
+            others.append((f'{name}_bucket', plain + (('le', _format_value(bound)),), running))
+    return others
+
+
+# Instrumentation shared by the project
+
+REQUEST_SECONDS = histogram('http_request_duration_seconds', 'Request latency by URL name', ['view', 'method'])
+REQUESTS = counter('http_requests_total', 'Requests by URL name and status class', ['view', 'method', 'status'])
+REQUEST_QUERIES = histogram('http_request_db_queries', 'Database queries per request by URL name', ['view'],
+                            buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+DB_QUERIES = counter('db_queries_total', 'Database queries run while serving requests', ['view'])
+CACHE_REQUESTS = counter('cache_requests_total', 'Cache lookups by cache alias and result', ['cache', 'result'])
+UPLOAD_BYTES = counter('upload_bytes_total', 'Bytes received in file uploads', ['kind'])
+UPLOADS = counter('uploads_total', 'Files received in uploads', ['kind'])
+
+
+class InstrumentedCacheMixin:
+    """Counts hits and misses of ``get``, ``get_many`` and ``get_or_set``; mix in ahead of a cache backend"""
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.metrics_name = name or 'default'
+
+    def get(self, key, default=None, version=None):
+        if default is self._missing_key:
+            # Per-key lookup from the generic get_many, counted there
+            return super().get(key, default, version)
+        value = super().get(key, self._missing_key, version)
+        CACHE_REQUESTS.inc(cache=self.metrics_name, result='miss' if value is self._missing_key else 'hit')
+        return default if value is self._missing_key else value
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT, version=None):
+        value = self.get(key, self._missing_key, version)
+        CACHE_REQUESTS.inc(cache=self.metrics_name, result='miss' if value is self._missing_key else 'hit')
+        if value is not self._missing_key:
+            return value
+        return super().get_or_set(key, default, timeout, version)
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = super().get_many(keys, version)
+        if found:
+            CACHE_REQUESTS.inc(len(found), cache=self.metrics_name, result='hit')
+        if len(keys) > len(found):
+            CACHE_REQUESTS.inc(len(keys) - len(found), cache=self.metrics_name, result='miss')
+        return found
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class MetricsMiddleware:
+    """Latency, status and DB query count per URL name; install first in MIDDLEWARE"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not registry.config['ENABLED']:
+            return self.get_response(request)
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in settings.DATABASES:
+                stack.enter_context(connections[alias].execute_wrapper(count_query))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else '<unresolved>'
+        REQUEST_SECONDS.observe(elapsed, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=f'{response.status_code // 100}xx')
+        REQUEST_QUERIES.observe(queries[0], view=view)
+        if queries[0]:
+            DB_QUERIES.inc(queries[0], view=view)
+        return response
+
+
+def count_upload_bytes(kind):
+    """Count the files and bytes a view received in ``request.FILES``"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            response = view_func(request, *args, **kwargs)
+            if request.method == 'POST':
+                files = [upload for name in request.FILES for upload in request.FILES.getlist(name)]
+                if files:
+                    UPLOADS.inc(len(files), kind=kind)
+                    UPLOAD_BYTES.inc(sum(upload.size or 0 for upload in files), kind=kind)
+            return response
+        return wrapped
+    return decorator
+
+
+def metrics_view(request):
+    """
+    Text exposition of all metrics for a bearer token or allowed IPs.
+
+    Nothing is allowed by default. ALLOWED_IPS is matched against
+    REMOTE_ADDR only, never X-Forwarded-For, which clients can forge;
+    behind a reverse proxy on the same host every request comes from
+    the proxy's address, so use TOKEN there.
+    """
+    config = get_metrics_settings()
+    token = config['TOKEN']
+    authorized = (
+        (token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'))
+        or request.META.get('REMOTE_ADDR', '') in config['ALLOWED_IPS']
+    )
+    if not authorized:
+        raise Http404
+    return HttpResponse(generate_latest(), content_type=CONTENT_TYPE)
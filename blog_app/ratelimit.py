@@ -0,0 +1,178 @@
+"""
+Cache-backed rate limiting for views and API endpoints.
+
+Limits are configured per scope in the RATE_LIMITS setting, with separate
+rates for authenticated users (keyed by user id) and anonymous clients
+(keyed by IP). Two algorithms are available:
+
+``sliding``
+    Sliding-window counter: the current fixed window's count plus the
+    previous window's count weighted by how much of it still overlaps.
+    Two cache reads and one increment per request.
+``token_bucket``
+    Tokens refill continuously at ``limit / period`` per second up to
+    ``limit``, which allows short bursts at the full rate.
+
+Requests over the limit get a bare 429 with Retry-After before the view
+body runs, so no form validation or ORM work is done for them.
+
+Counters live in the RATE_LIMIT_CACHE cache alias. It must be shared by
+every worker process (Redis, Memcached, the database cache): with a
+per-process cache such as LocMemCache each of N workers counts on its
+own and clients get N times the configured rate. ``check --deploy``
+warns about that.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import HttpResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+DEFAULT_RATE_LIMITS = {
+    'comment': {'user': '10/m', 'anon': '3/m', 'algorithm': 'sliding'},
+    'upload': {'user': '30/h', 'anon': '5/h', 'algorithm': 'token_bucket'},
+    'api': {'user': '120/m', 'anon': '30/m', 'algorithm': 'token_bucket'},
+    'api_jobs': {'user': '20/m', 'anon': '5/m', 'algorithm': 'sliding'},
+    'preview': {'user': '120/m', 'algorithm': 'token_bucket'},
+}
+
+
+def get_rate_limits():
+    config = getattr(settings, 'RATE_LIMITS', {})
+    return {scope: {**DEFAULT_RATE_LIMITS.get(scope, {}), **config.get(scope, {})}
+            for scope in {*DEFAULT_RATE_LIMITS, *config}}
+
+
+def get_rate_limit_cache():
+    return caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_rate_limit_cache(app_configs, **kwargs):
+    if not getattr(settings, 'RATE_LIMIT_ENABLED', True) or not isinstance(get_rate_limit_cache(), LocMemCache):
+        return []
+    return [checks.Warning(
+        'Rate limit counters are kept in a per-process LocMemCache, so every worker process allows the full rate.',
+        hint='Point RATE_LIMIT_CACHE at a cache shared by all workers (Redis, Memcached or the database cache).',
+        id='blog_app.W001',
+    )]
+
+
+def parse_rate(rate):
+    """Turn ``'10/m'`` or ``'100/5m'`` into (10, 60) or (100, 300)"""
+    count, _, period = rate.partition('/')
+    multiplier = int(period[:-1] or 1)
+    return int(count), multiplier * PERIODS[period[-1]]
+
+
+def client_ip(request):
+    """
+    Address of the client, as seen by the outermost trusted proxy.
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so with RATE_LIMIT_TRUSTED_PROXIES proxies in front of
+    the app the client is that many entries from the right. Entries further
+    left were sent by the client and are ignored.
+    """
+    proxies = getattr(settings, 'RATE_LIMIT_TRUSTED_PROXIES', 0)
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR') if proxies > 0 else None
+    if forwarded:
+        addresses = [address.strip() for address in forwarded.split(',') if address.strip()]
+        if addresses:
+            return addresses[-min(proxies, len(addresses))]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def client_key(request):
+    """Return (kind, ident): ``('user', <id>)`` or ``('anon', <ip>)``"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user', str(user.pk)
+    return 'anon', client_ip(request)
+
+
+def _sliding_window(key, limit, period, now):
+    cache = get_rate_limit_cache()
+    window = int(now // period)
+    current_key, previous_key = f'{key}:{window}', f'{key}:{window - 1}'
+    counts = cache.get_many([current_key, previous_key])
+    overlap = 1 - (now % period) / period
+    estimate = counts.get(previous_key, 0) * overlap + counts.get(current_key, 0)
+    if estimate + 1 > limit:
+        # Wait until enough of the previous window has slid out
+        previous = counts.get(previous_key, 0)
+        if previous:
+            needed = (estimate + 1 - limit) / previous
+            return False, max(math.ceil(needed * period), 1)
+        return False, max(math.ceil(period - now % period), 1)
+    # add() creates the counter with an expiry; incr() keeps it
+    if not cache.add(current_key, 1, period * 2):
+        try:
+            cache.incr(current_key)
+        except ValueError:
+            cache.set(current_key, 1, period * 2)
+    return True, 0
+
+
+def _token_bucket(key, limit, period, now):
+    cache = get_rate_limit_cache()
+    # Read-modify-write is not atomic; concurrent requests can let a few
+    # extra through, which is acceptable for abuse protection
+    tokens, updated = cache.get(key, (limit, now))
+    tokens = min(limit, tokens + (now - updated) * limit / period)
+    if tokens < 1:
+        cache.set(key, (tokens, now), period)
+        return False, max(math.ceil((1 - tokens) * period / limit), 1)
+    cache.set(key, (tokens - 1, now), period)
+    return True, 0
+
+
+ALGORITHMS = {
+    'sliding': _sliding_window,
+    'token_bucket': _token_bucket,
+}
+
+
+def check_rate(scope, request, now=None):
+    """
+    Count one request against ``scope``.
+
+    Returns (allowed, retry_after_seconds). Unknown scopes and scopes
+    without a rate for this kind of client are not limited.
+    """
+    config = get_rate_limits().get(scope)
+    if not config or not getattr(settings, 'RATE_LIMIT_ENABLED', True):
+        return True, 0
+    kind, ident = client_key(request)
+    rate = config.get(kind)
+    if not rate:
+        return True, 0
+    limit, period = parse_rate(rate)
+    algorithm = ALGORITHMS[config.get('algorithm', 'sliding')]
+    return algorithm(f'ratelimit:{scope}:{kind}:{ident}', limit, period, now or time.time())
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse('Too many requests', status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, methods=('POST',)):
+    """Reject requests over the ``scope`` limit with a 429 before the view runs"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if methods is None or request.method in methods:
+                allowed, retry_after = check_rate(scope, request)
+                if not allowed:
+                    return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapped
+    return decorator
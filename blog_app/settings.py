@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .template_profiles import build_templates
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -50,11 +52,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its latency covers the rest of the stack
+    'blog_app.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'account.middleware.LegacyBackendSessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -62,20 +67,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'blog_app.urls'
 
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
+# 'development', 'production' (cached loader, precompiled at startup) or
+# 'jinja2' (production plus Jinja2 for the post card grids, if installed)
+TEMPLATE_PROFILE = 'development' if DEBUG else 'production'
+TEMPLATE_PRECOMPILE = TEMPLATE_PROFILE != 'development'
+TEMPLATES = build_templates(TEMPLATE_PROFILE, BASE_DIR)
 
 WSGI_APPLICATION = 'blog_app.wsgi.application'
 
@@ -170,6 +166,21 @@ MARKDOWNX_MARKDOWN_EXTENSION_CONFIGS = {
     },
 }
 
+# The editor preview posts to blog.views.markdown_preview, which renders
+# block by block and keeps up to MAX_BLOCKS rendered blocks per process
+MARKDOWNX_URLS_PATH = '/markdown-preview/'
+MARKDOWN_BLOCK_CACHE = {
+    'MAX_BLOCKS': 5000,
+}
+
+# Body HTML post-processing (blog.embeds): lazy images with intrinsic sizes
+# for local media files, and click-to-load facades for YouTube/Vimeo iframes
+POST_EMBEDS = {
+    'LAZY_IMAGES': True,
+    'IMAGE_DIMENSIONS': True,
+    'VIDEO_FACADES': True,
+}
+
 BLEACH_ALLOWED_TAGS = [
     'a', 'abbr', 'acronym', 'b', 'blockquote', 'code', 'em', 'i', 'li', 'ol', 'strong', 'ul',
     'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'br', 'div', 'span', 'img', 'iframe', 'video',
@@ -225,3 +236,161 @@ CORS_ALLOW_CREDENTIALS = True
 AI_MODELS_UPLOAD_PATH = 'ai_models/'
 AI_MODELS_MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
 AI_MODELS_ALLOWED_EXTENSIONS = ['.pkl', '.pth', '.h5', '.onnx', '.pt', '.json', '.yaml', '.yml']
+
+# Inference result cache: LRU in memory, optional TTL (seconds) and SQLite disk tier
+AI_MODELS_INFERENCE_CACHE = {
+    'MAX_ENTRIES': 1024,
+    'TTL': None,
+    'DISK_PATH': None,  # e.g. BASE_DIR / 'inference_cache.sqlite3'
+}
+
+# Model warm-up: preload the most-used deployed/ready models when a worker starts
+AI_MODELS_WARMUP = {
+    'ON_START': False,
+    'LIMIT': 5,
+}
+
+# Asynchronous inference jobs: local worker pool with per-model concurrency limits
+AI_MODELS_JOBS = {
+    'MAX_WORKERS': 4,
+    'PER_MODEL_CONCURRENCY': 1,
+    'MODEL_CONCURRENCY': {},  # per-slug overrides, e.g. {'summarizer-10': 2}
+    'PROGRESS_EVERY': 100,
+    'STALE_AFTER_SECONDS': 3600,  # longer than any job runs; older 'running' jobs are retried
+}
+
+# Related posts: top-K neighbors from TF-IDF (title/body) and tag overlap
+RELATED_POSTS = {
+    'TOP_K': 5,
+    'TAG_WEIGHT': 0.5,
+    'MIN_SCORE': 0.01,
+    # Changes are refreshed on a background thread, batching those within DELAY_SECONDS
+    'ASYNC': True,
+    'DELAY_SECONDS': 2,
+}
+
+# Trending posts: hourly view buckets decayed by half-life, recomputed by `update_trending`
+TRENDING = {
+    'HALF_LIFE_HOURS': 24,
+    'WINDOW_DAYS': 7,
+    'RETENTION_DAYS': 30,
+}
+
+# Comment spam scoring: comments scoring at or above HOLD_THRESHOLD (0..1)
+# wait in the moderation queue at /moderation/comments/
+COMMENT_MODERATION = {
+    'ENABLED': True,
+    'HOLD_THRESHOLD': 0.5,
+    'FREE_LINKS': 1,
+    'RATE_WINDOW_SECONDS': 600,
+    'RATE_LIMIT': 5,
+    'TRUSTED_AFTER': 3,
+}
+
+# Rate limits per scope: 'user' applies to signed-in users (by id), 'anon'
+# to everyone else (by IP). Rates are '<count>/<s|m|h|d>'; algorithm is
+# 'sliding' or 'token_bucket'. Counters live in the RATE_LIMIT_CACHE alias,
+# which must be shared by all worker processes in production: with the
+# per-process default cache below, N workers allow N times each rate.
+RATE_LIMIT_ENABLED = True
+RATE_LIMIT_CACHE = 'default'
+# Number of reverse proxies in front of the app that append to X-Forwarded-For;
+# 0 keys anonymous clients by REMOTE_ADDR
+RATE_LIMIT_TRUSTED_PROXIES = 0
+RATE_LIMITS = {
+    'comment': {'user': '10/m', 'anon': '3/m', 'algorithm': 'sliding'},
+    'upload': {'user': '30/h', 'anon': '5/h', 'algorithm': 'token_bucket'},
+    'api': {'user': '120/m', 'anon': '30/m', 'algorithm': 'token_bucket'},
+    'api_jobs': {'user': '20/m', 'anon': '5/m', 'algorithm': 'sliding'},
+    'preview': {'user': '120/m', 'algorithm': 'token_bucket'},
+}
+
+# Session and auth fast path. 'cached_db' sessions are read from the cache
+# and written through to the database; 'django.contrib.sessions.backends.
+# signed_cookies' avoids server-side session storage entirely. User rows are
+# kept in a per-process LRU (see account.backends) for up to TTL seconds: a
+# password change or deactivation takes effect at once in the process that
+# saved it, but other processes keep accepting the user's existing sessions
+# for up to TTL seconds. Lower TTL (0 disables the cache) if that matters.
+# Sessions created before the cached backend was added store ModelBackend's
+# path; account.middleware rewrites it, so only one backend checks passwords.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = [
+    'account.backends.CachedModelBackend',
+]
+USER_CACHE = {
+    'MAX_SIZE': 1024,
+    'TTL': 60,
+}
+
+# Avatars: square WebP files generated under MEDIA_ROOT/avatars/<user id>/;
+# each process remembers a user's avatar URL for URL_CACHE_SECONDS
+AVATARS = {
+    'SIZE': 128,
+    'QUALITY': 80,
+    'URL_CACHE_SECONDS': 300,
+}
+
+# Follow timelines (blog.timeline): posts are fanned out to followers in
+# BATCH_SIZE inserts on a background thread; authors/tags with at least
+# POPULAR_FOLLOWERS followers are merged in at read time instead
+TIMELINE = {
+    'BATCH_SIZE': 1000,
+    'POPULAR_FOLLOWERS': 5000,
+    'BACKFILL': 50,
+    'PAGE_SIZE': 12,
+    'ASYNC': True,
+}
+
+# Mail goes to the console in development; configure SMTP for production
+EMAIL_BACKEND = ('django.core.mail.backends.console.EmailBackend' if DEBUG
+                 else 'django.core.mail.backends.smtp.EmailBackend')
+
+# Notification mail (blog.notifications). Users pick off / immediate /
+# hourly / daily per kind; DEFAULT_* apply until they do. Digests are sent
+# by `send_notifications hourly|daily`.
+NOTIFICATIONS = {
+    'BATCH_SIZE': 500,
+    'SITE_URL': 'http://localhost:8000',
+    'DEFAULT_NEW_POSTS': 'daily',
+    'DEFAULT_COMMENT_REPLIES': 'immediate',
+    # Immediate mail sent in-process right after queueing; schedule
+    # `send_notifications immediate` every minute for the rest
+    'INLINE_LIMIT': 100,
+    'CLAIM_TIMEOUT': 900,
+}
+
+# Post analytics (blog.analytics): views are buffered per process and
+# bulk-inserted every FLUSH_SIZE events or FLUSH_SECONDS; `rollup_analytics`
+# compacts them into daily rows with HyperLogLog visitor sketches
+# (HLL_PRECISION 10 = 1 KB per post and day, about 3% error)
+ANALYTICS = {
+    'FLUSH_SIZE': 100,
+    'FLUSH_SECONDS': 10,
+    'HLL_PRECISION': 10,
+    'REFERRERS_KEPT': 20,
+}
+
+# Metrics (blog_app.metrics) served at /metrics with "Authorization: Bearer
+# <TOKEN>" or to ALLOWED_IPS, matched against REMOTE_ADDR; both are empty by
+# default, so /metrics answers 404. Behind a reverse proxy on the same host
+# every request has the proxy's REMOTE_ADDR: use TOKEN, not
+# ALLOWED_IPS = ['127.0.0.1']. Under a pre-fork server set
+# MULTIPROCESS_DIR (or METRICS_MULTIPROC_DIR) to an empty directory so
+# every worker's values are aggregated; clear it on restart.
+METRICS = {
+    'ENABLED': True,
+    'MULTIPROCESS_DIR': '',
+    'ALLOWED_IPS': [],
+    'TOKEN': '',
+}
+
+# The instrumented backend counts hits and misses for the metrics above
+CACHES = {
+    'default': {
+        'BACKEND': 'blog_app.metrics.InstrumentedLocMemCache',
+    },
+}
+
+# Sitemaps: URLs per segment file (primary-key range), at most 50,000
+SITEMAP_SEGMENT_SIZE = 10000
@@ -0,0 +1,170 @@
+"""
+Streaming sitemaps for posts, tags, author profiles and public AI models.
+
+Each section is split into segments by primary-key range, so the index
+needs one grouped query per section and every segment is a bounded,
+indexed range scan streamed with ``iterator()``. Memory use depends on
+SITEMAP_SEGMENT_SIZE, never on the total number of URLs.
+"""
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+
+from ai_models.models import AIModel
+from blog.models import Post, Tag
+
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24
+SLUG_PLACEHOLDER = '__sitemap_slug__'
+
+
+def get_segment_size():
+    # The sitemap protocol caps a file at 50,000 URLs
+    return min(getattr(settings, 'SITEMAP_SEGMENT_SIZE', 10000), 50000)
+
+
+class SitemapSection:
+    """A set of URLs built from ``(pk, slug, lastmod)`` rows"""
+
+    def __init__(self, name, url_name, slug_kwarg, queryset, slug_field, lastmod):
+        self.name = name
+        self.url_name = url_name
+        self.slug_kwarg = slug_kwarg
+        self.queryset = queryset
+        self.slug_field = slug_field
+        self.lastmod = lastmod
+
+    def get_queryset(self):
+        return self.queryset()
+
+    def url_prefix(self):
+        # Reverse once and substitute per row instead of calling reverse() per URL
+        return reverse(self.url_name, kwargs={self.slug_kwarg: SLUG_PLACEHOLDER})
+
+    def segments(self):
+        """Return [(segment, lastmod)] in one grouped query"""
+        size = get_segment_size()
+        rows = (
+            self.get_queryset().order_by()
+            .annotate(segment=F('pk') / size)
+            .values('segment')
+            .annotate(segment_lastmod=Max(self.lastmod))
+            .order_by('segment')
+        )
+        return [(row['segment'], row['segment_lastmod']) for row in rows]
+
+    def segment_queryset(self, segment):
+        size = get_segment_size()
+        return self.get_queryset().filter(pk__gte=segment * size, pk__lt=(segment + 1) * size)
+
+    def fingerprint(self, segment):
+        """Row count and newest lastmod: changes whenever the segment's content does"""
+        stats = self.segment_queryset(segment).order_by().aggregate(
+            total=Count('pk', distinct=True), newest=Max(self.lastmod)
+        )
+        return f"{stats['total']}:{stats['newest'].timestamp() if stats['newest'] else 0}"
+
+    def rows(self, segment):
+        queryset = self.segment_queryset(segment).order_by('pk')
+        if '__' in self.lastmod:
+            # lastmod comes from a related table: one grouped row per object
+            queryset = queryset.annotate(row_lastmod=Max(self.lastmod)).values_list(self.slug_field, 'row_lastmod')
+        else:
+            queryset = queryset.values_list(self.slug_field, self.lastmod)
+        return queryset.iterator(chunk_size=2000)
+
+
+SECTIONS = {
+    section.name: section for section in [
+        SitemapSection(
+            'posts', 'blog:post_detail', 'slug',
+            lambda: Post.objects.filter(status='published'),
+            'slug', 'updated_at',
+        ),
+        SitemapSection(
+            'tags', 'blog:tag_posts', 'slug',
+            lambda: Tag.objects.filter(posts__status='published'),
+            'slug', 'posts__updated_at',
+        ),
+        SitemapSection(
+            'authors', 'blog:user_profile', 'username',
+            lambda: User.objects.filter(blog_posts__status='published'),
+            'username', 'blog_posts__updated_at',
+        ),
+        SitemapSection(
+            'ai-models', 'ai_models:model_detail', 'slug',
+            lambda: AIModel.objects.filter(is_public=True),
+            'slug', 'updated_at',
+        ),
+    ]
+}
+
+
+def _lastmod(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S+00:00') if value else None
+
+
+def sitemap_index(request):
+    """Sitemap index listing every non-empty segment of every section"""
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">',
+    ]
+    for name, section in SECTIONS.items():
+        for segment, lastmod in section.segments():
+            location = request.build_absolute_uri(
+                reverse('sitemap_segment', kwargs={'section': name, 'segment': segment})
+            )
+            lines.append(f'<sitemap><loc>{escape(location)}</loc>')
+            if lastmod:
+                lines.append(f'<lastmod>{_lastmod(lastmod)}</lastmod>')
+            lines.append('</sitemap>')
+    lines.append('</sitemapindex>')
+    return HttpResponse('\n'.join(lines), content_type='application/xml')
+
+
+def _stream_segment(section, segment, base_url, cache_key):
+    prefix = base_url + section.url_prefix()
+    chunks = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    ]
+    yield chunks[0]
+    for slug, lastmod in section.rows(segment):
+        location = escape(prefix.replace(SLUG_PLACEHOLDER, quote(str(slug))))
+        if lastmod:
+            chunk = f'<url><loc>{location}</loc><lastmod>{_lastmod(lastmod)}</lastmod></url>\n'
+        else:
+            chunk = f'<url><loc>{location}</loc></url>\n'
+        chunks.append(chunk)
+        yield chunk
+    chunks.append('</urlset>\n')
+    yield chunks[-1]
+    # Store only after a complete render so a dropped connection never caches a partial file
+    cache.set(cache_key, ''.join(chunks), SITEMAP_CACHE_TIMEOUT)
+
+
+def sitemap_segment(request, section, segment):
+    """One segment of a section, served from cache until its rows change"""
+    if section not in SECTIONS:
+        raise Http404('Unknown sitemap section')
+    sitemap_section = SECTIONS[section]
+
+    fingerprint = sitemap_section.fingerprint(segment)
+    if fingerprint.startswith('0:'):
+        raise Http404('Empty sitemap segment')
+
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    cache_key = f'sitemap:{section}:{segment}:{fingerprint}:{base_url}'
+    content = cache.get(cache_key)
+    if content is not None:
+        return HttpResponse(content, content_type='application/xml')
+    return StreamingHttpResponse(
+        _stream_segment(sitemap_section, segment, base_url, cache_key),
+        content_type='application/xml',
+    )
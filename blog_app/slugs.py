@@ -0,0 +1,154 @@
+"""
+Unique slug allocation shared by posts, tags and AI models.
+
+Instead of saving a bare ``slugify()`` and relying on the unique
+constraint, the next free ``<base>-<n>`` suffix is found with a single
+indexed prefix query. The save runs in a savepoint and is retried if a
+concurrent writer takes the same slug in between.
+"""
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_slug
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+SAVE_ATTEMPTS = 5
+
+
+def _max_length(model, slug_field):
+    return model._meta.get_field(slug_field).max_length or 50
+
+
+def make_base(model, source, slug_field='slug', reserve=6):
+    """Slugify ``source``, leaving room for a ``-<n>`` suffix"""
+    base = slugify(source) or model._meta.model_name
+    return base[:_max_length(model, slug_field) - reserve].strip('-') or model._meta.model_name
+
+
+def _suffix_pattern(base):
+    return re.compile(rf'^{re.escape(base)}-(\d+)$')
+
+
+def _next_free(base, taken_slugs):
+    """Return ``base`` if free, else ``base-<highest suffix + 1>``"""
+    pattern = _suffix_pattern(base)
+    base_taken, highest = False, 1
+    for slug in taken_slugs:
+        if slug == base:
+            base_taken = True
+            continue
+        match = pattern.match(slug)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return f'{base}-{highest + 1}' if base_taken else base
+
+
+def allocate_slug(model, source, slug_field='slug', exclude_pk=None):
+    """Return a slug for ``source`` that is free in ``model`` right now"""
+    base = make_base(model, source, slug_field)
+    queryset = model._default_manager.filter(
+        Q(**{slug_field: base}) | Q(**{f'{slug_field}__startswith': f'{base}-'})
+    )
+    if exclude_pk is not None:
+        queryset = queryset.exclude(pk=exclude_pk)
+    return _next_free(base, queryset.values_list(slug_field, flat=True))
+
+
+def save_with_unique_slug(instance, source, save, *args, slug_field='slug', **kwargs):
+    """
+    Allocate a slug for ``instance`` and call ``save(*args, **kwargs)``.
+
+    Each attempt runs in a savepoint so a lost race only rolls back the
+    insert, then a fresh slug is allocated and the save is retried.
+    """
+    model = type(instance)
+    for attempt in range(SAVE_ATTEMPTS):
+        slug = allocate_slug(model, source, slug_field, exclude_pk=instance.pk)
+        setattr(instance, slug_field, slug)
+        try:
+            with transaction.atomic():
+                return save(*args, **kwargs)
+        except IntegrityError:
+            slug_taken = model._default_manager.filter(**{slug_field: slug}).exclude(pk=instance.pk).exists()
+            if not slug_taken or attempt == SAVE_ATTEMPTS - 1:
+                raise
+
+
+class BulkSlugAllocator:
+    """
+    Allocate slugs for many new rows in memory.
+
+    ``prime()`` loads every existing slug that could collide with the given
+    sources in one query per chunk; ``allocate()`` then never touches the
+    database and also avoids collisions within the batch itself.
+
+    A source that is already a valid slug within the field's max_length is
+    kept as-is while it is free; it is only shortened when a ``-<n>``
+    suffix has to be added.
+    """
+
+    def __init__(self, model, slug_field='slug', chunk_size=500):
+        self.model = model
+        self.slug_field = slug_field
+        self.chunk_size = chunk_size
+        self.max_length = _max_length(model, slug_field)
+        # Every slug known to be in use: loaded by prime() or handed out
+        self._taken = set()
+        self._primed = set()
+        # Highest suffix in use per stem; 1 means the bare stem is taken
+        self._highest = {}
+
+    def base(self, source):
+        """The slug ``source`` gets when it is free"""
+        if len(source) <= self.max_length:
+            try:
+                validate_slug(source)
+            except ValidationError:
+                pass
+            else:
+                return source
+        return make_base(self.model, source, self.slug_field)
+
+    def _stem(self, base):
+        """``base`` cut so that ``<stem>-<n>`` fits the field"""
+        return base[:self.max_length - 6].strip('-') or self.model._meta.model_name
+
+    def prime(self, sources):
+        bases = sorted({self.base(source) for source in sources} - self._primed)
+        for start in range(0, len(bases), self.chunk_size):
+            chunk = bases[start:start + self.chunk_size]
+            stems = {self._stem(base) for base in chunk} - set(self._highest)
+            condition = Q(**{f'{self.slug_field}__in': set(chunk) | stems})
+            for stem in stems:
+                condition |= Q(**{f'{self.slug_field}__startswith': f'{stem}-'})
+            highest = dict.fromkeys(stems, 0)
+            for slug in self.model._default_manager.filter(condition).values_list(self.slug_field, flat=True):
+                self._taken.add(slug)
+                if slug in highest:
+                    highest[slug] = max(highest[slug], 1)
+                head, _, tail = slug.rpartition('-')
+                if tail.isdigit() and head in highest:
+                    highest[head] = max(highest[head], int(tail))
+            self._highest.update(highest)
+            self._primed.update(chunk)
+
+    def allocate(self, source):
+        base = self.base(source)
+        if base not in self._primed:
+            self.prime([source])
+        stem = self._stem(base)
+        if base not in self._taken:
+            slug = base
+        else:
+            suffix = max(self._highest[stem] + 1, 2)
+            # Slugs handed out earlier in the batch are not counted in _highest
+            while f'{stem}-{suffix}' in self._taken:
+                suffix += 1
+            slug = f'{stem}-{suffix}'
+            self._highest[stem] = suffix
+        if slug == stem:
+            self._highest[stem] = max(self._highest[stem], 1)
+        self._taken.add(slug)
+        return slug
@@ -0,0 +1,92 @@
+"""
+TEMPLATES settings per TEMPLATE_PROFILE.
+
+``development``
+    Django's defaults: templates are cached and reloaded when they change.
+``production``
+    An explicit cached loader; ``precompile_templates()`` fills it when a
+    worker starts so no request pays for parsing.
+``jinja2``
+    ``production`` plus a Jinja2 engine for the post card grids under
+    ``jinja2_templates/``, used only when Jinja2 is installed.
+``uncached``
+    Reparse on every load; only useful as a benchmark baseline.
+
+This module is imported by settings.py, so Django is only imported
+inside functions.
+"""
+import os
+
+CONTEXT_PROCESSORS = [
+    'django.template.context_processors.request',
+    'django.contrib.auth.context_processors.auth',
+    'django.contrib.messages.context_processors.messages',
+]
+
+SOURCE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+
+def jinja2_available():
+    try:
+        from jinja2 import Environment  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def build_templates(profile, base_dir):
+    """Return a TEMPLATES list for ``profile``"""
+    django_engine = {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [base_dir / 'templates'],
+        'OPTIONS': {
+            'context_processors': CONTEXT_PROCESSORS,
+        },
+    }
+    if profile == 'development':
+        django_engine['APP_DIRS'] = True
+    elif profile == 'uncached':
+        django_engine['OPTIONS']['loaders'] = SOURCE_LOADERS
+    else:
+        django_engine['OPTIONS']['loaders'] = [('django.template.loaders.cached.Loader', SOURCE_LOADERS)]
+
+    templates = [django_engine]
+    if profile == 'jinja2' and jinja2_available():
+        templates.append({
+            'BACKEND': 'django.template.backends.jinja2.Jinja2',
+            'NAME': 'jinja2',
+            'DIRS': [base_dir / 'jinja2_templates'],
+            'APP_DIRS': False,
+            'OPTIONS': {
+                'environment': 'blog_app.jinja2.environment',
+            },
+        })
+    return templates
+
+
+def precompile_templates():
+    """Load every .html template into each engine's cache; return (loaded, failed)"""
+    from django.template import engines
+    from django.template.backends.django import DjangoTemplates
+    from django.template.utils import get_app_template_dirs
+
+    loaded, failed = 0, []
+    for engine in engines.all():
+        directories = list(engine.dirs)
+        if isinstance(engine, DjangoTemplates):
+            directories += get_app_template_dirs(engine.app_dirname)
+        for directory in directories:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if not filename.endswith('.html'):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+                    try:
+                        engine.get_template(name)
+                        loaded += 1
+                    except Exception as exc:
+                        failed.append((engine.name, name, str(exc)))
+    return loaded, failed
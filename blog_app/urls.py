@@ -18,6 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from markdownx.views import ImageUploadView
+from account.views import serve_avatar
+from . import sitemaps
+from .metrics import count_upload_bytes, metrics_view
+from .ratelimit import ratelimit
 
 
 urlpatterns = [
@@ -26,7 +31,14 @@ urlpatterns = [
     path('account/', include('account.urls')),
     path('ai-models/', include('ai_models.urls')),
     path('api/ai-models/', include('ai_models.api_urls')),
+    # Rate-limited ahead of the stock markdownx upload route it shadows
+    path('markdownx/upload/', ratelimit('upload')(count_upload_bytes('body_image')(ImageUploadView.as_view())), name='markdownx_upload'),
     path('markdownx/', include('markdownx.urls')),
+    # Generated avatars are served with year-long cache headers, ahead of DEBUG media serving
+    path(settings.MEDIA_URL.lstrip('/') + 'avatars/<int:user_id>/<str:filename>', serve_avatar, name='avatar'),
+    path('metrics', metrics_view, name='metrics'),
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-<str:section>-<int:segment>.xml', sitemaps.sitemap_segment, name='sitemap_segment'),
 ]
 
 